@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columnar import ColumnarHours
+from iso_calendar import week_label
+from synthetic import generate_projects, count_entries
+
+# Compares the nested projects dict with ColumnarHours at ~1M entries:
+# memory held by the hours data and time for the per-day, per-week and
+# per-week/per-project (with percentages) totals.
+#
+#   python benchmarks/bench_columnar.py [entries]
+
+# The synthetic data: this many projects over this many years, with as many
+# projects per weekday as it takes to reach the entries asked for
+PROJECT_COUNT = 500
+YEARS = 20
+WEEKDAYS_PER_YEAR = 261
+
+
+def make_projects(entries):
+    per_day = max(round(entries / (YEARS * WEEKDAYS_PER_YEAR)), 1)
+    return generate_projects(PROJECT_COUNT, YEARS, per_day)
+
+
+def measure(label, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {elapsed * 1000:10.1f} ms")
+    return result
+
+
+def dict_aggregates(projects):
+    per_day = defaultdict(float)
+    per_week = defaultdict(float)
+    per_week_project = defaultdict(lambda: defaultdict(float))
+    for project, details in projects.items():
+        for date_str, hours in details["hours"].items():
+            week = week_label(date_str)
+            per_day[date_str] += hours
+            per_week[week] += hours
+            per_week_project[week][project] += hours
+    percentages = {week: {project: hours / per_week[week] * 100
+                          for project, hours in by_project.items()}
+                   for week, by_project in per_week_project.items()}
+    return per_day, per_week, percentages
+
+
+def columnar_aggregates(store):
+    store.version += 1  # make sure nothing comes from the cache
+    return store.per_day(), store.per_week(), store.per_week_project()
+
+
+def columnar_project_totals(store):
+    store.version += 1
+    return store.per_project()
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f"Generating {entries:,} entries...")
+
+    tracemalloc.start()
+    projects = make_projects(entries)
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    total = count_entries(projects)
+
+    store = ColumnarHours.from_projects(projects)
+
+    print(f"\nMemory for {total:,} entries")
+    print(f"  nested dicts                 {dict_bytes / 2**20:10.1f} MiB"
+          f"  ({dict_bytes / total:.0f} bytes/entry)")
+    columns = store.project_col[:store.size].nbytes + store.day_col[:store.size].nbytes \
+        + store.hours_col[:store.size].nbytes
+    print(f"  columnar arrays              {columns / 2**20:10.1f} MiB"
+          f"  ({columns / total:.0f} bytes/entry)")
+
+    print("\nAggregation (per day, per week, per week/project with %)")
+    week_label.cache_clear()
+    measure("nested dict loops (cold)", lambda: dict_aggregates(projects))
+    measure("nested dict loops (warm)", lambda: dict_aggregates(projects))
+    measure("columnar, vectorized", lambda: columnar_aggregates(store))
+
+    print("\nOther")
+    measure("ColumnarHours.from_projects", lambda: ColumnarHours.from_projects(projects))
+    measure("per-project totals", lambda: columnar_project_totals(store))
+
+
+if __name__ == "__main__":
+    main()
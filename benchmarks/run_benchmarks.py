@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+
+# Headless: Qt without a display, matplotlib without a GUI backend
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PyQt5.QtWidgets import QApplication
+
+from synthetic import generate_projects, count_entries, write_projects
+
+# Times the data and rendering hot paths on synthetic data of several sizes
+# and writes the results as JSON. The results are compared against the
+# baseline (benchmarks/baseline.json unless --baseline names another run)
+# and the exit code is 1 if anything got slower than the threshold allows.
+#
+#   python benchmarks/run_benchmarks.py --output results.json
+#   python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+#   python benchmarks/run_benchmarks.py --baseline other-run.json
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# (name, projects, years, entries per day)
+SIZES = [
+    ("10p-1y", 10, 1, 5),
+    ("100p-5y", 100, 5, 20),
+    ("500p-10y", 500, 10, 50),
+    ("5000p-20y", 5000, 20, 150),
+]
+QUICK_SIZES = ["10p-1y", "100p-5y"]
+
+# Differences below this are treated as noise when comparing
+NOISE_MS = 1.0
+
+
+def measure(func, repeat, setup=None):
+    durations = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return {
+        "median_ms": round(statistics.median(durations), 3),
+        "min_ms": round(min(durations), 3),
+        "runs": repeat,
+    }
+
+
+def run_case(app, name, project_count, years, entries_per_day, repeat):
+    import timeplannerv5
+    from storage import JsonStore, JournalStore
+    from hours_index import HoursIndex
+    from rollups import build_rollups
+    from hours_chart import HoursChart
+    from iso_calendar import week_bounds
+    from time_entries import shift_date
+    from project_search import ProjectSearch
+
+    projects = generate_projects(project_count, years, entries_per_day)
+    workdir = tempfile.mkdtemp(prefix="timetracker-bench-")
+    path = os.path.join(workdir, "projects.json")
+    write_projects(path, projects)
+    results = {}
+
+    def record(operation, timing):
+        results[f"{name}/{operation}"] = timing
+        print(f"  {operation:<30} {timing['median_ms']:10.2f} ms")
+
+    try:
+        record("load_projects[json]", measure(lambda: JsonStore(path).load(), repeat))
+
+        def load_journal():
+            store = JournalStore(path)
+            store.load()
+            store.close()
+        record("load_projects[journal]", measure(load_journal, repeat))
+
+        json_store = JsonStore(path)
+        json_store.load()
+        record("save_projects[json]", measure(json_store.save, repeat))
+
+        record("build_index", measure(lambda: HoursIndex(projects), repeat))
+        record("build_rollups", measure(lambda: build_rollups(projects), repeat))
+
+        store = JournalStore(path, compact_threshold=10**9)
+        window = timeplannerv5.TimeTrackerApp(store=store)
+        first_project = next(iter(window.projects))
+
+        def add_hours():
+            window.apply_mutation({"op": "add_hours", "project": first_project,
+                                   "date": "2024-12-30", "hours": 1})
+            window.writer.flush()
+        record("add_hours[journal]", measure(add_hours, repeat))
+
+        def move_week():
+            # Every project's days of the last week moved a week later and
+            # back, as two batches
+            monday, sunday = week_bounds(window.index.weeks[-1])
+            later = [shift_date(monday, 7), shift_date(sunday, 7)]
+            for first, last, days in ((monday, sunday, 7), (*later, -7)):
+                window.apply_batch([{"op": "move_entries", "project": project, "start": first,
+                                     "end": last, "days": days} for project in window.projects])
+            window.writer.flush()
+        record("move_week[journal]", measure(move_week, repeat))
+
+        record("HoursDialog.setup_ui", measure(
+            lambda: timeplannerv5.HoursDialog(window.projects, None, rollups=window.get_rollups())
+            .deleteLater(), repeat))
+        record("ProjectDetailsDialog.setup_ui", measure(
+            lambda: timeplannerv5.ProjectDetailsDialog(window.get_project_search(), None)
+            .deleteLater(), repeat))
+
+        record("build_project_search", measure(
+            lambda: ProjectSearch.from_projects(projects), repeat))
+        last_project = list(window.projects)[-1]
+        record("search_projects[prefix]", measure(
+            lambda: window.get_project_search().search(last_project, timeplannerv5.COMPLETIONS),
+            repeat))
+        # Two letters swapped: only the fuzzy matching finds it
+        typo = last_project[:2] + last_project[3] + last_project[2] + last_project[4:]
+        record("search_projects[fuzzy]", measure(
+            lambda: window.get_project_search().search(typo, timeplannerv5.COMPLETIONS), repeat))
+
+        record("update_week_combo", measure(window.update_week_combo, repeat))
+        record("update_week_hours_combo", measure(window.update_week_hours_combo, repeat))
+        last_week = window.week_hours_combo.count() - 1
+        window.week_hours_combo.setCurrentIndex(last_week)
+        record("update_week_hours_display", measure(window.update_week_hours_display, repeat))
+
+        chart = HoursChart(window.index.daily_series)
+        chart.widget.resize(800, 400)
+
+        def update_chart():
+            chart.refresh()
+            chart.canvas.draw()
+        record("update_chart", measure(update_chart, repeat))
+
+        app.processEvents()
+        window.writer.flush()
+        store.close()
+        window.deleteLater()
+        app.processEvents()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return results, count_entries(projects)
+
+
+def compare(results, baseline, threshold):
+    # Print the change against the baseline; return the regressed keys. The
+    # fastest runs are compared: slower ones mostly measure whatever else
+    # the machine was doing.
+    regressions = []
+    print(f"\n{'benchmark (fastest run)':<46} {'baseline':>10} {'now':>10} {'change':>8}")
+    for key, timing in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]["min_ms"]
+        now = timing["min_ms"]
+        change = (now - before) / before * 100 if before else 0
+        regressed = now > before * (1 + threshold) and now - before > NOISE_MS
+        marker = "  REGRESSION" if regressed else ""
+        print(f"{key:<46} {before:10.2f} {now:10.2f} {change:+7.1f}%{marker}")
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the time tracker hot paths")
+    parser.add_argument("--quick", action="store_true", help="only the small sizes")
+    parser.add_argument("--sizes", nargs="+", choices=[size[0] for size in SIZES],
+                        help="sizes to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE_FILE,
+                        help="compare against this results file (default: benchmarks/baseline.json)")
+    parser.add_argument("--no-baseline", action="store_true", help="don't compare")
+    parser.add_argument("--save-baseline", help="also write the results here as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown against the baseline (default 0.25 = 25%%)")
+    args = parser.parse_args()
+
+    selected = args.sizes or (QUICK_SIZES if args.quick else [size[0] for size in SIZES])
+    app = QApplication.instance() or QApplication([])
+
+    results = {}
+    cases = {}
+    for name, project_count, years, entries_per_day in SIZES:
+        if name not in selected:
+            continue
+        print(f"{name}: {project_count} projects, {years} years")
+        case_results, entries = run_case(app, name, project_count, years,
+                                         entries_per_day, args.repeat)
+        results.update(case_results)
+        cases[name] = {"projects": project_count, "years": years, "entries": entries}
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "cases": cases,
+        },
+        "results": results,
+    }
+    # Read before --save-baseline may overwrite it
+    baseline = None
+    if not args.no_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as file:
+                json.dump(report, file, indent=4)
+            print(f"Wrote {path}")
+
+    if baseline is None:
+        if not args.no_baseline:
+            print(f"\nNo baseline at {args.baseline} to compare with.")
+        return 0
+    if baseline["meta"]["platform"] != report["meta"]["platform"]:
+        print(f"\nThe baseline was recorded on {baseline['meta']['platform']}; "
+              "timings from another machine are only roughly comparable.")
+    regressions = compare(results, baseline["results"], args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than "
+              f"{args.threshold:.0%}.")
+        return 1
+    print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
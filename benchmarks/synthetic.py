@@ -0,0 +1,61 @@
+import json
+import random
+from datetime import date, timedelta
+
+# Seeded generator for projects.json-shaped test data. The same arguments
+# always give the same data.
+
+
+def generate_projects(project_count, years, entries_per_day=8, seed=0,
+                      end=date(2024, 12, 31)):
+    # entries_per_day projects (at most project_count) get 1-8 hours on
+    # every weekday of the last `years` years before `end`
+    rng = random.Random(seed)
+    names = [f"Project {number:05d}" for number in range(project_count)]
+    projects = {
+        name: {
+            "account_number": f"{rng.randrange(10**6):06d}",
+            "comments": rng.choice(["", "Internal", "Customer work", "Maintenance"]),
+            "hours": {},
+        }
+        for name in names
+    }
+
+    per_day = min(entries_per_day, project_count)
+    day = end - timedelta(days=365 * years - 1)
+    while day <= end:
+        if day.weekday() < 5:
+            date_str = day.isoformat()
+            for name in rng.sample(names, per_day):
+                projects[name]["hours"][date_str] = rng.randint(1, 8)
+        day += timedelta(days=1)
+
+    # Keep each project's dates in order, as the app writes them
+    for details in projects.values():
+        details["hours"] = dict(sorted(details["hours"].items()))
+    return projects
+
+
+def count_entries(projects):
+    return sum(len(details.get("hours", {})) for details in projects.values())
+
+
+def write_projects(path, projects):
+    with open(path, "w") as file:
+        json.dump(projects, file, indent=4)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a synthetic projects.json")
+    parser.add_argument("path")
+    parser.add_argument("--projects", type=int, default=100)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--entries-per-day", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    data = generate_projects(args.projects, args.years, args.entries_per_day, args.seed)
+    write_projects(args.path, data)
+    print(f"Wrote {count_entries(data):,} entries for {len(data):,} projects to {args.path}")
@@ -0,0 +1,762 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import argparse
+import threading
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import Mapping
+
+from iso_calendar import week_label, day_ordinal, ordinal_date, week_bounds
+from hours_index import applied_change_events
+from instrumentation import metrics
+from storage import apply_op, read_journal, read_projects, drop_partial_write, journal_record
+from time_entries import is_entry_op, apply_entry_op, op_scope, scope_projects
+
+# Compact snapshot of projects.json, read through mmap:
+#
+#   header      magic, version, record count, project count, metadata offset
+#               and length (HEADER)
+#   records     (project id, day ordinal, hours) per entry, 16 bytes each,
+#               sorted by day and then project (RECORD)
+#   by project  record numbers sorted by project and day, uint32 each
+#   starts      where each project's run begins in "by project", uint32 each,
+#               plus one final entry
+#   metadata    JSON: per project its name and the details besides the
+#               hours, including any entries (see time_entries)
+#
+# The high bit of the project id marks hours stored as a float, so ints and
+# floats come back as they were. A project whose dates weren't in date
+# order keeps the original order in its metadata. Together this makes
+# projects.json -> snapshot -> projects.json lossless.
+
+BINARY_FILE = "projects.ttsnap"
+MAGIC = b"TTSNAP\r\n"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQQQ")
+RECORD = struct.Struct("<IId")
+ORDINAL = struct.Struct("<I")
+FLOAT_FLAG = 0x80000000
+PROJECT_MASK = 0x7FFFFFFF
+# Fold the journal into the snapshot when loading had to replay this many records
+COMPACT_THRESHOLD = 5000
+
+
+def write_snapshot(path, projects):
+    # Write `projects` (the projects.json dict) to `path` in the binary format
+    names = list(projects)
+    meta = []
+    records = []
+    for pid, name in enumerate(names):
+        details = dict(projects[name])
+        hours = details.get("hours")
+        entry = {"name": name, "details": details}
+        if hours is not None:
+            if not isinstance(hours, dict):
+                raise ValueError(f"Hours of project {name!r} are not a mapping")
+            details["hours"] = None  # placeholder keeping the key order
+            dates = list(hours)
+            if dates != sorted(dates):
+                entry["order"] = dates
+            for date_str, value in hours.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    raise ValueError(f"Hours of {name!r} on {date_str} are not a number")
+                flagged = pid | FLOAT_FLAG if isinstance(value, float) else pid
+                records.append((day_ordinal(date_str), pid, flagged, value))
+        meta.append(entry)
+    records.sort()
+
+    data = bytearray(HEADER.size + len(records) * RECORD.size)
+    offset = HEADER.size
+    for ordinal, _, flagged, value in records:
+        RECORD.pack_into(data, offset, flagged, ordinal, value)
+        offset += RECORD.size
+
+    # Records are in (day, project) order, so a stable sort by project
+    # gives (project, day) order
+    by_project = array("I", sorted(range(len(records)), key=lambda number: records[number][1]))
+    starts = array("I", [0] * (len(names) + 1))
+    for _, pid, _, _ in records:
+        starts[pid + 1] += 1
+    for pid in range(len(names)):
+        starts[pid + 1] += starts[pid]
+
+    meta_bytes = json.dumps({"projects": meta}, separators=(",", ":")).encode("utf-8")
+    meta_offset = len(data) + len(by_project) * 4 + len(starts) * 4
+    HEADER.pack_into(data, 0, MAGIC, VERSION, 0, len(records), len(names),
+                     meta_offset, len(meta_bytes))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+        file.write(by_project.tobytes())
+        file.write(starts.tobytes())
+        file.write(meta_bytes)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+class OrdinalColumn:
+    # The day ordinals of the records as a sequence, for bisect
+
+    def __init__(self, snapshot):
+        self.buffer = snapshot.buffer
+        self.count = snapshot.count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, number):
+        return ORDINAL.unpack_from(self.buffer, HEADER.size + number * RECORD.size + 4)[0]
+
+
+class Snapshot:
+    # Read-only access to a snapshot file. Nothing but the header and the
+    # metadata is read up front; queries binary-search the mapped records.
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self.count, project_count,
+         meta_offset, meta_length) = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} hours snapshot")
+        self.by_project_offset = HEADER.size + self.count * RECORD.size
+        self.starts_offset = self.by_project_offset + self.count * 4
+        meta = json.loads(self.buffer[meta_offset:meta_offset + meta_length])["projects"]
+        self.names = [entry["name"] for entry in meta]
+        self.details = [entry["details"] for entry in meta]
+        self.orders = {pid: entry["order"] for pid, entry in enumerate(meta) if "order" in entry}
+        self.project_ids = {name: pid for pid, name in enumerate(self.names)}
+        self.ordinals = OrdinalColumn(self)
+        self.day_counts_cache = None
+        self.day_totals_cache = None
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    def record(self, number):
+        flagged, ordinal, value = RECORD.unpack_from(self.buffer, HEADER.size + number * RECORD.size)
+        return flagged & PROJECT_MASK, ordinal, value if flagged & FLOAT_FLAG else int(value)
+
+    def records(self, lo=0, hi=None):
+        # (project id, day ordinal, hours) for record numbers lo..hi-1
+        hi = self.count if hi is None else hi
+        view = memoryview(self.buffer)[HEADER.size + lo * RECORD.size:HEADER.size + hi * RECORD.size]
+        try:
+            for flagged, ordinal, value in RECORD.iter_unpack(view):
+                yield flagged & PROJECT_MASK, ordinal, value if flagged & FLOAT_FLAG else int(value)
+        finally:
+            view.release()
+
+    def day_range(self, first, last):
+        # Record numbers (lo, hi) of the days first..last (ordinals)
+        return (bisect_left(self.ordinals, first),
+                bisect_right(self.ordinals, last))
+
+    def lookup(self, pid, ordinal):
+        # Hours of one project on one day, or None
+        lo, hi = self.day_range(ordinal, ordinal)
+        for number in range(lo, hi):
+            record_pid, _, value = self.record(number)
+            if record_pid == pid:
+                return value
+        return None
+
+    def project_entries(self, pid):
+        # [(date, hours)] of one project, in the order of the original file
+        start, end = struct.unpack_from("<II", self.buffer, self.starts_offset + pid * 4)
+        numbers = array("I")
+        numbers.frombytes(self.buffer[self.by_project_offset + start * 4:
+                                      self.by_project_offset + end * 4])
+        entries = []
+        for number in numbers:
+            _, ordinal, value = self.record(number)
+            entries.append((ordinal_date(ordinal), value))
+        if pid in self.orders:
+            position = {date_str: index for index, date_str in enumerate(self.orders[pid])}
+            entries.sort(key=lambda entry: position[entry[0]])
+        return entries
+
+    def day_counts(self):
+        # {date: entries}, found by jumping from day to day with bisect
+        if self.day_counts_cache is None:
+            counts = {}
+            number = 0
+            while number < self.count:
+                ordinal = self.ordinals[number]
+                end = bisect_right(self.ordinals, ordinal, number)
+                counts[ordinal_date(ordinal)] = end - number
+                number = end
+            self.day_counts_cache = counts
+        return self.day_counts_cache
+
+    def day_totals(self):
+        # {date: total hours}; one pass over all records
+        if self.day_totals_cache is None:
+            totals = {}
+            for _, ordinal, value in self.records():
+                totals[ordinal] = totals.get(ordinal, 0) + value
+            self.day_totals_cache = {ordinal_date(ordinal): total
+                                     for ordinal, total in totals.items()}
+        return self.day_totals_cache
+
+    def day_total(self, date_str):
+        ordinal = day_ordinal(date_str)
+        lo, hi = self.day_range(ordinal, ordinal)
+        return sum(value for _, _, value in self.records(lo, hi))
+
+    def week_projects(self, week):
+        # ({project: hours}, {project: entries}) of one ISO week
+        monday, sunday = week_bounds(week)
+        lo, hi = self.day_range(day_ordinal(monday), day_ordinal(sunday))
+        totals, counts = {}, {}
+        for pid, _, value in self.records(lo, hi):
+            totals[pid] = totals.get(pid, 0) + value
+            counts[pid] = counts.get(pid, 0) + 1
+        return ({self.names[pid]: totals[pid] for pid in sorted(totals)},
+                {self.names[pid]: counts[pid] for pid in sorted(counts)})
+
+    def to_projects(self):
+        # The full projects.json dict
+        hours = [[] for _ in self.names]
+        for pid, ordinal, value in self.records():
+            hours[pid].append((ordinal_date(ordinal), value))
+        projects = {}
+        for pid, name in enumerate(self.names):
+            details = dict(self.details[pid])
+            if "hours" in details:
+                entries = hours[pid]
+                if pid in self.orders:
+                    position = {date_str: index for index, date_str in enumerate(self.orders[pid])}
+                    entries.sort(key=lambda entry: position[entry[0]])
+                details["hours"] = dict(entries)
+            projects[name] = details
+        return projects
+
+
+def read_snapshot(path):
+    # The projects dict of a snapshot file alone
+    snapshot = Snapshot(path)
+    try:
+        return snapshot.to_projects()
+    finally:
+        snapshot.close()
+
+
+def read_binary(path=BINARY_FILE):
+    # A BinaryStore's snapshot plus its journal tail, like storage.read_projects
+    frozen_path = path + ".journal.old"
+    snapshot_path = path
+    if not os.path.exists(frozen_path) and os.path.exists(path + ".tmp"):
+        snapshot_path = path + ".tmp"
+    projects = read_snapshot(snapshot_path) if os.path.exists(snapshot_path) else {}
+    for journal_path in (frozen_path, path + ".journal"):
+        if os.path.exists(journal_path):
+            for op, _ in read_journal(journal_path):
+                apply_op(projects, op)
+    return projects
+
+
+class Overlay:
+    # Changes made since the snapshot was written, with the entry counts the
+    # index needs to correct the snapshot's answers
+
+    def __init__(self):
+        self.entries = {}  # (project, date) -> hours, None if removed
+        self.days = []  # sorted dates with overlay entries
+        self.by_date = {}  # date -> {projects}
+        self.by_project = {}  # project -> {date: None}, in insertion order
+        self.details = {}  # project -> details besides the hours, for new projects
+        self.itemized = {}  # project -> {date: entries}, replacing the details' entries
+        self.week_count_delta = {}
+
+    def set(self, project, date_str, old_hours, new_hours):
+        key = (project, date_str)
+        if key not in self.entries:
+            if date_str not in self.by_date:
+                insort(self.days, date_str)
+                self.by_date[date_str] = set()
+            self.by_date[date_str].add(project)
+            self.by_project.setdefault(project, {})[date_str] = None
+        self.entries[key] = new_hours
+
+        count = (new_hours is not None) - (old_hours is not None)
+        week = week_label(date_str)
+        self.week_count_delta[week] = self.week_count_delta.get(week, 0) + count
+        return project, date_str, old_hours, new_hours
+
+    def in_range(self, start, end):
+        # {(project, date): hours} of the overlay entries from start to end
+        found = {}
+        for date_str in self.days[bisect_left(self.days, start):bisect_right(self.days, end)]:
+            for project in self.by_date[date_str]:
+                found[(project, date_str)] = self.entries[(project, date_str)]
+        return found
+
+
+class BinaryStore:
+    # A binary snapshot (see write_snapshot) plus a journal of the changes
+    # since, like JournalStore. The snapshot is never turned into a dict:
+    # load() returns a lazy view, changes go into an in-memory Overlay and
+    # make_index() answers the hours views by binary search over the mapped
+    # records, corrected by the overlay. save() writes a new snapshot.
+
+    def __init__(self, path=BINARY_FILE, compact_threshold=COMPACT_THRESHOLD):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.frozen_path = path + ".journal.old"
+        self.tmp_path = path + ".tmp"
+        self.compact_threshold = compact_threshold
+        self.lock = threading.RLock()
+        self.snapshot = None
+        self.overlay = Overlay()
+        self.order = []  # project names, snapshot order then new ones
+        self.known = set()
+        self.journal_file = None
+        self.journal_records = 0
+        self.staged = 0
+        self.projects = None
+
+    def load(self):
+        with self.lock:
+            self.recover()
+            self.open_snapshot()
+            self.projects = BinaryProjectsView(self)
+            replayed = 0
+            for journal_path in (self.frozen_path, self.journal_path):
+                if os.path.exists(journal_path):
+                    good_offset = 0
+                    for op, good_offset in read_journal(journal_path):
+                        self.execute_op(op)
+                        replayed += 1
+                    if good_offset < os.path.getsize(journal_path):
+                        with open(journal_path, "r+b") as file:
+                            file.truncate(good_offset)
+            self.journal_records = replayed
+            self.journal_file = open(self.journal_path, "a", encoding="utf-8")
+        if replayed >= self.compact_threshold:
+            self.compact()
+        return self.projects
+
+    def recover(self):
+        # Same protocol as JournalStore.compact
+        if os.path.exists(self.frozen_path):
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+        elif os.path.exists(self.tmp_path):
+            os.replace(self.tmp_path, self.path)
+
+    def open_snapshot(self):
+        if self.snapshot is not None:
+            self.snapshot.close()
+        self.snapshot = Snapshot(self.path) if os.path.exists(self.path) else None
+        self.overlay = Overlay()
+        self.order = list(self.snapshot.names) if self.snapshot else []
+        self.known = set(self.order)
+
+    def make_index(self):
+        return BinaryIndex(self)
+
+    # Reads merging the snapshot and the overlay
+
+    def current(self, project, date_str):
+        key = (project, date_str)
+        if key in self.overlay.entries:
+            return self.overlay.entries[key]
+        pid = self.snapshot.project_ids.get(project) if self.snapshot else None
+        if pid is None:
+            return None
+        return self.snapshot.lookup(pid, day_ordinal(date_str))
+
+    def project_details(self, project):
+        if project in self.overlay.details:
+            details = self.overlay.details[project]
+        else:
+            details = self.snapshot.details[self.snapshot.project_ids[project]]
+        if project in self.overlay.itemized:
+            details = dict(details, entries=self.overlay.itemized[project])
+            if not details["entries"]:
+                del details["entries"]
+        return details
+
+    def project_hours(self, project):
+        hours = {}
+        if project not in self.overlay.details and self.snapshot is not None:
+            pid = self.snapshot.project_ids.get(project)
+            if pid is not None:
+                hours = dict(self.snapshot.project_entries(pid))
+        for date_str in self.overlay.by_project.get(project, ()):
+            value = self.overlay.entries[(project, date_str)]
+            if value is None:
+                hours.pop(date_str, None)
+            else:
+                hours[date_str] = value
+        return hours
+
+    def days(self, project, first, last):
+        # ({date: hours}, {date: entries}) of one project from first to
+        # last, without reading the rest of its history
+        hours = {}
+        if project not in self.known:
+            return hours, {}
+        if project not in self.overlay.details and self.snapshot is not None:
+            pid = self.snapshot.project_ids.get(project)
+            if pid is not None:
+                lo, hi = self.snapshot.day_range(day_ordinal(first), day_ordinal(last))
+                for record_pid, ordinal, value in self.snapshot.records(lo, hi):
+                    if record_pid == pid:
+                        hours[ordinal_date(ordinal)] = value
+        for (name, date_str), value in self.overlay.in_range(first, last).items():
+            if name != project:
+                continue
+            if value is None:
+                hours.pop(date_str, None)
+            else:
+                hours[date_str] = value
+        entries = self.project_details(project).get("entries") or {}
+        return hours, {date_str: listed for date_str, listed in entries.items()
+                       if first <= date_str <= last}
+
+    def range_entries(self, first, last):
+        # {(project, date): hours} of every entry from first to last: the
+        # snapshot's records with the overlay's changes applied
+        found = {}
+        if self.snapshot is not None:
+            lo, hi = self.snapshot.day_range(day_ordinal(first), day_ordinal(last))
+            for pid, ordinal, value in self.snapshot.records(lo, hi):
+                found[(self.snapshot.names[pid], ordinal_date(ordinal))] = value
+        for key, value in self.overlay.in_range(first, last).items():
+            if value is None:
+                found.pop(key, None)
+            else:
+                found[key] = value
+        return found
+
+    # Mutations
+
+    def execute_op(self, op):
+        # Same semantics as storage.apply_op
+        kind = op["op"]
+        changes = []
+        overlay = self.overlay
+
+        if is_entry_op(op):
+            return self.execute_entry_op(op)
+
+        elif kind == "add_hours":
+            project, date_str, hours = op["project"], op["date"], op["hours"]
+            if project not in self.known:
+                self.add_name(project, {"hours": None})
+            old_hours = self.current(project, date_str)
+            changes.append(overlay.set(project, date_str, old_hours, (old_hours or 0) + hours))
+
+        elif kind == "add_project":
+            project = op["project"]
+            if project not in self.known:
+                self.add_name(project, {"account_number": op.get("account_number", ""),
+                                        "comments": op.get("comments", ""),
+                                        "hours": None})
+
+        elif kind == "clear_range":
+            start, end = op["start"], op["end"]
+            for (project, date_str), hours in self.range_entries(start, end).items():
+                changes.append(overlay.set(project, date_str, hours, None))
+            for project in self.order:
+                entries = self.project_details(project).get("entries")
+                if entries and any(start <= date_str <= end for date_str in entries):
+                    overlay.itemized[project] = {date_str: listed
+                                                 for date_str, listed in entries.items()
+                                                 if not start <= date_str <= end}
+
+        else:
+            raise ValueError(f"Unknown operation: {kind}")
+
+        return changes
+
+    def execute_entry_op(self, op):
+        # Apply the op to a small projects dict of the days it touches and
+        # put the result into the overlay
+        scope = op_scope(op)
+        partial = scope_projects(self.projects, scope)
+        changes = apply_entry_op(partial, op)
+        for project, date_str, old_hours, new_hours in changes:
+            if project not in self.known:
+                self.add_name(project, {"hours": None})
+            self.overlay.set(project, date_str, old_hours, new_hours)
+        for project, windows in scope.items():
+            if project not in partial:
+                continue
+            entries = dict(self.project_details(project).get("entries") or {})
+            for date_str in list(entries):
+                if any(first <= date_str <= last for first, last in windows):
+                    del entries[date_str]
+            entries.update(partial[project].get("entries", {}))
+            self.overlay.itemized[project] = entries
+        return changes
+
+    def add_name(self, project, details):
+        self.order.append(project)
+        self.known.add(project)
+        if details is not None:
+            self.overlay.details[project] = details
+
+    def stage(self, op):
+        with self.lock:
+            self.staged += 1
+            return self.execute_op(op)
+
+    def commit(self, ops):
+        # Staged until written, like JournalStore.commit
+        with self.lock:
+            size = os.fstat(self.journal_file.fileno()).st_size
+            try:
+                self.journal_file.write(journal_record(ops))
+                self.journal_file.flush()
+                os.fsync(self.journal_file.fileno())
+            except OSError:
+                drop_partial_write(self.journal_file, self.journal_path, size)
+                self.journal_file = open(self.journal_path, "a", encoding="utf-8")
+                raise
+            self.staged -= len(ops)
+            self.journal_records += len(ops)
+            metrics.count("journal.records", len(ops))
+            metrics.count("journal.fsyncs")
+
+    def apply(self, op):
+        return self.apply_batch([op])
+
+    def apply_batch(self, ops):
+        with self.lock:
+            changes = []
+            for op in ops:
+                changes.extend(self.stage(op))
+            self.commit(ops)
+        return changes
+
+    def to_projects(self):
+        with self.lock:
+            return {project: self.projects[project] for project in self.order}
+
+    def save(self, projects=None):
+        if projects is not None and not isinstance(projects, BinaryProjectsView):
+            # A plain dict replaces the contents
+            with self.lock:
+                write_snapshot(self.tmp_path, projects)
+                self.swap_snapshot(truncate_journal=True)
+            return
+        self.compact()
+
+    def compact(self):
+        # Write the merged state as a new snapshot and start a new journal.
+        # Ops staged but not committed yet would end up in both, so the
+        # compaction waits for the next save then.
+        with self.lock:
+            if self.staged:
+                return
+            projects = self.to_projects()
+            self.journal_file.close()
+            if os.path.exists(self.frozen_path):
+                with open(self.frozen_path, "ab") as frozen, \
+                        open(self.journal_path, "rb") as journal:
+                    frozen.write(journal.read())
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, self.frozen_path)
+            write_snapshot(self.tmp_path, projects)
+            os.remove(self.frozen_path)
+            self.swap_snapshot(truncate_journal=False)
+            metrics.count("journal.compactions")
+
+    def swap_snapshot(self, truncate_journal):
+        # Move the finished .tmp snapshot in place and reopen it. The old
+        # mapping is closed first, since Windows can't replace a mapped file.
+        if self.snapshot is not None:
+            self.snapshot.close()
+            self.snapshot = None
+        os.replace(self.tmp_path, self.path)
+        self.open_snapshot()
+        if self.journal_file is not None and not self.journal_file.closed:
+            self.journal_file.close()
+        self.journal_file = open(self.journal_path, "w" if truncate_journal else "a",
+                                 encoding="utf-8")
+        self.journal_records = 0
+
+    def close(self):
+        with self.lock:
+            if self.journal_file is not None:
+                self.journal_file.close()
+                self.journal_file = None
+            if self.snapshot is not None:
+                self.snapshot.close()
+                self.snapshot = None
+
+
+class BinaryProjectsView(Mapping):
+    # {project: {"account_number", "comments", "hours"}} over a BinaryStore.
+    # A project's hours are only read when that project is accessed.
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, project):
+        with self.store.lock:
+            if project not in self.store.known:
+                raise KeyError(project)
+            details = dict(self.store.project_details(project))
+            if "hours" in details:
+                details["hours"] = self.store.project_hours(project)
+            return details
+
+    def __contains__(self, project):
+        return project in self.store.known
+
+    def __iter__(self):
+        return iter(list(self.store.order))
+
+    def infos(self):
+        # (project, account number, comments), without reading any hours
+        with self.store.lock:
+            details = [(project, self.store.project_details(project))
+                       for project in self.store.order]
+        return [(project, info.get("account_number"), info.get("comments"))
+                for project, info in details]
+
+    def days(self, project, first, last):
+        with self.store.lock:
+            return self.store.days(project, first, last)
+
+    def __len__(self):
+        return len(self.store.order)
+
+
+class BinaryIndex:
+    # Same read interface as HoursIndex. Entry counts are the snapshot's
+    # plus the overlay's deltas. Hours of the days and weeks the overlay
+    # touches are added up again from their entries rather than corrected
+    # by a running delta, which leaves float residue such as -2.2e-16 where
+    # a day was cleared; a day without entries totals exactly 0.
+
+    def __init__(self, store):
+        self.store = store
+
+    def week_counts(self):
+        store = self.store
+        counts = {}
+        if store.snapshot is not None:
+            for date_str, count in store.snapshot.day_counts().items():
+                week = week_label(date_str)
+                counts[week] = counts.get(week, 0) + count
+        for week, delta in store.overlay.week_count_delta.items():
+            counts[week] = counts.get(week, 0) + delta
+        return counts
+
+    @property
+    def weeks(self):
+        with self.store.lock:
+            return sorted(week for week, count in self.week_counts().items() if count > 0)
+
+    def week_entries(self, week):
+        with self.store.lock:
+            store = self.store
+            count = store.overlay.week_count_delta.get(week, 0)
+            if store.snapshot is not None:
+                monday, sunday = week_bounds(week)
+                lo, hi = store.snapshot.day_range(day_ordinal(monday), day_ordinal(sunday))
+                count += hi - lo
+            return count
+
+    def has_week(self, week):
+        return self.week_entries(week) > 0
+
+    def has_day(self, date_str):
+        with self.store.lock:
+            return bool(self.store.range_entries(date_str, date_str))
+
+    def entry_count(self):
+        with self.store.lock:
+            return sum(self.week_counts().values())
+
+    def apply_changes(self, changes):
+        # The store's overlay already holds the changes
+        return applied_change_events(self, changes)
+
+    def day_total(self, date_str):
+        with self.store.lock:
+            store = self.store
+            if date_str in store.overlay.by_date:
+                return sum(store.range_entries(date_str, date_str).values())
+            if store.snapshot is not None:
+                return store.snapshot.day_total(date_str)
+            return 0
+
+    def daily_series(self):
+        with self.store.lock:
+            store = self.store
+            totals = dict(store.snapshot.day_totals()) if store.snapshot is not None else {}
+            for date_str in store.overlay.days:
+                entries = store.range_entries(date_str, date_str)
+                if entries:
+                    totals[date_str] = sum(entries.values())
+                else:
+                    totals.pop(date_str, None)
+            dates = sorted(totals)
+            return dates, [totals[date_str] for date_str in dates]
+
+    def week_report(self, week):
+        with self.store.lock:
+            store = self.store
+            if week not in store.overlay.week_count_delta:
+                totals = store.snapshot.week_projects(week)[0] if store.snapshot is not None else {}
+                return totals, sum(totals.values())
+            monday, sunday = week_bounds(week)
+            totals = {}
+            for (project, _), hours in store.range_entries(monday, sunday).items():
+                totals[project] = totals.get(project, 0) + hours
+            # Listed in project order, like the snapshot's answer
+            positions = {project: position for position, project in enumerate(store.order)}
+            totals = {project: totals[project] for project in sorted(totals, key=positions.get)}
+            return totals, sum(totals.values())
+
+
+def convert(source, target):
+    # projects.json <-> snapshot, by the target's extension
+    if target.endswith(".json"):
+        projects = read_binary(source)
+        with open(target, "w") as file:
+            json.dump(projects, file, indent=4)
+    else:
+        projects = read_projects(source)
+        write_snapshot(target, projects)
+    return projects
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert between projects.json and the binary snapshot format")
+    parser.add_argument("source", help="projects.json or a .ttsnap snapshot, each with any journal")
+    parser.add_argument("target", help="a .ttsnap snapshot, or a .json file")
+    parser.add_argument("--check", action="store_true",
+                        help="read the result back and compare it with the source")
+    args = parser.parse_args()
+
+    projects = convert(args.source, args.target)
+    entries = sum(len(details.get("hours", {})) for details in projects.values())
+    print(f"Wrote {len(projects)} projects and {entries} entries to {args.target}")
+    if args.check:
+        if args.target.endswith(".json"):
+            with open(args.target) as file:
+                result = json.load(file)
+        else:
+            result = read_snapshot(args.target)
+        if result != projects or any(list(result[name]) != list(projects[name])
+                                     for name in projects):
+            print("Round trip check failed", file=sys.stderr)
+            sys.exit(1)
+        print("Round trip check passed")
@@ -0,0 +1,261 @@
+import os
+import sys
+import csv
+import json
+import argparse
+from datetime import date
+
+from storage import open_store, build_index
+from reports import hours_report_text, weekly_breakdown, breakdown_text, rollup_breakdown
+from rollups import GROUPINGS, store_fingerprint, load_rollups, build_rollups
+from iso_calendar import PERIODS
+from export import export_reports
+from consolidate import consolidate
+
+MAX_ERRORS_SHOWN = 20
+
+
+class InvalidEntries(ValueError):
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid entries")
+        self.errors = errors
+
+
+def read_csv(path):
+    # Rows of (line number, {"project", "date", "hours"}); a header row is
+    # optional, without one the columns are project, date, hours
+    with open(path, newline="", encoding="utf-8") as file:
+        reader = csv.reader(file)
+        header = ["project", "date", "hours"]
+        for line_number, row in enumerate(reader, 1):
+            if not row:
+                continue
+            if line_number == 1 and [cell.strip().lower() for cell in row[:3]] == header:
+                header = [cell.strip().lower() for cell in row]
+                continue
+            yield line_number, dict(zip(header, row))
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as file:
+        for line_number, line in enumerate(file, 1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError:
+                    yield line_number, None
+
+
+def read_entries(path, file_format=None):
+    file_format = file_format or ("jsonl" if path.endswith(".jsonl") else "csv")
+    if file_format == "jsonl":
+        return read_jsonl(path)
+    return read_csv(path)
+
+
+def parse_hours(value):
+    hours = float(value)
+    if not 0 < hours <= 24:
+        raise ValueError("hours must be greater than 0 and at most 24")
+    return int(hours) if hours.is_integer() else hours
+
+
+def validate_entry(entry):
+    # (project, "YYYY-MM-DD", hours) or ValueError
+    if not isinstance(entry, dict):
+        raise ValueError("not a valid entry")
+    project = str(entry.get("project") or "").strip()
+    if not project:
+        raise ValueError("missing project name")
+    try:
+        date_str = date.fromisoformat(str(entry.get("date", "")).strip()).isoformat()
+    except ValueError:
+        raise ValueError(f"invalid date {entry.get('date')!r}, expected YYYY-MM-DD")
+    try:
+        hours = parse_hours(entry.get("hours"))
+    except (TypeError, ValueError) as error:
+        raise ValueError(f"invalid hours {entry.get('hours')!r}: {error}")
+    return project, date_str, hours
+
+
+def collect_entries(paths, file_format=None, skip_invalid=False):
+    # Stream every file and sum the hours per (project, date). Memory grows
+    # with the number of distinct project/date pairs, not with the rows read.
+    totals = {}
+    names = {}
+    rows = 0
+    errors = []
+    for path in paths:
+        for line_number, entry in read_entries(path, file_format):
+            rows += 1
+            try:
+                project, date_str, hours = validate_entry(entry)
+            except ValueError as error:
+                errors.append(f"{path}:{line_number}: {error}")
+                continue
+            project = names.setdefault(project, project)
+            key = (project, date_str)
+            totals[key] = totals.get(key, 0) + hours
+
+    if errors and not skip_invalid:
+        raise InvalidEntries(errors)
+    return totals, rows, errors
+
+
+def import_entries(args):
+    try:
+        totals, rows, errors = collect_entries(args.files, args.format, args.skip_invalid)
+    except InvalidEntries as error:
+        messages = error.errors
+        for message in messages[:MAX_ERRORS_SHOWN]:
+            print(message, file=sys.stderr)
+        if len(messages) > MAX_ERRORS_SHOWN:
+            print(f"... and {len(messages) - MAX_ERRORS_SHOWN} more", file=sys.stderr)
+        print("Nothing was imported.", file=sys.stderr)
+        return 1
+    except OSError as error:
+        print(f"Could not read input: {error}", file=sys.stderr)
+        return 1
+
+    for message in errors[:MAX_ERRORS_SHOWN]:
+        print(f"skipped {message}", file=sys.stderr)
+
+    ops = [{"op": "add_hours", "project": project, "date": date_str, "hours": hours}
+           for (project, date_str), hours in sorted(totals.items(), key=lambda item: item[0][1])]
+
+    # One batched mutation and one save for the whole import
+    store = open_store(args.store)
+    store.load()
+    store.apply_batch(ops)
+    store.close()
+
+    print(f"Imported {rows - len(errors)} rows as {len(ops)} entries"
+          f" ({len(errors)} skipped).")
+    return 0
+
+
+def report(args):
+    store = open_store(args.store)
+    if args.period or args.by != "project":
+        # Rollups saved by the window are used while they are current
+        fingerprint = store_fingerprint(store)
+        projects = store.load()
+        rollups = load_rollups(store, projects, fingerprint) or build_rollups(projects)
+        period = args.period or "week"
+        breakdown = rollup_breakdown(rollups, period, args.by)
+        if args.week:
+            breakdown = [item for item in breakdown if item[0] == args.week]
+        print(breakdown_text(breakdown, period, args.by), end="")
+        store.close()
+        return 0
+
+    index = build_index(store, store.load())
+    if args.week:
+        for week, rows, week_total in weekly_breakdown(index):
+            if week == args.week:
+                print(f"Week: {week}")
+                for project, hours, percentage in rows:
+                    print(f"  - {project}: {hours} hours ({percentage:.2f}%)")
+                print(f"  Total hours in week: {week_total}")
+                break
+        else:
+            print(f"No hours recorded in week {args.week}.")
+    else:
+        print(hours_report_text(index), end="")
+    store.close()
+    return 0
+
+
+def export(args):
+    store = open_store(args.store)
+    index = build_index(store, store.load())
+    try:
+        paths = export_reports(index, args.path)
+    except (OSError, RuntimeError) as error:
+        print(f"Could not export the report: {error}", file=sys.stderr)
+        return 1
+    finally:
+        store.close()
+    for path in paths:
+        print(f"Wrote {path}")
+    return 0
+
+
+def consolidate_files(args):
+    team = consolidate(args.files, args.workers)
+    for path, message in team.errors:
+        print(f"{path}: {message}", file=sys.stderr)
+    if team.errors and not args.skip_invalid:
+        print("Nothing was consolidated.", file=sys.stderr)
+        return 1
+    notes = team.collisions()
+    for line in notes[:MAX_ERRORS_SHOWN]:
+        print(f"note: {line}", file=sys.stderr)
+    if len(notes) > MAX_ERRORS_SHOWN:
+        print(f"note: ... and {len(notes) - MAX_ERRORS_SHOWN} more", file=sys.stderr)
+
+    if args.output:
+        try:
+            paths = export_reports(team, args.output)
+        except (OSError, RuntimeError) as error:
+            print(f"Could not export the report: {error}", file=sys.stderr)
+            return 1
+        for path in paths:
+            print(f"Wrote {path}")
+    else:
+        print(hours_report_text(team), end="")
+    print(f"Consolidated {len(team.files)} files: {team.project_count()} projects,"
+          f" {team.entries} entries ({len(team.errors)} files skipped).", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog=os.path.basename(sys.argv[0]),
+                                     description="Project Time Tracker without the GUI")
+    parser.add_argument("--store", default=None,
+                        help="storage to use, e.g. journal:projects.json or sqlite:projects.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="add hours from CSV or JSON Lines files")
+    import_parser.add_argument("files", nargs="+",
+                               help="files with project, date (YYYY-MM-DD) and hours")
+    import_parser.add_argument("--format", choices=("csv", "jsonl"),
+                               help="input format (default: by file extension)")
+    import_parser.add_argument("--skip-invalid", action="store_true",
+                               help="import the valid rows even if some rows are invalid")
+    import_parser.add_argument("--store", default=argparse.SUPPRESS, help=argparse.SUPPRESS)
+    import_parser.set_defaults(func=import_entries)
+
+    report_parser = commands.add_parser("report", help="print the weekly hours overview")
+    report_period = report_parser.add_mutually_exclusive_group()
+    report_period.add_argument("--week", help="only this ISO week, e.g. 2024-W10")
+    report_period.add_argument("--period", choices=PERIODS,
+                               help="hours per week, month, quarter or year")
+    report_parser.add_argument("--by", choices=GROUPINGS, default="project",
+                               help="hours per project (default) or per account number")
+    report_parser.add_argument("--store", default=argparse.SUPPRESS, help=argparse.SUPPRESS)
+    report_parser.set_defaults(func=report)
+
+    export_parser = commands.add_parser(
+        "export", help="write per-day, per-week and per-project reports to CSV or Excel")
+    export_parser.add_argument("path", help="report.xlsx, or report.csv for one CSV per report")
+    export_parser.add_argument("--store", default=argparse.SUPPRESS, help=argparse.SUPPRESS)
+    export_parser.set_defaults(func=export)
+
+    consolidate_parser = commands.add_parser(
+        "consolidate", help="combine several projects.json files into one team report")
+    consolidate_parser.add_argument("files", nargs="+", help="projects.json files, one per person")
+    consolidate_parser.add_argument("--output",
+                                    help="write report.xlsx or report.csv instead of printing")
+    consolidate_parser.add_argument("--workers", type=int,
+                                    help="processes reading the files (default: one per CPU)")
+    consolidate_parser.add_argument("--skip-invalid", action="store_true",
+                                    help="leave out files that can't be read instead of stopping")
+    consolidate_parser.set_defaults(func=consolidate_files)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+from collections.abc import Mapping
+
+import numpy as np
+
+from iso_calendar import week_label, day_ordinal, ordinal_date
+from hours_index import state_before, change_events
+
+
+def week_of(ordinals):
+    # date.toordinal() is 1 for Monday 0001-01-01, so this numbers the
+    # Monday-based (ISO) weeks consecutively
+    return (ordinals - 1) // 7
+
+
+def tidy_number(value):
+    # float64 sums back to the ints the JSON file normally holds
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+class ColumnarHours:
+    # Hours entries kept as three parallel arrays (project id, day ordinal,
+    # hours) instead of nested dicts. A (project, day) pair may appear in more
+    # than one row; every aggregate sums them, and compact() merges them.
+    #
+    # Exposes the same read interface as HoursIndex (weeks, week_report,
+    # daily_series, day_total, apply_changes) so the views can use either one,
+    # and a read-only dict view (ProjectsView) for code expecting self.projects.
+
+    def __init__(self, capacity=1024):
+        self.project_names = []
+        self.project_ids = {}
+        self.details = {}
+        self.size = 0
+        self.project_col = np.empty(capacity, dtype=np.int32)
+        self.day_col = np.empty(capacity, dtype=np.int32)
+        self.hours_col = np.empty(capacity, dtype=np.float64)
+        self.version = 0
+        self.cache = {}
+        self.cache_version = 0
+
+    @classmethod
+    def from_projects(cls, projects):
+        store = cls()
+        project_ids, days, hours = [], [], []
+        for project, details in projects.items():
+            pid = store.project_id(project)
+            store.details[project] = {key: value for key, value in details.items()
+                                      if key != "hours"}
+            for date_str, value in details.get("hours", {}).items():
+                project_ids.append(pid)
+                days.append(day_ordinal(date_str))
+                hours.append(value)
+        store.extend(project_ids, days, hours)
+        return store
+
+    def project_id(self, project):
+        pid = self.project_ids.get(project)
+        if pid is None:
+            pid = len(self.project_names)
+            self.project_ids[project] = pid
+            self.project_names.append(project)
+            self.details.setdefault(project, {})
+        return pid
+
+    def reserve(self, extra):
+        needed = self.size + extra
+        capacity = len(self.day_col)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ("project_col", "day_col", "hours_col"):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def extend(self, project_ids, days, hours):
+        count = len(days)
+        self.reserve(count)
+        end = self.size + count
+        self.project_col[self.size:end] = project_ids
+        self.day_col[self.size:end] = days
+        self.hours_col[self.size:end] = hours
+        self.size = end
+        self.version += 1
+
+    def append(self, project, date_str, hours):
+        self.extend([self.project_id(project)], [day_ordinal(date_str)], [hours])
+
+    def remove(self, keys):
+        # keys: iterable of (project, date_str) whose rows are dropped
+        codes = [(self.project_ids[project] << 32) | day_ordinal(date_str)
+                 for project, date_str in keys if project in self.project_ids]
+        if not codes:
+            return
+        n = self.size
+        row_codes = (self.project_col[:n].astype(np.int64) << 32) | self.day_col[:n]
+        keep = ~np.isin(row_codes, np.array(codes, dtype=np.int64))
+        kept = int(keep.sum())
+        self.project_col[:kept] = self.project_col[:n][keep]
+        self.day_col[:kept] = self.day_col[:n][keep]
+        self.hours_col[:kept] = self.hours_col[:n][keep]
+        self.size = kept
+        self.version += 1
+
+    def apply_changes(self, changes):
+        weeks_before, days_before = state_before(self, changes)
+        # Net the changes per (project, day) first: whether the day was
+        # removed at some point, the hours added after the last removal, and
+        # whether it was created after that, so a day removed and added
+        # again in one batch keeps its new hours. A created day gets a row
+        # even with 0 hours, so it still counts as a day with an entry.
+        net = {}
+        for project, date_str, old_hours, new_hours in changes:
+            if new_hours is None:
+                net[(project, date_str)] = [True, 0, False]
+            else:
+                state = net.setdefault((project, date_str), [False, 0, False])
+                state[1] += new_hours - (old_hours or 0)
+                state[2] = state[2] or old_hours is None
+        self.remove([key for key, (removed, _, _) in net.items() if removed])
+        added = [(key, delta) for key, (_, delta, created) in net.items() if delta or created]
+        if added:
+            self.extend([self.project_id(project) for (project, _), _ in added],
+                        [day_ordinal(date_str) for (_, date_str), _ in added],
+                        [delta for _, delta in added])
+        return change_events(self, weeks_before, days_before)
+
+    def add_project(self, project, details):
+        self.project_id(project)
+        self.details[project] = {key: value for key, value in details.items()
+                                 if key != "hours"}
+
+    def compact(self):
+        # Merge duplicate (project, day) rows into one
+        codes, sums = self.group_sum(
+            (self.project_col[:self.size].astype(np.int64) << 32) | self.day_col[:self.size])
+        count = len(codes)
+        self.project_col[:count] = codes >> 32
+        self.day_col[:count] = codes & 0xFFFFFFFF
+        self.hours_col[:count] = sums
+        self.size = count
+        self.version += 1
+
+    # Vectorized aggregation
+
+    def group_sum(self, keys):
+        groups, inverse = np.unique(keys, return_inverse=True)
+        sums = np.bincount(inverse, weights=self.hours_col[:self.size],
+                           minlength=len(groups))
+        return groups, sums
+
+    def cached(self, name, compute):
+        if self.cache_version != self.version:
+            self.cache = {}
+            self.cache_version = self.version
+        if name not in self.cache:
+            self.cache[name] = compute()
+        return self.cache[name]
+
+    def per_day(self):
+        # (day ordinals, total hours) sorted by day
+        return self.cached("per_day", lambda: self.group_sum(self.day_col[:self.size]))
+
+    def per_week(self):
+        # (week numbers, total hours) sorted by week
+        return self.cached("per_week", lambda: self.group_sum(
+            week_of(self.day_col[:self.size])))
+
+    def per_project(self):
+        # total hours indexed by project id
+        return self.cached("per_project", lambda: np.bincount(
+            self.project_col[:self.size], weights=self.hours_col[:self.size],
+            minlength=len(self.project_names)))
+
+    def per_week_project(self):
+        # (week numbers, project ids, hours, percentage of the week's hours)
+        def compute():
+            projects = max(len(self.project_names), 1)
+            keys = week_of(self.day_col[:self.size]).astype(np.int64) * projects \
+                + self.project_col[:self.size]
+            groups, sums = self.group_sum(keys)
+            weeks, pids = groups // projects, groups % projects
+            week_numbers, week_totals = self.per_week()
+            totals = week_totals[np.searchsorted(week_numbers, weeks)]
+            safe_totals = np.where(totals > 0, totals, 1)
+            percentages = np.where(totals > 0, sums / safe_totals * 100, 0)
+            return weeks, pids, sums, percentages
+        return self.cached("per_week_project", compute)
+
+    # HoursIndex-compatible interface
+
+    @property
+    def weeks(self):
+        return list(self.week_reports())
+
+    def week_reports(self):
+        def compute():
+            reports = {}
+            labels = {}
+            week_numbers, week_totals = self.per_week()
+            for week, total in zip(week_numbers.tolist(), week_totals.tolist()):
+                labels[week] = week_label(ordinal_date(week * 7 + 1))
+                reports[labels[week]] = ({}, tidy_number(total))
+            weeks, pids, sums, _ = self.per_week_project()
+            for week, pid, value in zip(weeks.tolist(), pids.tolist(), sums.tolist()):
+                reports[labels[week]][0][self.project_names[pid]] = tidy_number(value)
+            return reports
+        return self.cached("week_reports", compute)
+
+    def week_report(self, week):
+        return self.week_reports().get(week, ({}, 0))
+
+    def has_week(self, week):
+        return week in self.week_reports()
+
+    def day_totals(self):
+        def compute():
+            days, totals = self.per_day()
+            return {ordinal_date(day): tidy_number(total)
+                    for day, total in zip(days.tolist(), totals.tolist())}
+        return self.cached("day_totals", compute)
+
+    def entry_count(self):
+        # (project, day) pairs; compact() hasn't necessarily merged their rows
+        return self.cached("entry_count", lambda: len(np.unique(
+            (self.project_col[:self.size].astype(np.int64) << 32) | self.day_col[:self.size])))
+
+    def daily_series(self):
+        totals = self.day_totals()
+        return list(totals), list(totals.values())
+
+    def day_total(self, date_str):
+        return self.day_totals().get(date_str, 0)
+
+    def has_day(self, date_str):
+        return date_str in self.day_totals()
+
+    # Dict-compatible access
+
+    def project_hours(self, project):
+        pid = self.project_ids.get(project)
+        if pid is None:
+            return {}
+        mask = self.project_col[:self.size] == pid
+        days = self.day_col[:self.size][mask]
+        hours = self.hours_col[:self.size][mask]
+        totals = {}
+        for day, value in zip(days.tolist(), hours.tolist()):
+            date_str = ordinal_date(day)
+            totals[date_str] = totals.get(date_str, 0) + value
+        return {date_str: tidy_number(value) for date_str, value in sorted(totals.items())}
+
+    def as_dict(self):
+        return ProjectsView(self)
+
+    def to_projects(self):
+        return {project: details for project, details in self.as_dict().items()}
+
+    def nbytes(self):
+        return self.project_col.nbytes + self.day_col.nbytes + self.hours_col.nbytes
+
+
+class ProjectsView(Mapping):
+    # Read-only {project: {"account_number", "comments", "hours"}} view over a
+    # ColumnarHours, materializing one project's hours only when it is accessed
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, project):
+        if project not in self.store.project_ids:
+            raise KeyError(project)
+        details = dict(self.store.details.get(project, {}))
+        details["hours"] = self.store.project_hours(project)
+        return details
+
+    def __iter__(self):
+        return iter(self.store.project_names)
+
+    def __len__(self):
+        return len(self.store.project_names)
@@ -0,0 +1,185 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from iso_calendar import week_label
+from storage import read_projects
+
+# Combines many people's projects.json files into one team report. Each
+# file is read and reduced to hours per project and ISO week (plus hours
+# per day for the daily report) in a worker process, so only those small
+# partial sums travel back; the main process just adds them up.
+#
+# Projects are matched by name (ignoring case and surrounding spaces) and
+# account number. A project without an account number joins the same name
+# with an account number if there is exactly one such. The same name with
+# different account numbers stays separate projects, reported as
+# "Name [account]".
+
+NO_ACCOUNT = ""
+
+
+def summarize_file(path):
+    # Runs in a worker process. Returns the partial sums of one file:
+    #   {"path", "projects": [(name, account, comments)],
+    #    "weeks": {(project number, week): hours}, "days": {date: hours},
+    #    "entries", "error"}
+    partial = {"path": path, "projects": [], "weeks": {}, "days": {},
+               "entries": 0, "error": None}
+    if not os.path.exists(path):
+        partial["error"] = "file not found"
+        return partial
+    try:
+        projects = read_projects(path)
+        weeks, days = partial["weeks"], partial["days"]
+        for pid, (name, details) in enumerate(projects.items()):
+            account = str(details.get("account_number") or NO_ACCOUNT).strip()
+            partial["projects"].append((name, account, details.get("comments") or ""))
+            for date_str, hours in details.get("hours", {}).items():
+                if isinstance(hours, bool) or not isinstance(hours, (int, float)):
+                    raise ValueError(f"hours of {name!r} on {date_str} are not a number")
+                key = (pid, week_label(date_str))
+                weeks[key] = weeks.get(key, 0) + hours
+                days[date_str] = days.get(date_str, 0) + hours
+                partial["entries"] += 1
+    except (OSError, ValueError, AttributeError) as error:
+        partial.update(projects=[], weeks={}, days={}, entries=0, error=str(error))
+    return partial
+
+
+def summarize_files(paths, workers=None):
+    # Partial sums of every file, in the order of `paths`. One file, or
+    # workers=1, is read in this process.
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) == 1:
+        return [summarize_file(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+        return list(executor.map(summarize_file, paths))
+
+
+class Consolidation:
+    # The merged partial sums. Reads like an hours index (weeks,
+    # week_report, daily_series, day_total) so hours_report_text and
+    # export_reports work on it.
+
+    def __init__(self, partials):
+        self.files = []
+        self.errors = []
+        self.entries = 0
+        self.week_sums = {}  # (folded name, account, week) -> hours
+        self.day_totals = {}
+        self.spellings = {}  # (folded name, account) -> {name: [paths]}
+        for partial in partials:
+            self.add(partial)
+        self.resolve()
+
+    def add(self, partial):
+        if partial["error"]:
+            self.errors.append((partial["path"], partial["error"]))
+            return
+        self.files.append(partial["path"])
+        self.entries += partial["entries"]
+        keys = []
+        for name, account, _ in partial["projects"]:
+            key = (name.strip().casefold(), account)
+            self.spellings.setdefault(key, {}).setdefault(name, []).append(partial["path"])
+            keys.append(key)
+        for (pid, week), hours in partial["weeks"].items():
+            sum_key = keys[pid] + (week,)
+            self.week_sums[sum_key] = self.week_sums.get(sum_key, 0) + hours
+        for date_str, hours in partial["days"].items():
+            self.day_totals[date_str] = self.day_totals.get(date_str, 0) + hours
+
+    def resolve(self):
+        # Decide which keys are one project and what each is called
+        accounts = {}  # folded name -> {accounts}
+        for folded, account in self.spellings:
+            accounts.setdefault(folded, set()).add(account)
+        self.merged_into = {}
+        for folded, found in accounts.items():
+            numbered = found - {NO_ACCOUNT}
+            if NO_ACCOUNT in found and len(numbered) == 1:
+                self.merged_into[(folded, NO_ACCOUNT)] = (folded, numbered.pop())
+
+        remaining = {}
+        for key in self.spellings:
+            if key not in self.merged_into:
+                remaining.setdefault(key[0], []).append(key)
+        self.labels = {}
+        for keys in remaining.values():
+            for key in keys:
+                name = self.display_name(key)
+                if len(keys) > 1:
+                    name = f"{name} [{key[1] or 'no account'}]"
+                self.labels[key] = name
+
+        self.reports = {}
+        for (folded, account, week), hours in self.week_sums.items():
+            key = self.merged_into.get((folded, account), (folded, account))
+            projects, total = self.reports.get(week, ({}, 0))
+            label = self.labels[key]
+            projects[label] = projects.get(label, 0) + hours
+            self.reports[week] = (projects, total + hours)
+        for week, (projects, total) in self.reports.items():
+            self.reports[week] = (dict(sorted(projects.items())), total)
+        self.weeks = sorted(self.reports)
+
+    def display_name(self, key):
+        # The spelling used in the most files, the first one on a tie
+        spellings = dict(self.spellings[key])
+        merged = [other for other, target in self.merged_into.items() if target == key]
+        for other in merged:
+            for name, paths in self.spellings[other].items():
+                spellings.setdefault(name, []).extend(paths)
+        return max(spellings, key=lambda name: len(spellings[name]))
+
+    def project_count(self):
+        return len(self.labels)
+
+    def collisions(self):
+        # Lines describing names and account numbers that didn't line up
+        lines = []
+        for key, label in sorted(self.labels.items(), key=lambda item: item[1]):
+            names = self.spellings[key]
+            if len(names) > 1:
+                lines.append(f"Merged as {label!r}: " + ", ".join(
+                    f"{name!r} ({', '.join(paths)})" for name, paths in names.items()))
+        for (folded, account), target in sorted(self.merged_into.items()):
+            names = ", ".join(sorted({path for paths in self.spellings[(folded, account)].values()
+                                      for path in paths}))
+            lines.append(f"{self.labels[target]!r} without account number ({names}) "
+                         f"counted under account {target[1]}")
+        by_name = {}
+        for key, label in self.labels.items():
+            by_name.setdefault(key[0], []).append(label)
+        for labels in by_name.values():
+            if len(labels) > 1:
+                lines.append("Same name, different account numbers, reported separately: "
+                             + ", ".join(sorted(labels)))
+        by_account = {}
+        for (folded, account), label in self.labels.items():
+            if account != NO_ACCOUNT:
+                by_account.setdefault(account, []).append(label)
+        for account, labels in sorted(by_account.items()):
+            if len(labels) > 1:
+                lines.append(f"Account number {account} is used by several projects: "
+                             + ", ".join(sorted(labels)))
+        return lines
+
+    # Hours index interface
+
+    def week_report(self, week):
+        return self.reports.get(week, ({}, 0))
+
+    def has_week(self, week):
+        return week in self.reports
+
+    def daily_series(self):
+        dates = sorted(self.day_totals)
+        return dates, [self.day_totals[date_str] for date_str in dates]
+
+    def day_total(self, date_str):
+        return self.day_totals.get(date_str, 0)
+
+
+def consolidate(paths, workers=None):
+    return Consolidation(summarize_files(paths, workers))
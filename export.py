@@ -0,0 +1,92 @@
+import os
+import csv
+
+from reports import REPORTS
+
+PROGRESS_EVERY = 1000
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def track(rows, progress, stage, title, cancelled):
+    # Pass rows through, reporting progress every PROGRESS_EVERY rows and
+    # stopping when cancelled() turns true
+    count = 0
+    for count, row in enumerate(rows, 1):
+        if count % PROGRESS_EVERY == 0:
+            if cancelled is not None and cancelled():
+                raise ExportCancelled()
+            if progress is not None:
+                progress(stage, len(REPORTS), title, count)
+        yield row
+    if progress is not None:
+        progress(stage + 1, len(REPORTS), title, count)
+
+
+def csv_paths(path):
+    # "report.csv" -> {"daily": "report-daily.csv", ...}
+    base, _ = os.path.splitext(path)
+    return {key: f"{base}-{key}.csv" for key, _, _, _ in REPORTS}
+
+
+class TmpFiles:
+    # `with TmpFiles(paths) as tmp_paths:` writes to a .tmp file per path.
+    # They replace the real files only once all are written, and are
+    # removed when the export fails or is cancelled, so no half-written
+    # report is left behind under the real name.
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def __enter__(self):
+        return [path + ".tmp" for path in self.paths]
+
+    def __exit__(self, kind, error, traceback):
+        for path in self.paths:
+            if kind is None:
+                os.replace(path + ".tmp", path)
+            elif os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+        return False
+
+
+def export_csv(index, path, progress=None, cancelled=None):
+    # One CSV file per report, written row by row
+    paths = csv_paths(path)
+    with TmpFiles(list(paths.values())) as tmp_paths:
+        for stage, ((key, title, header, rows), tmp_path) in enumerate(zip(REPORTS, tmp_paths)):
+            with open(tmp_path, "w", newline="", encoding="utf-8") as file:
+                writer = csv.writer(file)
+                writer.writerow(header)
+                writer.writerows(track(rows(index), progress, stage, title, cancelled))
+    return list(paths.values())
+
+
+def export_xlsx(index, path, progress=None, cancelled=None):
+    # One worksheet per report. openpyxl's write-only mode streams the rows
+    # to disk instead of keeping the workbook in memory.
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError("Excel export needs the openpyxl package (pip install openpyxl).")
+
+    workbook = Workbook(write_only=True)
+    for stage, (key, title, header, rows) in enumerate(REPORTS):
+        sheet = workbook.create_sheet(title)
+        sheet.append(header)
+        for row in track(rows(index), progress, stage, title, cancelled):
+            sheet.append(row)
+    with TmpFiles([path]) as (tmp_path,):
+        workbook.save(tmp_path)
+    return [path]
+
+
+def export_reports(index, path, progress=None, cancelled=None):
+    # Write the per-day, per-week and per-project reports; the format follows
+    # the file extension. Returns the files written.
+    # progress(stage, stages, title, rows) is called from the exporting thread.
+    if path.lower().endswith(".xlsx"):
+        return export_xlsx(index, path, progress, cancelled)
+    return export_csv(index, path, progress, cancelled)
@@ -0,0 +1,289 @@
+import numpy as np
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QScrollBar
+
+from instrumentation import timed
+from report_cache import LruCache
+
+# Matplotlib date number of day 0 (1970-01-01), whatever the configured epoch
+EPOCH_OFFSET = mdates.date2num(np.datetime64("1970-01-01"))
+MONDAY = 4  # 1970-01-05, the first Monday after day 0
+# Rendered backgrounds kept for windows shown before, about 1 MB each
+CACHED_BACKGROUNDS = 16
+
+
+def to_days(dates):
+    # "YYYY-MM-DD" strings -> days since 1970-01-01
+    return np.array(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+def bucket_keys(days, tier):
+    if tier == "week":
+        return (days - MONDAY) // 7
+    months = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    if tier == "month":
+        return months
+    return months // 12
+
+
+def bucket_starts(keys, tier):
+    # First day (days since 1970-01-01) of the buckets numbered `keys`
+    if tier == "week":
+        return keys * 7 + MONDAY
+    unit = "datetime64[M]" if tier == "month" else "datetime64[Y]"
+    return keys.astype(unit).astype("datetime64[D]").astype(np.int64)
+
+
+def bucket_totals(days, hours, max_points):
+    # Total hours per week, month or year, the finest of those with at most
+    # max_points buckets from the first to the last day: (first day of each
+    # bucket and of the one after the last, totals, tier). Buckets without
+    # hours total 0.
+    for tier in ("week", "month", "year"):
+        keys = bucket_keys(days, tier)
+        if keys[-1] - keys[0] + 1 <= max_points:
+            break
+    totals = np.bincount(keys - keys[0], weights=hours)
+    return bucket_starts(np.arange(keys[0], keys[-1] + 2), tier), totals, tier
+
+
+def downsample(days, hours, max_points):
+    # Min/max downsampling: pick the coarsest of week/month/year buckets that
+    # gets under max_points and keep each bucket's lowest and highest day, so
+    # peaks (and over-threshold days) stay visible
+    if len(days) <= max_points:
+        return days, hours
+    for tier in ("week", "month", "year"):
+        keys = bucket_keys(days, tier)
+        if 2 * (keys[-1] - keys[0] + 1) <= max_points:
+            break
+
+    order = np.lexsort((hours, keys))
+    sorted_keys = keys[order]
+    first = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    last = np.r_[first[1:] - 1, len(order) - 1]
+    picked = np.unique(np.concatenate([order[first], order[last]]))
+    return days[picked], hours[picked]
+
+
+class HoursChart:
+    # The "Hours Worked Per Day" chart on a real date axis. The figure and its
+    # artists are created once; refresh() swaps in new data and render()
+    # draws only the visible window, downsampled to at most max_points, so
+    # drawing time doesn't depend on how many years of data exist. A strip
+    # below it shows the whole history as weekly, monthly or yearly totals
+    # (also at most max_points) with the window shaded.
+    #
+    # The scroll bar pans the window, the mouse wheel zooms it, and clicking
+    # the overview moves the window to the clicked date. When the
+    # window's axes don't change the artists are blitted onto the cached
+    # background instead of redrawing the figure. Backgrounds are kept per
+    # axis limits and size, so going back to a window shown before doesn't
+    # redraw either; they hold no data, so changed hours never make them
+    # stale. The figure is not registered with pyplot, so nothing keeps old
+    # figures alive.
+
+    def __init__(self, series_source, threshold=8, debounce_ms=50,
+                 window_days=90, max_points=600, run_async=None):
+        # series_source() returns (sorted date strings, total hours per date).
+        # With run_async(func, callback) it is called off the GUI thread.
+        self.series_source = series_source
+        self.run_async = run_async
+        self.requests = 0
+        self.threshold = threshold
+        self.window_days = window_days
+        self.max_points = max_points
+
+        self.figure = Figure(figsize=(8, 4))
+        self.canvas = FigureCanvas(self.figure)
+        grid = self.figure.add_gridspec(2, 1, height_ratios=(4, 1), hspace=0.6)
+        self.ax = self.figure.add_subplot(grid[0])
+        self.hours_line, = self.ax.plot([], [], marker='o', color='b',
+                                        label='Hours Worked', animated=True)
+        self.over_points = self.ax.scatter([], [], color='r', zorder=3, animated=True)
+
+        self.overview = self.figure.add_subplot(grid[1])
+        self.overview_line, = self.overview.plot([], [], color='b', linewidth=0.8,
+                                                 drawstyle='steps-post', animated=True)
+        self.window_span = Rectangle((0, 0), 0, 1, color='b', alpha=0.2, animated=True,
+                                     transform=self.overview.get_xaxis_transform())
+        self.overview.add_patch(self.window_span)
+        self.overview.tick_params(labelsize=7)
+        overview_locator = mdates.AutoDateLocator()
+        self.overview.xaxis.set_major_locator(overview_locator)
+        self.overview.xaxis.set_major_formatter(mdates.ConciseDateFormatter(overview_locator))
+        self.overview_limits = None
+
+        self.ax.set_xlabel("Date")
+        self.ax.set_ylabel("Total Hours")
+        self.ax.set_title("Hours Worked Per Day")
+        locator = mdates.AutoDateLocator()
+        self.ax.xaxis.set_major_locator(locator)
+        self.ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+
+        self.scrollbar = QScrollBar(Qt.Horizontal)
+        self.scrollbar.valueChanged.connect(self.scroll_to)
+        self.widget = QWidget()
+        layout = QVBoxLayout(self.widget)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.canvas)
+        layout.addWidget(self.scrollbar)
+
+        self.days = np.empty(0, dtype=np.int64)
+        self.hours = np.empty(0)
+        self.window_end = None  # None follows the latest date
+        self.limits = None
+        self.background = None
+        self.backgrounds = LruCache("Chart backgrounds", CACHED_BACKGROUNDS)
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+        self.canvas.mpl_connect("scroll_event", self.on_scroll)
+        self.canvas.mpl_connect("button_press_event", self.on_click)
+
+        # Several mutations in a row only cause one redraw
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(debounce_ms)
+        self.timer.timeout.connect(self.refresh)
+
+    def schedule_refresh(self):
+        self.timer.start()
+
+    def refresh(self):
+        self.timer.stop()
+        if self.run_async is None:
+            self.set_series(self.load_series())
+            return
+
+        self.requests += 1
+        request = self.requests
+
+        def deliver(series):
+            # Ignore results overtaken by a newer refresh
+            if request == self.requests:
+                self.set_series(series)
+
+        self.run_async(self.load_series, deliver)
+
+    def load_series(self):
+        dates, hours = self.series_source()
+        return to_days(dates), np.asarray(hours, dtype=float)
+
+    def set_series(self, series):
+        self.days, self.hours = series
+        self.widget.setVisible(bool(len(self.days)))
+        if len(self.days):
+            starts, totals, tier = bucket_totals(self.days, self.hours, self.max_points)
+            # The last total is repeated so the step runs to the bucket's end
+            self.overview_line.set_data(starts + EPOCH_OFFSET, np.r_[totals, totals[-1]])
+            self.overview_limits = (starts[0] + EPOCH_OFFSET, starts[-1] + EPOCH_OFFSET,
+                                    0, totals.max() * 1.05 + 0.5, tier)
+        self.render()
+
+    def window(self):
+        if not len(self.days):
+            return 0, 0
+        end = self.days[-1] if self.window_end is None else self.window_end
+        return end - self.window_days, end
+
+    @timed("chart.render")
+    def render(self):
+        start, end = self.window()
+        # One day either side so the line runs to the edges of the window
+        lo = max(np.searchsorted(self.days, start, "left") - 1, 0)
+        hi = np.searchsorted(self.days, end, "right") + 1
+        days, hours = downsample(self.days[lo:hi], self.hours[lo:hi], self.max_points)
+
+        x = days + EPOCH_OFFSET
+        self.hours_line.set_data(x, hours)
+        over = hours > self.threshold
+        self.over_points.set_offsets(np.column_stack([x[over], hours[over]]))
+
+        visible = hours[(days >= start) & (days <= end)]
+        top = visible.max() if len(visible) else 1
+        self.window_span.set_x(start + EPOCH_OFFSET - 0.5)
+        self.window_span.set_width(end - start + 1)
+        # The overview's axes are part of the cached background too
+        limits = (start + EPOCH_OFFSET - 0.5, end + EPOCH_OFFSET + 0.5, 0, top * 1.05 + 0.5,
+                  self.overview_limits)
+        self.update_scrollbar(start, end)
+
+        if limits == self.limits and self.background is not None:
+            self.blit()
+            return
+        self.limits = limits
+        self.ax.set_xlim(limits[0], limits[1])
+        self.ax.set_ylim(limits[2], limits[3])
+        if self.overview_limits is not None:
+            first, last, bottom, overview_top, tier = self.overview_limits
+            self.overview.set_xlim(first, last)
+            self.overview.set_ylim(bottom, overview_top)
+            self.overview.set_ylabel(f"Per {tier}", fontsize=7)
+        background = self.backgrounds.get(self.background_key())
+        if background is not None:
+            self.background = background
+            self.blit()
+        else:
+            self.canvas.draw_idle()
+
+    def update_scrollbar(self, start, end):
+        self.scrollbar.blockSignals(True)
+        if len(self.days):
+            first = int(self.days[0]) + self.window_days
+            last = max(int(self.days[-1]), first)
+            self.scrollbar.setRange(first, last)
+            self.scrollbar.setPageStep(self.window_days)
+            self.scrollbar.setValue(int(end))
+        self.scrollbar.blockSignals(False)
+
+    def scroll_to(self, end):
+        at_latest = len(self.days) and end >= self.days[-1]
+        self.window_end = None if at_latest else end
+        self.render()
+
+    def on_scroll(self, event):
+        # Zoom around the mouse position
+        if not len(self.days):
+            return
+        _, end = self.window()
+        factor = 0.8 if event.button == "up" else 1.25
+        span = int(self.days[-1] - self.days[0]) + 1
+        new_days = int(min(max(self.window_days * factor, 7), max(span, 7)))
+        anchor = event.xdata - EPOCH_OFFSET if event.xdata is not None else end
+        ratio = (end - anchor) / self.window_days
+        new_end = int(round(anchor + ratio * new_days))
+        self.window_days = new_days
+        self.window_end = None if new_end >= self.days[-1] else new_end
+        self.render()
+
+    def on_click(self, event):
+        # Clicking the overview centers the window on the clicked date
+        if event.inaxes is not self.overview or event.xdata is None or not len(self.days):
+            return
+        end = int(round(event.xdata - EPOCH_OFFSET)) + self.window_days // 2
+        self.window_end = None if end >= self.days[-1] else max(end, int(self.days[0]))
+        self.render()
+
+    def background_key(self):
+        return self.limits, self.canvas.get_width_height()
+
+    def on_draw(self, event):
+        # Cache everything except the data, then draw the data on top
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        if self.limits is not None:
+            self.backgrounds.put(self.background_key(), self.background)
+        self.draw_artists()
+
+    def draw_artists(self):
+        self.ax.draw_artist(self.hours_line)
+        self.ax.draw_artist(self.over_points)
+        self.overview.draw_artist(self.overview_line)
+        self.overview.draw_artist(self.window_span)
+
+    def blit(self):
+        self.canvas.restore_region(self.background)
+        self.draw_artists()
+        self.canvas.blit(self.figure.bbox)
@@ -0,0 +1,170 @@
+from bisect import bisect_left, insort
+
+from iso_calendar import week_label
+
+# Events returned by apply_changes, so views can update in place:
+#   (WEEK_ADDED, week), (WEEK_REMOVED, week), (DAY_CHANGED, date, new total)
+WEEK_ADDED = "week_added"
+WEEK_REMOVED = "week_removed"
+DAY_CHANGED = "day_changed"
+
+
+def state_before(index, changes):
+    # ({week: has entries}, {date: total}) for the weeks and days the
+    # changes touch, read before the index applies them
+    dates = {change[1] for change in changes}
+    weeks = {week_label(date_str) for date_str in dates}
+    return ({week: index.has_week(week) for week in weeks},
+            {date_str: index.day_total(date_str) for date_str in dates})
+
+
+def applied_change_events(index, changes):
+    # Events for changes the index already reflects (a store answering the
+    # queries itself). The state before them is worked out backwards from
+    # the change list; needs index.week_entries(week).
+    created, removed, day_deltas = {}, {}, {}
+    for _, date_str, old_hours, new_hours in changes:
+        week = week_label(date_str)
+        created[week] = created.get(week, 0) + (old_hours is None)
+        removed[week] = removed.get(week, 0) + (new_hours is None)
+        day_deltas[date_str] = day_deltas.get(date_str, 0) + (new_hours or 0) - (old_hours or 0)
+    weeks_before = {week: index.week_entries(week) - created[week] + removed[week] > 0
+                    for week in created}
+    days_before = {date_str: index.day_total(date_str) - delta
+                   for date_str, delta in day_deltas.items()}
+    return change_events(index, weeks_before, days_before)
+
+
+def change_events(index, weeks_before, days_before):
+    # Compare the state before (see state_before) with the index now
+    events = []
+    for week in sorted(weeks_before):
+        exists = index.has_week(week)
+        if exists and not weeks_before[week]:
+            events.append((WEEK_ADDED, week))
+        elif weeks_before[week] and not exists:
+            events.append((WEEK_REMOVED, week))
+    for date_str in sorted(days_before):
+        total = index.day_total(date_str)
+        if total != days_before[date_str]:
+            events.append((DAY_CHANGED, date_str, total))
+    return events
+
+
+class HoursIndex:
+    # Aggregates over self.projects[*]["hours"] that the hours views need.
+    # Built once from the projects dict and kept up to date from the change
+    # lists returned by storage.apply_op, so no view has to rescan every entry.
+
+    def __init__(self, projects=None):
+        self.rebuild(projects or {})
+
+    def rebuild(self, projects):
+        self.day_totals = {}
+        self.day_entries = {}
+        self.days = []
+        self.week_project_totals = {}
+        self.week_totals = {}
+        self.week_entries = {}
+        self.week_project_entries = {}
+        self.weeks = []
+
+        for project, details in projects.items():
+            if "hours" in details:
+                for date_str, hours in details["hours"].items():
+                    self.add_entry(project, date_str, hours, keep_sorted=False)
+
+        self.days.sort()
+        self.weeks.sort()
+
+    def apply_changes(self, changes):
+        # Returns the events for the views (see WEEK_ADDED above)
+        weeks_before, days_before = state_before(self, changes)
+        for project, date_str, old_hours, new_hours in changes:
+            if old_hours is not None:
+                self.remove_entry(project, date_str, old_hours)
+            if new_hours is not None:
+                self.add_entry(project, date_str, new_hours)
+        return change_events(self, weeks_before, days_before)
+
+    def add_entry(self, project, date_str, hours, keep_sorted=True):
+        week = week_label(date_str)
+
+        if date_str not in self.day_entries:
+            self.day_entries[date_str] = 0
+            self.day_totals[date_str] = 0
+            if keep_sorted:
+                insort(self.days, date_str)
+            else:
+                self.days.append(date_str)
+        self.day_entries[date_str] += 1
+        self.day_totals[date_str] += hours
+
+        if week not in self.week_entries:
+            self.week_entries[week] = 0
+            self.week_totals[week] = 0
+            self.week_project_totals[week] = {}
+            if keep_sorted:
+                insort(self.weeks, week)
+            else:
+                self.weeks.append(week)
+        self.week_entries[week] += 1
+        self.week_totals[week] += hours
+
+        key = (week, project)
+        project_totals = self.week_project_totals[week]
+        if key not in self.week_project_entries:
+            self.week_project_entries[key] = 0
+            project_totals[project] = 0
+        self.week_project_entries[key] += 1
+        project_totals[project] += hours
+
+    def remove_entry(self, project, date_str, hours):
+        week = week_label(date_str)
+
+        self.day_entries[date_str] -= 1
+        if self.day_entries[date_str]:
+            self.day_totals[date_str] -= hours
+        else:
+            del self.day_entries[date_str]
+            del self.day_totals[date_str]
+            del self.days[bisect_left(self.days, date_str)]
+
+        key = (week, project)
+        project_totals = self.week_project_totals[week]
+        self.week_project_entries[key] -= 1
+        if self.week_project_entries[key]:
+            project_totals[project] -= hours
+        else:
+            del self.week_project_entries[key]
+            del project_totals[project]
+
+        self.week_entries[week] -= 1
+        if self.week_entries[week]:
+            self.week_totals[week] -= hours
+        else:
+            del self.week_entries[week]
+            del self.week_totals[week]
+            del self.week_project_totals[week]
+            del self.weeks[bisect_left(self.weeks, week)]
+
+    def daily_series(self):
+        # Sorted dates and their total hours, as used by the chart
+        return list(self.days), [self.day_totals[date_str] for date_str in self.days]
+
+    def day_total(self, date_str):
+        return self.day_totals.get(date_str, 0)
+
+    def has_week(self, week):
+        return week in self.week_entries
+
+    def has_day(self, date_str):
+        return date_str in self.day_entries
+
+    def entry_count(self):
+        # (project, day) hours entries
+        return sum(self.day_entries.values())
+
+    def week_report(self, week):
+        # ({project: hours}, total hours) for one ISO week
+        return self.week_project_totals.get(week, {}), self.week_totals.get(week, 0)
@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import math
+import time
+import pstats
+import logging
+import cProfile
+import threading
+import functools
+from io import StringIO
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+METRICS_LOG = "timetracker-metrics.log"
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+
+
+class StartupTimer:
+    # Records how long each startup phase took, measured from `start`.
+    # Enabled with TIMETRACKER_STARTUP_TIMING: "1" prints the phases to
+    # stderr, anything else is a file that gets one JSON line per launch.
+
+    def __init__(self, start=None):
+        self.start = start if start is not None else time.perf_counter()
+        self.last = self.start
+        self.phases = []
+        self.target = os.environ.get("TIMETRACKER_STARTUP_TIMING")
+        self.reported = False
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last, now - self.start))
+        self.last = now
+
+    def report(self):
+        if self.reported or not self.target:
+            return
+        self.reported = True
+
+        if self.target == "1":
+            print("Startup timing:", file=sys.stderr)
+            for phase, duration, elapsed in self.phases:
+                print(f"  {phase:<20} {duration * 1000:8.1f} ms  (at {elapsed * 1000:8.1f} ms)",
+                      file=sys.stderr)
+        else:
+            record = {
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "phases": {phase: round(duration * 1000, 2) for phase, duration, _ in self.phases},
+                "total_ms": round(self.phases[-1][2] * 1000, 2) if self.phases else 0,
+            }
+            with open(self.target, "a") as file:
+                file.write(json.dumps(record) + "\n")
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of an unsorted sequence
+    ordered = sorted(values)
+    if not ordered:
+        return 0
+    rank = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[rank]
+
+
+class Timer:
+    # Context manager returned by Metrics.timer(); does nothing while the
+    # metrics are disabled
+
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if self.metrics.enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.start is not None:
+            self.metrics.record(self.name, (time.perf_counter() - self.start) * 1000)
+            self.start = None
+        return False
+
+
+class Metrics:
+    # Latencies and counters for the hot paths, kept for the last `samples`
+    # calls per operation. Enabled with TIMETRACKER_METRICS: "1" also logs
+    # every timing to timetracker-metrics.log, anything else names the log
+    # file. The log rolls over at 1 MB. While disabled a timed call costs one
+    # attribute check.
+
+    def __init__(self, target=None, samples=1000):
+        self.samples = samples
+        self.timings = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.log = None
+        self.log_path = None
+        self.profiler = None
+        self.enabled = False
+        if target:
+            self.enable(METRICS_LOG if target == "1" else target)
+
+    def enable(self, log_path=None):
+        if log_path and self.log is None:
+            handler = RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES,
+                                          backupCount=LOG_BACKUPS, delay=True)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.log = logging.getLogger("timetracker.metrics")
+            self.log.propagate = False
+            self.log.setLevel(logging.INFO)
+            self.log.addHandler(handler)
+            self.log_path = log_path
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def record(self, name, duration_ms):
+        with self.lock:
+            durations = self.timings.get(name)
+            if durations is None:
+                durations = self.timings[name] = deque(maxlen=self.samples)
+            durations.append(duration_ms)
+        if self.log is not None:
+            self.log.info(json.dumps({"time": round(time.time(), 3), "op": name,
+                                      "ms": round(duration_ms, 3)}))
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def timer(self, name):
+        return Timer(self, name)
+
+    def reset(self):
+        with self.lock:
+            self.timings.clear()
+            self.counters.clear()
+
+    def summary(self):
+        # [(operation, calls, p50 ms, p95 ms, max ms)] sorted by p95, slowest first
+        with self.lock:
+            snapshot = {name: list(durations) for name, durations in self.timings.items()}
+        rows = [(name, len(durations), percentile(durations, 0.5),
+                 percentile(durations, 0.95), max(durations))
+                for name, durations in snapshot.items() if durations]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def report_text(self):
+        lines = [f"{'Operation':<32} {'Calls':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"]
+        for name, calls, p50, p95, slowest in self.summary():
+            lines.append(f"{name:<32} {calls:>6} {p50:>9.2f} {p95:>9.2f} {slowest:>9.2f}")
+        if len(lines) == 1:
+            lines.append("No timings recorded yet.")
+        with self.lock:
+            counters = sorted(self.counters.items())
+        if counters:
+            lines.append("")
+            lines.extend(f"{name:<32} {value:>6}" for name, value in counters)
+        return "\n".join(lines)
+
+    @property
+    def profiling(self):
+        return self.profiler is not None
+
+    def start_profile(self):
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def stop_profile(self, path=None, top=25):
+        # Stop the capture; optionally dump it for snakeviz/pstats and return
+        # the `top` functions by cumulative time as text
+        if self.profiler is None:
+            return ""
+        profiler, self.profiler = self.profiler, None
+        profiler.disable()
+        if path:
+            profiler.dump_stats(path)
+        output = StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(top)
+        return output.getvalue()
+
+
+metrics = Metrics(os.environ.get("TIMETRACKER_METRICS"))
+
+
+def timed(name=None):
+    # Decorator recording the call time of func under `name` (default: its
+    # qualified name, e.g. "HoursDialog.setup_ui")
+    def decorate(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.record(label, (time.perf_counter() - start) * 1000)
+        return wrapper
+    return decorate
@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+from functools import lru_cache
+
+# Date math shared by the indexes, the stores and the week views. Dates are
+# "YYYY-MM-DD" strings and weeks "YYYY-Www" ISO week labels, as stored in
+# projects.json. Every conversion is cached, since the same few thousand
+# dates come up again and again.
+
+
+@lru_cache(maxsize=None)
+def date_key(date_str):
+    # "YYYY-MM-DD" -> ("YYYY-Www" ISO week, day ordinal), parsed once per date
+    day = date.fromisoformat(date_str)
+    iso_year, iso_week, _ = day.isocalendar()
+    return f"{iso_year}-W{iso_week:02d}", day.toordinal()
+
+
+@lru_cache(maxsize=None)
+def week_label(date_str):
+    return date_key(date_str)[0]
+
+
+@lru_cache(maxsize=None)
+def day_ordinal(date_str):
+    return date_key(date_str)[1]
+
+
+@lru_cache(maxsize=None)
+def ordinal_date(ordinal):
+    return date.fromordinal(ordinal).isoformat()
+
+
+@lru_cache(maxsize=None)
+def week_range(label):
+    # "YYYY-Www" -> (Monday, Sunday) of that ISO week as dates. Week 1 can
+    # start in December and week 52/53 end in January. ValueError for a
+    # malformed label or a week the year doesn't have.
+    year, sep, week = label.partition("-W")
+    if not sep or not year.isdigit() or not week.isdigit():
+        raise ValueError(f"Not an ISO week: {label!r}, expected YYYY-Www")
+    monday = date.fromisocalendar(int(year), int(week), 1)
+    return monday, monday + timedelta(days=6)
+
+
+def week_bounds(label):
+    # ("YYYY-MM-DD" Monday, "YYYY-MM-DD" Sunday), for range queries
+    monday, sunday = week_range(label)
+    return monday.isoformat(), sunday.isoformat()
+
+
+PERIODS = ("week", "month", "quarter", "year")
+
+
+@lru_cache(maxsize=None)
+def period_label(date_str, period):
+    # The week, month, quarter or year of a date: "2024-W10", "2024-03",
+    # "2024-Q1" or "2024". Labels of one period sort chronologically.
+    if period == "week":
+        return week_label(date_str)
+    if period == "month":
+        return date_str[:7]
+    if period == "quarter":
+        return f"{date_str[:4]}-Q{(int(date_str[5:7]) + 2) // 3}"
+    if period == "year":
+        return date_str[:4]
+    raise ValueError(f"Unknown period: {period!r}, expected one of {', '.join(PERIODS)}")
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+from datetime import datetime, timedelta
+
+from instrumentation import metrics
+from time_entries import make_entry
+
+# Start/stop timers per project. Running timers are kept in a small log
+# next to the store, one JSON line per event:
+#
+#   {"event": "start", "project": ..., "at": seconds}
+#   {"event": "checkpoint", "at": seconds}    every running timer is still on
+#   {"event": "stop", "project": ..., "at": seconds}
+#
+# so a checkpoint costs one short append, never a save of the projects.
+# After a crash the timers that never stopped are logged up to their last
+# checkpoint (see TimerLog.load). The log starts over whenever no timer is
+# running. Nothing here needs Qt; the window ticks it from a QTimer.
+
+TIMERS_FILE = "timers.jsonl"
+# How often running timers are checkpointed; a crash loses at most this much
+CHECKPOINT_SECONDS = 60
+
+
+def timers_path(store):
+    # <store file>.timers.jsonl, or timers-<user>.jsonl inside a store
+    # folder, since everyone sharing the folder has their own timers
+    if os.path.isdir(store.path):
+        user = getattr(store, "user", None)
+        return os.path.join(store.path, f"timers-{user}.jsonl" if user else TIMERS_FILE)
+    return store.path + "." + TIMERS_FILE
+
+
+class TimerLog:
+    # The running timers, {project: start time} in epoch seconds, and their
+    # log file. `clock` returns the current time.
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.running = {}
+        self.file = None
+        self.checkpointed = 0
+
+    def load(self):
+        # Read the log left by the last run. Returns {project: (started,
+        # last seen running)} of the timers that were never stopped. The
+        # caller logs those sessions and then calls reset(), so a crash in
+        # between doesn't lose them.
+        interrupted = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn write from the crash
+                    if record["event"] == "start":
+                        interrupted[record["project"]] = [record["at"], record["at"]]
+                    elif record["event"] == "checkpoint":
+                        for session in interrupted.values():
+                            session[1] = record["at"]
+                    elif record["event"] == "stop":
+                        interrupted.pop(record["project"], None)
+        except FileNotFoundError:
+            pass
+        return {project: tuple(session) for project, session in interrupted.items()}
+
+    def reset(self):
+        # Start an empty log; the file is only created by the first timer
+        self.close()
+        if os.path.exists(self.path):
+            open(self.path, "w").close()
+
+    def write(self, record):
+        if self.file is None:
+            self.file = open(self.path, "a", encoding="utf-8")
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def start(self, project):
+        now = self.clock()
+        self.running[project] = now
+        if len(self.running) == 1:
+            self.checkpointed = now
+        self.write({"event": "start", "project": project, "at": now})
+        return now
+
+    def stop(self, project):
+        # (started, stopped) of the project's timer. The log still counts it
+        # as running until logged() is called, once the session is saved.
+        started = self.running.pop(project)
+        if not self.running:
+            self.checkpointed = 0
+        return started, self.clock()
+
+    def logged(self, project, stopped):
+        # The stopped session is in the store; the log starts over once no
+        # timer is running
+        if self.running:
+            self.write({"event": "stop", "project": project, "at": stopped})
+        else:
+            self.reset()
+
+    def checkpoint(self):
+        # Note that the timers are still running, at most once per
+        # CHECKPOINT_SECONDS however often it is called
+        now = self.clock()
+        if not self.running or now - self.checkpointed < CHECKPOINT_SECONDS:
+            return False
+        self.write({"event": "checkpoint", "at": now})
+        self.checkpointed = now
+        metrics.count("timer.checkpoints")
+        return True
+
+    def elapsed(self, project):
+        return self.clock() - self.running[project]
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def session_ops(project, started, stopped, note=""):
+    # add_entry ops for a timed session, one per day it spans, with the
+    # start and end times to the minute. Parts under a minute are dropped.
+    ops = []
+    start = datetime.fromtimestamp(started).replace(second=0, microsecond=0)
+    end = datetime.fromtimestamp(stopped).replace(second=0, microsecond=0)
+    while start < end:
+        midnight = datetime.combine(start.date() + timedelta(days=1), datetime.min.time())
+        part_end = min(end, midnight)
+        end_text = "24:00" if part_end == midnight else part_end.strftime("%H:%M")
+        entry = make_entry(None, note, start.strftime("%H:%M"), end_text)
+        ops.append(dict(entry, op="add_entry", project=project,
+                        date=start.strftime("%Y-%m-%d")))
+        start = part_end
+    return ops
@@ -0,0 +1,184 @@
+import re
+from bisect import bisect_left, insort
+from itertools import islice
+
+# Finding projects by name, account number and comments among thousands.
+# Every word of those fields goes into one sorted list per field, so the
+# projects with a word starting with what was typed are found by binary
+# search:
+#
+#   "acme 12"  matches a project named "ACME Support" with account "AC-1203"
+#
+# Every typed word has to match some word of the project. Projects
+# matching in the name come first, then by account number, then by
+# comments. Only when nothing matches that way are fuzzy matches looked
+# for: the names and account numbers sharing the most letter triples
+# (trigrams) with the typed text, so "acem suport" still finds the
+# project above. Trigrams found in many names say little and are skipped
+# when rarer ones exist, which keeps a lookup short however many
+# projects there are.
+
+# Name, account number, comments: the order matches are listed in
+FIELDS = ("name", "account_number", "comments")
+# Share of the typed trigrams a fuzzy match must have
+FUZZY_THRESHOLD = 0.4
+# Fuzzy candidates compared in full, after ranking by their rare trigrams
+FUZZY_CANDIDATES = 200
+# Trigrams in more than this share of the projects are skipped
+COMMON_TRIGRAM_SHARE = 0.05
+
+WORD = re.compile(r"\w+")
+
+
+def words(text):
+    return WORD.findall(str(text or "").casefold())
+
+
+def trigrams(text):
+    padded = f" {' '.join(words(text))} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def project_infos(projects):
+    # (project, account number, comments) of every project, None when not
+    # set. Views over a database or snapshot answer this without reading
+    # any hours.
+    if hasattr(projects, "infos"):
+        return projects.infos()
+    return ((project, details.get("account_number"), details.get("comments"))
+            for project, details in projects.items())
+
+
+def append(sorted_words, item):
+    sorted_words.append(item)
+
+
+class ProjectSearch:
+    # Search index over the projects, built once and then kept up to date
+    # with add() as projects are added. Projects are numbered in the order
+    # they were added.
+
+    def __init__(self, infos=()):
+        self.projects = []  # (project, account number, comments) by number
+        self.numbers = {}
+        self.field_words = [[] for _ in FIELDS]  # sorted (word, number)
+        self.project_words = []  # " word word ...", every word of a project, by number
+        # Name and account trigrams by number, and trigram -> [numbers];
+        # only built for the first fuzzy search
+        self.grams = None
+        self.postings = None
+        # Sorted once at the end rather than kept sorted while building
+        for project, account_number, comments in infos:
+            self.index(project, account_number, comments, append)
+        for sorted_words in self.field_words:
+            sorted_words.sort()
+
+    @classmethod
+    def from_projects(cls, projects):
+        return cls(project_infos(projects))
+
+    def __len__(self):
+        return len(self.projects)
+
+    def __contains__(self, project):
+        return project in self.numbers
+
+    def add(self, project, account_number=None, comments=None):
+        self.index(project, account_number, comments, insort)
+
+    def index(self, project, account_number, comments, store):
+        # store(sorted words, (word, number)) files a word
+        if project in self.numbers:
+            return
+        number = len(self.projects)
+        self.numbers[project] = number
+        self.projects.append((project, account_number, comments))
+        listed = []
+        for sorted_words, text in zip(self.field_words, (project, account_number, comments)):
+            found = words(text)
+            for word in set(found):
+                store(sorted_words, (word, number))
+            listed.extend(found)
+        self.project_words.append(" " + " ".join(listed))
+        if self.postings is not None:
+            self.index_trigrams(number)
+
+    def index_trigrams(self, number):
+        project, account_number, _ = self.projects[number]
+        grams = trigrams(project) | trigrams(account_number)
+        self.grams.append(grams)
+        for gram in grams:
+            self.postings.setdefault(gram, []).append(number)
+
+    def update(self, projects):
+        # Index the projects added elsewhere (another user of a shared store)
+        for project in projects:
+            if project not in self.numbers:
+                details = projects[project]
+                self.add(project, details.get("account_number"), details.get("comments"))
+
+    def prefix_range(self, sorted_words, word):
+        first = bisect_left(sorted_words, (word,))
+        last = bisect_left(sorted_words, (word + "\U0010ffff",), first)
+        return first, last
+
+    def matches(self, text):
+        # Project names matching `text`, best first. A generator, so a
+        # completer or a lazily filled table only pays for what it shows.
+        typed = words(text)
+        if not typed:
+            yield from (info[0] for info in self.projects)
+            return
+        # The typed word with the fewest matching words leads, the others
+        # are checked on its projects
+        ranges = [[self.prefix_range(sorted_words, word) for sorted_words in self.field_words]
+                  for word in typed]
+        lead = min(range(len(typed)), key=lambda i: sum(last - first for first, last in ranges[i]))
+        others = [" " + word for word in typed[:lead] + typed[lead + 1:]]
+        seen, matched = set(), False
+        for sorted_words, (first, last) in zip(self.field_words, ranges[lead]):
+            for index in range(first, last):
+                number = sorted_words[index][1]
+                if number in seen:
+                    continue
+                seen.add(number)
+                listed = self.project_words[number]
+                if all(other in listed for other in others):
+                    matched = True
+                    yield self.projects[number][0]
+        if not matched:
+            yield from self.fuzzy_matches(text)
+
+    def fuzzy_matches(self, text):
+        typed = trigrams(text)
+        if len(typed) < 3:
+            return
+        if self.postings is None:
+            self.grams, self.postings = [], {}
+            for number in range(len(self.projects)):
+                self.index_trigrams(number)
+        limit = max(1, int(len(self.projects) * COMMON_TRIGRAM_SHARE))
+        found = sorted((self.postings[gram] for gram in typed if gram in self.postings), key=len)
+        rare = [numbers for numbers in found if len(numbers) <= limit] or found[:1]
+        counts = {}
+        for numbers in rare:
+            for number in numbers:
+                counts[number] = counts.get(number, 0) + 1
+        candidates = sorted(counts, key=counts.get, reverse=True)[:FUZZY_CANDIDATES]
+        scored = []
+        for number in candidates:
+            shared = len(typed & self.grams[number])
+            if shared >= FUZZY_THRESHOLD * len(typed):
+                scored.append((-shared, number))
+        for _, number in sorted(scored):
+            yield self.projects[number][0]
+
+    def search(self, text, limit=None):
+        return list(islice(self.matches(text), limit))
+
+    def rows(self, text=""):
+        # (project, account number, comments) of the matches, for a table
+        for project in self.matches(text):
+            _, account_number, comments = self.projects[self.numbers[project]]
+            yield (project, "N/A" if account_number is None else account_number,
+                   "N/A" if comments is None else comments)
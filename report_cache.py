@@ -0,0 +1,162 @@
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+from iso_calendar import week_label
+from hours_index import WEEK_ADDED, WEEK_REMOVED, DAY_CHANGED
+
+# Week reports and day totals kept by ReportCache
+CACHED_ENTRIES = 4096
+
+
+class LruCache:
+    # Dict with a size limit that drops the least recently used entry.
+    # Counts hits and misses so the limits can be tuned (see DebugDialog).
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        # The cached value, or None
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats_text(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups * 100 if lookups else 0
+        return (f"{self.name}: {self.hits:,} hits, {self.misses:,} misses ({rate:.0f}% hits), "
+                f"{len(self.entries):,}/{self.maxsize:,} entries, {self.evictions:,} evicted")
+
+
+class ReportCache:
+    # Remembers the answers of an hours index (HoursIndex, ColumnarHours,
+    # SqliteIndex or BinaryIndex) between mutations, so reopening the hours
+    # overview or going back to a week doesn't query the index again.
+    #
+    # Every apply_changes bumps `generation` and drops only the reports of
+    # the ISO weeks the changes touch, and the totals of the changed days.
+    # The week list is patched from the change events and the daily series
+    # from the changed days, instead of being read again.
+
+    def __init__(self, index, maxsize=CACHED_ENTRIES):
+        self.index = index
+        self.generation = 0
+        self.lock = threading.RLock()
+        self.reports = LruCache("Week reports", maxsize)
+        self.days = LruCache("Day totals", maxsize)
+        self.series = LruCache("Week list and daily series", 2)
+
+    @property
+    def weeks(self):
+        with self.lock:
+            weeks = self.series.get("weeks")
+            if weeks is None:
+                weeks = list(self.index.weeks)
+                self.series.put("weeks", weeks)
+            return list(weeks)
+
+    def has_week(self, week):
+        with self.lock:
+            weeks = self.series.entries.get("weeks")
+            if weeks is None:
+                return self.index.has_week(week)
+            position = bisect_left(weeks, week)
+            return position < len(weeks) and weeks[position] == week
+
+    def week_report(self, week):
+        with self.lock:
+            report = self.reports.get(week)
+            if report is None:
+                report = self.index.week_report(week)
+                self.reports.put(week, report)
+            return report
+
+    def day_total(self, date_str):
+        with self.lock:
+            total = self.days.get(date_str)
+            if total is None:
+                total = self.index.day_total(date_str)
+                self.days.put(date_str, total)
+            return total
+
+    def daily_series(self):
+        with self.lock:
+            series = self.series.get("daily")
+            if series is None:
+                dates, totals = self.index.daily_series()
+                series = (list(dates), list(totals))
+                self.series.put("daily", series)
+            return list(series[0]), list(series[1])
+
+    def apply_changes(self, changes):
+        with self.lock:
+            events = self.index.apply_changes(changes)
+            self.generation += 1
+            for week in {week_label(change[1]) for change in changes}:
+                self.reports.discard(week)
+            for change in changes:
+                self.days.discard(change[1])
+
+            weeks = self.series.entries.get("weeks")
+            totals = {}
+            for event in events:
+                if event[0] == WEEK_ADDED and weeks is not None:
+                    insort(weeks, event[1])
+                elif event[0] == WEEK_REMOVED and weeks is not None:
+                    del weeks[bisect_left(weeks, event[1])]
+                elif event[0] == DAY_CHANGED:
+                    totals[event[1]] = event[2]
+            series = self.series.entries.get("daily")
+            if series is not None:
+                # Whether a day is listed depends on its entries once the
+                # whole batch is done, not on its total or on the batch's
+                # steps: a day can hold entries of 0 hours, and a day that
+                # got hours can be cleared later in the batch
+                for date_str in sorted({change[1] for change in changes}):
+                    total = totals[date_str] if date_str in totals else self.index.day_total(date_str)
+                    self.patch_series(series, date_str, total, self.index.has_day(date_str))
+            return events
+
+    def patch_series(self, series, date_str, total, exists):
+        dates, totals = series
+        position = bisect_left(dates, date_str)
+        listed = position < len(dates) and dates[position] == date_str
+        if listed and exists:
+            totals[position] = total
+        elif listed:
+            del dates[position]
+            del totals[position]
+        elif exists:
+            dates.insert(position, date_str)
+            totals.insert(position, total)
+
+    def entry_count(self):
+        # Not cached; only the debug dialog asks
+        with self.lock:
+            return self.index.entry_count()
+
+    def caches(self):
+        return [self.reports, self.days, self.series]
@@ -0,0 +1,150 @@
+# Report data shared by the dialogs, the command line and exports. Every
+# function reads an hours index (HoursIndex, ColumnarHours or SqliteIndex)
+# or the rollups (rollups.Rollups) and doesn't need Qt.
+
+from datetime import date, timedelta
+
+from time_entries import project_days, day_entries
+
+# Shown for hours of projects without an account number
+NO_ACCOUNT = "(no account)"
+
+
+def shown_hours(hours):
+    # Hours from minutes (1/60 steps) add up with float noise; two decimals
+    # are shown, whole hours stay ints
+    return round(hours, 2)
+
+
+def weekly_breakdown(index):
+    # Yield (week, [(project, hours, percentage)], week total) per ISO week
+    for week in index.weeks:
+        projects_in_week, week_total = index.week_report(week)
+        rows = []
+        for project, hours in projects_in_week.items():
+            percentage = (hours / week_total) * 100 if week_total > 0 else 0
+            rows.append((project, hours, percentage))
+        yield week, rows, week_total
+
+
+def hours_report_text(index):
+    # The text shown by HoursDialog
+    return breakdown_text(weekly_breakdown(index))
+
+
+def breakdown_text(breakdown, period="week", grouping="project"):
+    # Text of a weekly_breakdown or rollup_breakdown
+    lines = [f"Hours Worked per {grouping.title()}:\n\n"]
+    for label, rows, total in breakdown:
+        lines.append(f"{period.title()}: {label}\n")
+        for name, hours, percentage in rows:
+            lines.append(f"  - {name}: {shown_hours(hours)} hours ({percentage:.2f}%)\n")
+        lines.append(f"  Total hours in {period}: {shown_hours(total)}\n\n")
+
+    if len(lines) == 1:
+        return "No hours have been recorded yet."
+    return "".join(lines)
+
+
+def rollup_breakdown(rollups, period, grouping="project"):
+    # Like weekly_breakdown for any period of a rollups.Rollups, per project
+    # or per account number
+    for label in rollups.periods(period, grouping):
+        totals, total = rollups.report(period, label, grouping)
+        rows = []
+        for name, hours in sorted(totals.items()):
+            percentage = (hours / total) * 100 if total > 0 else 0
+            rows.append((name or NO_ACCOUNT, hours, percentage))
+        yield label, rows, total
+
+
+class LockedIndex:
+    # What the reports read from an hours index (weeks, week_report,
+    # daily_series, day_total), each read taken under `lock`. A long export
+    # then holds the lock for one week's report at a time, not while it
+    # writes the rows, and changes can be merged in between.
+
+    def __init__(self, index, lock):
+        self.index = index
+        self.lock = lock
+
+    @property
+    def weeks(self):
+        with self.lock:
+            return list(self.index.weeks)
+
+    def week_report(self, week):
+        # A copy, since the index may update its dict after the lock is let go
+        with self.lock:
+            projects, total = self.index.week_report(week)
+            return dict(projects), total
+
+    def daily_series(self):
+        with self.lock:
+            dates, totals = self.index.daily_series()
+            return list(dates), list(totals)
+
+    def day_total(self, date_str):
+        with self.lock:
+            return self.index.day_total(date_str)
+
+
+# Row generators for exports. Each yields plain tuples one at a time so a
+# whole history can be written out without building it in memory.
+
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def daily_rows(index):
+    # (date, weekday, total hours) for every day with hours
+    dates, hours = index.daily_series()
+    for date_str, total in zip(dates, hours):
+        yield date_str, DAY_NAMES[date.fromisoformat(date_str).weekday()], shown_hours(total)
+
+
+def weekly_rows(index):
+    # (week, total hours)
+    for week in index.weeks:
+        yield week, shown_hours(index.week_report(week)[1])
+
+
+def project_rows(index):
+    # (week, project, hours, percentage of the week)
+    for week, rows, _ in weekly_breakdown(index):
+        for project, hours, percentage in rows:
+            yield week, project, shown_hours(hours), round(percentage, 2)
+
+
+def rollup_rows(rollups, period, grouping="project"):
+    # (period, project or account, hours, percentage of the period)
+    for label, rows, _ in rollup_breakdown(rollups, period, grouping):
+        for name, hours, percentage in rows:
+            yield label, name, shown_hours(hours), round(percentage, 2)
+
+
+def week_day_rows(index, week_start):
+    # (day, date, total hours) for the seven days from week_start (a date)
+    for day_index in range(7):
+        current_date = week_start + timedelta(days=day_index)
+        date_str = current_date.strftime("%Y-%m-%d")
+        yield DAY_NAMES[day_index], date_str, shown_hours(index.day_total(date_str))
+
+
+def entry_rows(projects, first, last, names=None):
+    # (date, project, minutes, start, end, note, position) of every entry
+    # from first to last, of the projects in `names` or all. The position
+    # addresses the entry in remove_entry and split_entry ops.
+    for project in names or projects:
+        hours, entries = project_days(projects, project, first, last)
+        for date_str in sorted(hours):
+            for position, entry in enumerate(day_entries(hours[date_str], entries.get(date_str))):
+                yield (date_str, project, entry["minutes"], entry.get("start", ""),
+                       entry.get("end", ""), entry.get("note", ""), position)
+
+
+# (key, title, header, row generator)
+REPORTS = [
+    ("daily", "Per Day", ("Date", "Day", "Total Hours"), daily_rows),
+    ("weekly", "Per Week", ("Week", "Total Hours"), weekly_rows),
+    ("projects", "Per Project", ("Week", "Project", "Hours", "Percentage"), project_rows),
+]
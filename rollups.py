@@ -0,0 +1,207 @@
+import os
+import json
+
+from iso_calendar import PERIODS, period_label, week_label
+
+# Rows of the rollups: per project or per account number
+GROUPINGS = ("project", "account")
+ROLLUPS_VERSION = 1
+ROLLUPS_FILE = "rollups.json"
+# Files in a store folder that aren't the store's data: the rollups and
+# the live timer logs (see live_timer.timers_path)
+SIDE_FILES = (ROLLUPS_FILE, "timers")
+
+
+def account_number(details):
+    return str(details.get("account_number") or "").strip()
+
+
+class Rollups:
+    # Hours per week, month, quarter and year, per project and per account
+    # number. Built once from the projects and then kept up to date from
+    # the change lists of storage.apply_op, like HoursIndex, so the long
+    # range overviews never rescan the daily entries.
+    #
+    #   totals[(period, grouping)][label] = {project or account: hours}
+    #   entries[(period, grouping)][label] = {project or account: entries}
+    #
+    # The entry counts tell when a row has no hours left. account_of(project)
+    # gives the account number of a project first seen in a change.
+
+    def __init__(self, account_of=None):
+        self.account_of = account_of
+        self.accounts = {}
+        self.totals = {(period, grouping): {} for period in PERIODS for grouping in GROUPINGS}
+        self.entries = {(period, grouping): {} for period in PERIODS for grouping in GROUPINGS}
+
+    @classmethod
+    def from_projects(cls, projects, account_of=None):
+        # Only weeks and months are summed from the entries; quarters and
+        # years are summed from the months, and the account rows from the
+        # project rows
+        rollups = cls(account_of)
+        for project, details in projects.items():
+            rollups.accounts[project] = account_number(details)
+            week_sums, week_counts, month_sums, month_counts = {}, {}, {}, {}
+            for date_str, hours in details.get("hours", {}).items():
+                week = week_label(date_str)
+                week_sums[week] = week_sums.get(week, 0) + hours
+                week_counts[week] = week_counts.get(week, 0) + 1
+                month = date_str[:7]
+                month_sums[month] = month_sums.get(month, 0) + hours
+                month_counts[month] = month_counts.get(month, 0) + 1
+            for period, sums, counts in (("week", week_sums, week_counts),
+                                         ("month", month_sums, month_counts)):
+                totals = rollups.totals[period, "project"]
+                entries = rollups.entries[period, "project"]
+                for label, hours in sums.items():
+                    totals.setdefault(label, {})[project] = hours
+                    entries.setdefault(label, {})[project] = counts[label]
+        rollups.derive()
+        return rollups
+
+    def derive(self):
+        # Fill in the other rows from the weeks and months per project
+        month_entries = self.entries["month", "project"]
+        for period in ("quarter", "year"):
+            for month, row in self.totals["month", "project"].items():
+                self.add_row(period, "project", period_label(month + "-01", period),
+                             row, month_entries[month])
+        for period in PERIODS:
+            project_entries = self.entries[period, "project"]
+            for label, row in self.totals[period, "project"].items():
+                self.add_row(period, "account", label, row, project_entries[label],
+                             self.accounts)
+
+    def add_row(self, period, grouping, label, row, counts, names=None):
+        # Add a {project: hours} row with its {project: entries} to `label`,
+        # summed per names[project] (the account numbers) if given
+        totals = self.totals[period, grouping].setdefault(label, {})
+        entries = self.entries[period, grouping].setdefault(label, {})
+        for project, hours in row.items():
+            name = project if names is None else names[project]
+            totals[name] = totals.get(name, 0) + hours
+            entries[name] = entries.get(name, 0) + counts[project]
+
+    def account(self, project):
+        if project not in self.accounts:
+            self.accounts[project] = self.account_of(project) if self.account_of else ""
+        return self.accounts[project]
+
+    def add_entry(self, project, date_str, hours, count):
+        # count is 1 for a new entry, -1 for a removed one, 0 for a change
+        account = self.account(project)
+        for period in PERIODS:
+            label = period_label(date_str, period)
+            for grouping, name in (("project", project), ("account", account)):
+                totals = self.totals[period, grouping].setdefault(label, {})
+                entries = self.entries[period, grouping].setdefault(label, {})
+                entries[name] = entries.get(name, 0) + count
+                if entries[name]:
+                    totals[name] = totals.get(name, 0) + hours
+                    continue
+                del entries[name]
+                del totals[name]
+                if not entries:
+                    del self.entries[period, grouping][label]
+                    del self.totals[period, grouping][label]
+
+    def apply_changes(self, changes):
+        for project, date_str, old_hours, new_hours in changes:
+            count = (new_hours is not None) - (old_hours is not None)
+            self.add_entry(project, date_str, (new_hours or 0) - (old_hours or 0), count)
+
+    def periods(self, period, grouping="project"):
+        return sorted(self.totals[period, grouping])
+
+    def report(self, period, label, grouping="project"):
+        # ({project or account: hours}, total hours) of one week, month,
+        # quarter or year
+        totals = self.totals[period, grouping].get(label, {})
+        return totals, sum(totals.values())
+
+    # Persistence next to the store's files. Only the weeks and months per
+    # project are saved; the rest is derived again on loading.
+
+    def save(self, path, fingerprint):
+        data = {
+            "version": ROLLUPS_VERSION,
+            "fingerprint": fingerprint,
+            "accounts": self.accounts,
+            "rollups": {period: [self.totals[period, "project"], self.entries[period, "project"]]
+                        for period in ("week", "month")},
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(data, file, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, fingerprint, account_of=None):
+        # The saved rollups, or None when there are none or the store's
+        # files changed since they were saved
+        try:
+            with open(path, "r") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != ROLLUPS_VERSION or data.get("fingerprint") != fingerprint:
+            return None
+        rollups = cls(account_of)
+        rollups.accounts = data["accounts"]
+        for period, (totals, entries) in data["rollups"].items():
+            rollups.totals[period, "project"] = totals
+            rollups.entries[period, "project"] = entries
+        rollups.derive()
+        return rollups
+
+
+def rollups_path(store):
+    # <store file>.rollups.json, or rollups.json inside a store folder
+    if os.path.isdir(store.path):
+        return os.path.join(store.path, ROLLUPS_FILE)
+    return store.path + "." + ROLLUPS_FILE
+
+
+def store_fingerprint(store):
+    # [path, size, mtime] of every file of the store. Saved rollups are
+    # only reused while this is unchanged, so edits made without them
+    # (command line imports, other users of a shared folder) are never missed.
+    candidates = [store.path, store.path + "-wal", getattr(store, "journal_path", None)]
+    files = []
+    for path in filter(None, candidates):
+        if os.path.isdir(path):
+            for folder, _, names in os.walk(path):
+                files.extend(os.path.join(folder, name) for name in names
+                             if not name.startswith(SIDE_FILES))
+        elif os.path.exists(path):
+            files.append(path)
+    fingerprint = []
+    for path in sorted(files):
+        stat = os.stat(path)
+        fingerprint.append([path, stat.st_size, stat.st_mtime_ns])
+    return fingerprint
+
+
+def project_accounts(projects):
+    # account_of for Rollups: the account number from the projects mapping
+    def account_of(project):
+        return account_number(projects.get(project) or {})
+    return account_of
+
+
+def load_rollups(store, projects, fingerprint):
+    # The rollups saved with the store if the store's files still match
+    # `fingerprint`, taken before the store was loaded (loading may touch
+    # the files). None if they have to be built.
+    return Rollups.load(rollups_path(store), fingerprint, project_accounts(projects))
+
+
+def build_rollups(projects):
+    return Rollups.from_projects(projects, project_accounts(projects))
+
+
+def save_rollups(store, rollups):
+    # After the store is closed, so the fingerprint is the one the next
+    # start will see
+    rollups.save(rollups_path(store), store_fingerprint(store))
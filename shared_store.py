@@ -0,0 +1,435 @@
+import os
+import re
+import json
+import time
+import socket
+import getpass
+import itertools
+import threading
+from operator import itemgetter
+
+from storage import apply_op, DateIndex, record_ops, drop_partial_write
+from instrumentation import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SHARED_DIR = "shared"
+SNAPSHOT_FILE = "snapshot.json"
+SEED_FILE = "projects.json"
+SEGMENTS_DIR = "segments"
+LOCK_FILE = ".lock"
+# Fold the segments into the snapshot when loading had to replay this many records
+COMPACT_THRESHOLD = 5000
+# Ops that give the same result in any order among themselves
+ORDER_FREE_OPS = ("add_hours",)
+
+
+def lock_file(file, blocking=True):
+    # Exclusive advisory lock on an open file. Returns False if blocking is
+    # off and someone else holds the lock.
+    try:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+    except OSError:
+        if blocking:
+            raise
+        return False
+    return True
+
+
+def unlock_file(file):
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def default_user():
+    # TIMETRACKER_USER, or user@host; only characters safe in file names
+    name = os.environ.get("TIMETRACKER_USER")
+    if not name:
+        try:
+            name = f"{getpass.getuser()}@{socket.gethostname()}"
+        except Exception:
+            name = socket.gethostname() or "user"
+    return re.sub(r"[^A-Za-z0-9@._-]", "_", name)
+
+
+def read_segment(path, offset, name):
+    # ([(order, ops)], new offset) for the complete records after `offset`
+    # of segment `name`. A record that is still being written has no
+    # newline yet and is left for the next read. Records written before
+    # records had an order go first, in file order.
+    with open(path, "rb") as file:
+        file.seek(offset)
+        data = file.read()
+    end = data.rfind(b"\n") + 1
+    records = []
+    position = offset
+    for line in data[:end].splitlines(keepends=True):
+        try:
+            record = json.loads(line)
+            order = (record.get("at", 0), name, record.get("seq", position))
+            records.append((order, record_ops(record)))
+        except ValueError:
+            pass  # torn record from a crash, see SharedStore.claim_segment
+        position += len(line)
+    return records, offset + end
+
+
+def order_free(ops):
+    return all(op["op"] in ORDER_FREE_OPS for op in ops)
+
+
+def hours_changes(old_projects, new_projects):
+    # The (project, date, old_hours, new_hours) changes from one projects
+    # dict to another
+    changes = []
+    for project in old_projects.keys() | new_projects.keys():
+        old_hours = old_projects.get(project, {}).get("hours", {})
+        new_hours = new_projects.get(project, {}).get("hours", {})
+        for date_str in old_hours.keys() | new_hours.keys():
+            if old_hours.get(date_str) != new_hours.get(date_str):
+                changes.append((project, date_str, old_hours.get(date_str),
+                                new_hours.get(date_str)))
+    return changes
+
+
+def merge_op(projects, op, dates=None):
+    # apply_op for an op read from a segment. An entry edit made against a
+    # day that another user changed in the meantime may point at an entry
+    # that isn't there any more; it is dropped instead of stopping the merge.
+    try:
+        return apply_op(projects, op, dates)
+    except ValueError:
+        metrics.count("shared.records_conflicting")
+        return []
+
+
+class SharedStore:
+    # Lets several people work on one shared folder at the same time.
+    #
+    #   segments/<user>.jsonl  every user appends their own changes to their
+    #                          own segment, so nobody overwrites anyone else
+    #   snapshot.json          the projects up to an offset in each segment
+    #   .lock                  taken while the snapshot is rewritten
+    #
+    # load() reads the snapshot plus the segment tails after its offsets.
+    # refresh() then merges only what the others appended since the last
+    # look; each segment's size and mtime tell whether it changed at all.
+    # compact() folds all segments into the snapshot under the lock; the
+    # segments themselves are append-only and never rewritten.
+    #
+    # Every record is one batch of ops with an order, (at, segment, seq):
+    # `at` is a clock in nanoseconds that is always past every record the
+    # writer had seen, so a change made after seeing someone else's comes
+    # after it, and seq numbers the records of a segment. Loading merges
+    # all segments in that order, so a fresh load shows what everyone saw
+    # while working. A record that turns up late, behind changes already
+    # merged, is merged in place as long as only added hours are involved;
+    # otherwise refresh() rebuilds the projects in order (see rebuild).
+    # Entry edits (see time_entries) that no longer fit after someone
+    # else's edit of the same day are skipped, see merge_op.
+
+    def __init__(self, path=SHARED_DIR, user=None):
+        self.path = path
+        self.segments_path = os.path.join(path, SEGMENTS_DIR)
+        self.snapshot_path = os.path.join(path, SNAPSHOT_FILE)
+        self.lock_path = os.path.join(path, LOCK_FILE)
+        self.user = user or default_user()
+        self.projects = {}
+        self.dates = DateIndex(self.projects)
+        # segment file name -> (offset merged so far, mtime at that point)
+        self.positions = {}
+        self.lock = threading.RLock()
+        self.write_lock = threading.Lock()
+        self.segment_name = None
+        self.segment_file = None
+        self.owner_lock = None
+        # Ordering: the clock, the last seq of our segment, our staged ops
+        # not written yet as (at, op), the `at` of the ops being staged,
+        # and the order of the last record merged and of the last one that
+        # wasn't order free
+        self.clock = 0
+        self.seq = 0
+        self.unwritten = []
+        self.staging_at = None
+        self.last_order = None
+        self.sensitive_order = None
+
+    def claim_segment(self):
+        # Own segment, locked for as long as the store is open. A second
+        # instance for the same user gets "<user>-2" and so on.
+        os.makedirs(self.segments_path, exist_ok=True)
+        for number in itertools.count(1):
+            name = self.user if number == 1 else f"{self.user}-{number}"
+            owner_lock = open(os.path.join(self.segments_path, name + ".lock"), "a")
+            if lock_file(owner_lock, blocking=False):
+                break
+            owner_lock.close()
+        self.owner_lock = owner_lock
+        self.segment_name = name + ".jsonl"
+        segment_path = os.path.join(self.segments_path, self.segment_name)
+
+        # Drop a record torn by a crash so the next append starts on a new line
+        if os.path.exists(segment_path):
+            with open(segment_path, "rb+") as file:
+                data = file.read()
+                if data and not data.endswith(b"\n"):
+                    file.truncate(data.rfind(b"\n") + 1)
+        self.segment_file = open(segment_path, "ab")
+
+    def segment_entries(self):
+        try:
+            entries = [entry for entry in os.scandir(self.segments_path)
+                       if entry.name.endswith(".jsonl")]
+        except FileNotFoundError:
+            return []
+        return sorted(entries, key=lambda entry: entry.name)
+
+    def read_snapshot(self):
+        # (projects, {segment: offset}, {"clock", "sequences"}); before the
+        # first compaction a projects.json in the folder is the starting point
+        try:
+            with open(self.snapshot_path, "r") as file:
+                snapshot = json.load(file)
+            return snapshot["projects"], snapshot["offsets"], {
+                "clock": snapshot.get("clock", 0),
+                "sequences": snapshot.get("sequences", {})}
+        except FileNotFoundError:
+            pass
+        marks = {"clock": 0, "sequences": {}}
+        try:
+            with open(os.path.join(self.path, SEED_FILE), "r") as file:
+                return json.load(file), {}, marks
+        except FileNotFoundError:
+            return {}, {}, marks
+
+    def read_state(self, extra=()):
+        # Snapshot plus every segment tail, plus the `extra` records, merged
+        # in order: (projects, positions, sorted records, marks)
+        projects, offsets, marks = self.read_snapshot()
+        positions = {}
+        records = list(extra)
+        for entry in self.segment_entries():
+            mtime = entry.stat().st_mtime_ns
+            found, offset = read_segment(entry.path, offsets.get(entry.name, 0), entry.name)
+            records.extend(found)
+            positions[entry.name] = (offset, mtime)
+        records.sort(key=itemgetter(0))
+        sequences = marks["sequences"]
+        for (at, name, seq), ops in records:
+            for op in ops:
+                merge_op(projects, op)
+            marks["clock"] = max(marks["clock"], at)
+            sequences[name] = max(sequences.get(name, 0), seq)
+        return projects, positions, records, marks
+
+    def note_order(self, order, ops):
+        # A record is merged or staged
+        self.clock = max(self.clock, order[0])
+        if self.last_order is None or order > self.last_order:
+            self.last_order = order
+        if not order_free(ops) and (self.sensitive_order is None
+                                    or order > self.sensitive_order):
+            self.sensitive_order = order
+
+    def use_state(self, state):
+        projects, self.positions, records, marks = state
+        self.clock = max(self.clock, marks["clock"])
+        self.seq = max(self.seq, marks["sequences"].get(self.segment_name, 0))
+        self.last_order = self.sensitive_order = None
+        for order, ops in records:
+            self.note_order(order, ops)
+        return projects
+
+    def load(self):
+        with self.lock:
+            if self.segment_file is None:
+                self.claim_segment()
+            state = self.read_state()
+            self.projects = self.use_state(state)
+            self.dates = DateIndex(self.projects)
+            self.unwritten = []
+            self.staging_at = None
+        replayed = sum(len(ops) for _, ops in state[2])
+        if replayed >= COMPACT_THRESHOLD:
+            self.compact()
+        return self.projects
+
+    def refresh(self):
+        # Merge what the other users appended since the last call and
+        # return the (project, date, old_hours, new_hours) changes
+        records, positions = [], {}
+        for entry in self.segment_entries():
+            if entry.name == self.segment_name:
+                continue  # our own changes are already applied
+            stat = entry.stat()
+            offset, mtime = self.positions.get(entry.name, (0, 0))
+            if stat.st_size == offset and stat.st_mtime_ns == mtime:
+                continue
+            if stat.st_size < offset:
+                # Segments only grow; one that shrank was edited by hand and
+                # can't be merged incrementally
+                continue
+            found, offset = read_segment(entry.path, offset, entry.name)
+            records.extend(found)
+            positions[entry.name] = (offset, stat.st_mtime_ns)
+        if not records:
+            self.positions.update(positions)
+            return []
+        records.sort(key=itemgetter(0))
+
+        changes = []
+        with self.lock:
+            reorder = self.out_of_order(records)
+            if not reorder:
+                for order, ops in records:
+                    for op in ops:
+                        changes.extend(merge_op(self.projects, op, self.dates))
+                    self.note_order(order, ops)
+                self.positions.update(positions)
+                # Ops staged from now on come after what was just merged
+                self.staging_at = None
+        metrics.count("shared.records_merged", sum(len(ops) for _, ops in records))
+        if reorder:
+            return self.rebuild()
+        return changes
+
+    def out_of_order(self, records):
+        # Whether merging `records` now would give a different result than
+        # merging them in order: they belong before records already merged,
+        # and either they or those records aren't order free
+        first = records[0][0]
+        if self.last_order is None or first > self.last_order:
+            return False
+        if self.sensitive_order is not None and self.sensitive_order > first:
+            return True
+        return any(not order_free(ops) for order, ops in records if order < self.last_order)
+
+    def rebuild(self):
+        # Merge everything again in order, our unwritten ops included, and
+        # return the changes against the projects as they were. The projects
+        # dict is updated in place, since the window holds on to it.
+        with self.write_lock, self.lock:
+            extra = []
+            for at, op in self.unwritten:
+                if extra and extra[-1][0][0] == at:
+                    extra[-1][1].append(op)
+                else:
+                    extra.append(((at, self.segment_name, self.seq + len(extra) + 1), [op]))
+            state = self.read_state(extra)
+            projects = self.use_state(state)
+            changes = hours_changes(self.projects, projects)
+            self.projects.clear()
+            self.projects.update(projects)
+            self.dates = DateIndex(self.projects)
+            self.staging_at = None
+        metrics.count("shared.rebuilds")
+        return changes
+
+    def tick(self):
+        # A new `at`, past every record seen so far
+        self.clock = max(time.time_ns(), self.clock + 1)
+        return self.clock
+
+    def stage(self, op):
+        with self.lock:
+            changes = apply_op(self.projects, op, self.dates)
+            if self.staging_at is None:
+                self.staging_at = self.tick()
+            self.unwritten.append((self.staging_at, op))
+            self.note_order((self.staging_at, self.segment_name, self.seq + 1), [op])
+            return changes
+
+    def commit(self, ops):
+        # The staged ops go out as one record per `at` they were staged
+        # with, in one write, so other readers never see half a batch
+        if not ops:
+            return
+        with self.write_lock:
+            with self.lock:
+                staged = self.unwritten[:len(ops)]
+            records = []
+            for at, op in staged:
+                if records and records[-1]["at"] == at:
+                    records[-1]["ops"].append(op)
+                else:
+                    records.append({"op": "batch", "at": at,
+                                    "seq": self.seq + len(records) + 1, "ops": [op]})
+            data = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+            size = os.fstat(self.segment_file.fileno()).st_size
+            try:
+                self.segment_file.write(data)
+                self.segment_file.flush()
+                os.fsync(self.segment_file.fileno())
+            except OSError:
+                drop_partial_write(self.segment_file,
+                                   os.path.join(self.segments_path, self.segment_name), size)
+                self.segment_file = open(os.path.join(self.segments_path, self.segment_name), "ab")
+                raise
+            with self.lock:
+                del self.unwritten[:len(ops)]
+                self.seq += len(records)
+                if not self.unwritten:
+                    self.staging_at = None
+        metrics.count("shared.records_written", len(records))
+
+    def apply(self, op):
+        return self.apply_batch([op])
+
+    def apply_batch(self, ops):
+        changes = []
+        for op in ops:
+            changes.extend(self.stage(op))
+        self.commit(ops)
+        return changes
+
+    def save(self, projects=None):
+        # Every change is already in our segment; saving folds the segments
+        # into the snapshot so the next load has less to replay
+        self.compact()
+
+    def compact(self):
+        # Appends carry on meanwhile: only complete records up to each
+        # segment's current end go into the snapshot. A record written
+        # later with an earlier order than some in the snapshot is merged
+        # after them.
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.lock_path, "a") as lock:
+            lock_file(lock)
+            try:
+                projects, positions, _, marks = self.read_state()
+                snapshot = {
+                    "offsets": {name: offset for name, (offset, _) in positions.items()},
+                    "clock": marks["clock"],
+                    "sequences": marks["sequences"],
+                    "projects": projects,
+                }
+                tmp_path = self.snapshot_path + ".tmp"
+                with open(tmp_path, "w") as file:
+                    json.dump(snapshot, file)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(tmp_path, self.snapshot_path)
+            finally:
+                unlock_file(lock)
+        metrics.count("shared.compactions")
+
+    def close(self):
+        with self.write_lock:
+            if self.segment_file is not None:
+                self.segment_file.close()
+                self.segment_file = None
+        if self.owner_lock is not None:
+            unlock_file(self.owner_lock)
+            self.owner_lock.close()
+            self.owner_lock = None
@@ -0,0 +1,373 @@
+import sqlite3
+import argparse
+import threading
+from collections.abc import Mapping
+
+from iso_calendar import week_label
+from hours_index import applied_change_events
+from time_entries import (ENTRY_FIELDS, is_entry_op, apply_entry_op, op_scope,
+                          scope_projects)
+
+SQLITE_FILE = "projects.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    account_number TEXT,
+    comments TEXT
+);
+CREATE TABLE IF NOT EXISTS hour_entries (
+    project TEXT NOT NULL,
+    date TEXT NOT NULL,
+    week TEXT NOT NULL,
+    hours NUMERIC NOT NULL,
+    PRIMARY KEY (project, date)
+);
+CREATE INDEX IF NOT EXISTS hour_entries_date ON hour_entries (date);
+CREATE INDEX IF NOT EXISTS hour_entries_week ON hour_entries (week, project);
+CREATE TABLE IF NOT EXISTS time_entries (
+    project TEXT NOT NULL,
+    date TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    minutes INTEGER NOT NULL,
+    note TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    PRIMARY KEY (project, date, position)
+);
+"""
+
+
+class SqliteStore:
+    # Keeps projects and hours in a local SQLite database. load() returns a
+    # lazy dict view and make_index() an index that answers every hours view
+    # with an indexed query, so opening the app doesn't read the history.
+
+    def __init__(self, path=SQLITE_FILE):
+        self.path = path
+        self.lock = threading.RLock()
+        self.connection = None
+        self.projects = None
+
+    def connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.executescript(SCHEMA)
+        return self.connection
+
+    def load(self):
+        self.connect()
+        self.projects = SqliteProjectsView(self)
+        return self.projects
+
+    def make_index(self):
+        return SqliteIndex(self)
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return self.connect().execute(sql, params).fetchall()
+
+    def stage(self, op):
+        # Runs inside the open transaction; reads on this connection see it
+        # straight away, commit() makes it durable
+        with self.lock:
+            return self.execute_op(self.connect(), op)
+
+    def commit(self, ops=()):
+        with self.lock:
+            self.connect().commit()
+
+    def apply(self, op):
+        return self.apply_batch([op])
+
+    def apply_batch(self, ops):
+        # One transaction for the whole batch
+        with self.lock:
+            connection = self.connect()
+            try:
+                changes = []
+                for op in ops:
+                    changes.extend(self.execute_op(connection, op))
+            except Exception:
+                connection.rollback()
+                raise
+            connection.commit()
+        return changes
+
+    def execute_op(self, connection, op):
+        kind = op["op"]
+        changes = []
+
+        if is_entry_op(op):
+            return self.execute_entry_op(connection, op)
+
+        elif kind == "add_hours":
+            project, date, hours = op["project"], op["date"], op["hours"]
+            connection.execute("INSERT OR IGNORE INTO projects (name) VALUES (?)", (project,))
+            row = connection.execute(
+                "SELECT hours FROM hour_entries WHERE project = ? AND date = ?",
+                (project, date)).fetchone()
+            old_hours = row[0] if row else None
+            connection.execute(
+                "INSERT INTO hour_entries (project, date, week, hours) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (project, date) DO UPDATE SET hours = hours + excluded.hours",
+                (project, date, week_label(date), hours))
+            changes.append((project, date, old_hours, (old_hours or 0) + hours))
+
+        elif kind == "add_project":
+            connection.execute(
+                "INSERT INTO projects (name, account_number, comments) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO NOTHING",
+                (op["project"], op.get("account_number", ""), op.get("comments", "")))
+
+        elif kind == "clear_range":
+            params = (op["start"], op["end"])
+            for project, date, hours in connection.execute(
+                    "SELECT project, date, hours FROM hour_entries "
+                    "WHERE date BETWEEN ? AND ?", params):
+                changes.append((project, date, hours, None))
+            connection.execute("DELETE FROM hour_entries WHERE date BETWEEN ? AND ?", params)
+            connection.execute("DELETE FROM time_entries WHERE date BETWEEN ? AND ?", params)
+
+        else:
+            raise ValueError(f"Unknown operation: {kind}")
+
+        return changes
+
+    def execute_entry_op(self, connection, op):
+        # Load the days the op touches into a small projects dict, apply it
+        # there and write those days back
+        scope = op_scope(op)
+        partial = scope_projects(DaysReader(connection), scope)
+        changes = apply_entry_op(partial, op)
+        for project, date, _, new_hours in changes:
+            connection.execute("INSERT OR IGNORE INTO projects (name) VALUES (?)", (project,))
+            if new_hours is None:
+                connection.execute("DELETE FROM hour_entries WHERE project = ? AND date = ?",
+                                   (project, date))
+            else:
+                connection.execute(
+                    "INSERT INTO hour_entries (project, date, week, hours) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (project, date) DO UPDATE SET hours = excluded.hours",
+                    (project, date, week_label(date), new_hours))
+        # The partial dict holds exactly the days of the scope
+        for project, windows in scope.items():
+            for first, last in windows:
+                connection.execute(
+                    "DELETE FROM time_entries WHERE project = ? AND date BETWEEN ? AND ?",
+                    (project, first, last))
+            insert_entries(connection, project, partial[project].get("entries", {}))
+        return changes
+
+    def save(self, projects=None):
+        if projects is None or isinstance(projects, SqliteProjectsView):
+            with self.lock:
+                self.connect().commit()
+            return
+        # A plain dict replaces the database contents
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute("DELETE FROM hour_entries")
+                connection.execute("DELETE FROM time_entries")
+                connection.execute("DELETE FROM projects")
+                import_projects(connection, projects)
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.commit()
+                self.connection.close()
+                self.connection = None
+
+
+def import_projects(connection, projects):
+    # Merge a projects.json-style dict into the database. Hours for the same
+    # project and date are added up; existing account numbers and comments
+    # are only filled in, never overwritten.
+    for project, details in projects.items():
+        connection.execute(
+            "INSERT INTO projects (name, account_number, comments) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET "
+            "account_number = COALESCE(account_number, excluded.account_number), "
+            "comments = COALESCE(comments, excluded.comments)",
+            (project, details.get("account_number"), details.get("comments")))
+        connection.executemany(
+            "INSERT INTO hour_entries (project, date, week, hours) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (project, date) DO UPDATE SET hours = hours + excluded.hours",
+            ((project, date, week_label(date), hours)
+             for date, hours in details.get("hours", {}).items()))
+        insert_entries(connection, project, details.get("entries", {}))
+
+
+def insert_entries(connection, project, entries):
+    # Append {date: [entries]} after any entries already on those days
+    for date, listed in entries.items():
+        first = connection.execute(
+            "SELECT COALESCE(MAX(position) + 1, 0) FROM time_entries "
+            "WHERE project = ? AND date = ?", (project, date)).fetchone()[0]
+        connection.executemany(
+            "INSERT INTO time_entries "
+            "(project, date, position, minutes, note, start_time, end_time) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((project, date, first + position, entry["minutes"], entry.get("note"),
+              entry.get("start"), entry.get("end"))
+             for position, entry in enumerate(listed)))
+
+
+def read_entries(connection, project, first, last):
+    # {date: [entries]} of one project from first to last
+    entries = {}
+    for date, minutes, note, start, end in connection.execute(
+            "SELECT date, minutes, note, start_time, end_time FROM time_entries "
+            "WHERE project = ? AND date BETWEEN ? AND ? ORDER BY date, position",
+            (project, first, last)):
+        entry = {"minutes": minutes}
+        for field, value in zip(ENTRY_FIELDS, (note, start, end)):
+            if value:
+                entry[field] = value
+        entries.setdefault(date, []).append(entry)
+    return entries
+
+
+def read_days(connection, project, first, last):
+    # ({date: hours}, {date: entries}) of one project, see time_entries.project_days
+    hours = dict(connection.execute(
+        "SELECT date, hours FROM hour_entries WHERE project = ? AND date BETWEEN ? AND ?",
+        (project, first, last)))
+    return hours, read_entries(connection, project, first, last)
+
+
+class DaysReader:
+    # The part of the projects mapping time_entries.scope_projects needs,
+    # read on the connection of the open transaction
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __contains__(self, project):
+        return True
+
+    def days(self, project, first, last):
+        return read_days(self.connection, project, first, last)
+
+
+class SqliteProjectsView(Mapping):
+    # {project: {"account_number", "comments", "hours"}} backed by queries.
+    # A project's hours are only read when that project is accessed.
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, project):
+        rows = self.store.query(
+            "SELECT account_number, comments FROM projects WHERE name = ?", (project,))
+        if not rows:
+            raise KeyError(project)
+        account_number, comments = rows[0]
+        details = {}
+        if account_number is not None:
+            details["account_number"] = account_number
+        if comments is not None:
+            details["comments"] = comments
+        details["hours"] = dict(self.store.query(
+            "SELECT date, hours FROM hour_entries WHERE project = ? ORDER BY date",
+            (project,)))
+        with self.store.lock:
+            entries = read_entries(self.store.connect(), project, "", "9999-12-31")
+        if entries:
+            details["entries"] = entries
+        return details
+
+    def days(self, project, first, last):
+        with self.store.lock:
+            return read_days(self.store.connect(), project, first, last)
+
+    def __contains__(self, project):
+        return bool(self.store.query("SELECT 1 FROM projects WHERE name = ?", (project,)))
+
+    def __iter__(self):
+        return iter([name for name, in self.store.query(
+            "SELECT name FROM projects ORDER BY id")])
+
+    def infos(self):
+        # (project, account number, comments), without reading any hours
+        return self.store.query(
+            "SELECT name, account_number, comments FROM projects ORDER BY id")
+
+    def __len__(self):
+        return self.store.query("SELECT COUNT(*) FROM projects")[0][0]
+
+
+class SqliteIndex:
+    # Same read interface as HoursIndex, answered by indexed queries
+
+    def __init__(self, store):
+        self.store = store
+
+    @property
+    def weeks(self):
+        return [week for week, in self.store.query(
+            "SELECT DISTINCT week FROM hour_entries ORDER BY week")]
+
+    def apply_changes(self, changes):
+        # The database already holds the changes
+        return applied_change_events(self, changes)
+
+    def week_entries(self, week):
+        return self.store.query(
+            "SELECT COUNT(*) FROM hour_entries WHERE week = ?", (week,))[0][0]
+
+    def has_week(self, week):
+        return bool(self.store.query(
+            "SELECT 1 FROM hour_entries WHERE week = ? LIMIT 1", (week,)))
+
+    def has_day(self, date_str):
+        return bool(self.store.query(
+            "SELECT 1 FROM hour_entries WHERE date = ? LIMIT 1", (date_str,)))
+
+    def entry_count(self):
+        return self.store.query("SELECT COUNT(*) FROM hour_entries")[0][0]
+
+    def daily_series(self):
+        rows = self.store.query(
+            "SELECT date, SUM(hours) FROM hour_entries GROUP BY date ORDER BY date")
+        return [date for date, _ in rows], [hours for _, hours in rows]
+
+    def day_total(self, date_str):
+        total = self.store.query(
+            "SELECT SUM(hours) FROM hour_entries WHERE date = ?", (date_str,))[0][0]
+        return total or 0
+
+    def week_report(self, week):
+        rows = self.store.query(
+            "SELECT hour_entries.project, SUM(hour_entries.hours) FROM hour_entries "
+            "JOIN projects ON projects.name = hour_entries.project "
+            "WHERE hour_entries.week = ? "
+            "GROUP BY hour_entries.project ORDER BY MIN(projects.id)", (week,))
+        return dict(rows), sum(hours for _, hours in rows)
+
+
+def migrate(sources, db_path=SQLITE_FILE):
+    # One-shot import of projects.json files (including any journal tail)
+    from storage import read_projects
+
+    store = SqliteStore(db_path)
+    connection = store.connect()
+    for source in sources:
+        projects = read_projects(source)
+        with connection:
+            import_projects(connection, projects)
+        print(f"Imported {len(projects)} projects from {source}")
+    store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import projects.json files into SQLite")
+    parser.add_argument("sources", nargs="+", help="projects.json files to import")
+    parser.add_argument("--db", default=SQLITE_FILE, help="database to create or extend")
+    args = parser.parse_args()
+    migrate(args.sources, args.db)
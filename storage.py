@@ -0,0 +1,503 @@
+import os
+import json
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+from hours_index import HoursIndex
+from instrumentation import metrics
+from sqlite_store import SqliteStore
+from time_entries import is_entry_op, apply_entry_op, batch_scope, scope_projects
+
+PROJECTS_FILE = "projects.json"
+DEFAULT_STORE = "journal:" + PROJECTS_FILE
+
+
+class DateIndex:
+    # Sorted dates per project, built the first time a project's dates are
+    # needed and kept up to date by apply_op, so clear_range can bisect to
+    # the dates in range instead of checking every entry
+
+    def __init__(self, projects):
+        self.projects = projects
+        self.dates = {}
+
+    def sorted_dates(self, project):
+        dates = self.dates.get(project)
+        if dates is None:
+            dates = self.dates[project] = sorted(self.projects[project].get("hours", {}))
+        return dates
+
+    def added(self, project, date_str):
+        dates = self.dates.get(project)
+        if dates is not None:
+            insort(dates, date_str)
+
+    def forget(self, project):
+        self.dates.pop(project, None)
+
+    def pop_range(self, project, start, end):
+        # Remove and return the project's dates from start to end inclusive
+        dates = self.sorted_dates(project)
+        lo = bisect_left(dates, start)
+        hi = bisect_right(dates, end)
+        removed = dates[lo:hi]
+        del dates[lo:hi]
+        return removed
+
+
+def apply_op(projects, op, dates=None):
+    # Apply one mutation to the projects dict and return the list of
+    # (project, date, old_hours, new_hours) changes it made. old_hours is
+    # None when an entry was created, new_hours is None when it was removed.
+    # `dates` is an optional DateIndex over the same projects. The entry ops
+    # (see time_entries) keep projects[name]["entries"] in step.
+    kind = op["op"]
+    changes = []
+
+    if is_entry_op(op):
+        return apply_entry_op(projects, op, dates)
+
+    elif kind == "add_hours":
+        project, date, hours = op["project"], op["date"], op["hours"]
+        details = projects.setdefault(project, {"hours": {}})
+        project_hours = details.setdefault("hours", {})
+        old_hours = project_hours.get(date)
+        project_hours[date] = (old_hours or 0) + hours
+        if old_hours is None and dates is not None:
+            dates.added(project, date)
+        changes.append((project, date, old_hours, project_hours[date]))
+
+    elif kind == "add_project":
+        # Adding a project that exists (two users picking the same name in
+        # a shared folder) leaves it and its hours alone
+        if op["project"] not in projects:
+            projects[op["project"]] = {
+                "account_number": op.get("account_number", ""),
+                "comments": op.get("comments", ""),
+                "hours": {}
+            }
+            if dates is not None:
+                dates.forget(op["project"])
+
+    elif kind == "clear_range":
+        start, end = op["start"], op["end"]
+        for project, details in projects.items():
+            if "hours" in details:
+                if dates is not None:
+                    in_range = dates.pop_range(project, start, end)
+                else:
+                    in_range = [date_str for date_str in details["hours"]
+                                if start <= date_str <= end]
+                for date_str in in_range:
+                    old_hours = details["hours"].pop(date_str)
+                    details.get("entries", {}).pop(date_str, None)
+                    changes.append((project, date_str, old_hours, None))
+                if "entries" in details and not details["entries"]:
+                    del details["entries"]
+
+    else:
+        raise ValueError(f"Unknown operation: {kind}")
+
+    return changes
+
+
+def copy_projects(projects):
+    # Copy deep enough that later mutations of the hours dicts don't leak in
+    copied = {}
+    for project, details in projects.items():
+        copied[project] = dict(details)
+        if "hours" in details:
+            copied[project]["hours"] = dict(details["hours"])
+        if "entries" in details:
+            copied[project]["entries"] = {date_str: list(listed)
+                                          for date_str, listed in details["entries"].items()}
+    return copied
+
+
+def check_batch(projects, ops):
+    # Raise ValueError if any op of the batch would fail, without changing
+    # anything: the ops are tried on a copy of just the days they touch.
+    # Lets a batch be staged op by op and still be all or nothing.
+    partial = scope_projects(projects, batch_scope(ops))
+    for op in ops:
+        apply_op(partial, op)
+
+
+def journal_record(ops):
+    # One journal line for ops committed together. Several ops go into one
+    # {"op": "batch", "ops": [...]} record, so a write cut off by a crash
+    # loses the whole batch instead of applying half of it.
+    record = ops[0] if len(ops) == 1 else {"op": "batch", "ops": ops}
+    return json.dumps(record) + "\n"
+
+
+def record_ops(record):
+    return record["ops"] if record["op"] == "batch" else [record]
+
+
+def read_journal(journal_path):
+    # Yield (op, offset after its record) for every op of the complete
+    # journal records
+    offset = 0
+    with open(journal_path, "rb") as file:
+        for line in file:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Torn write from a crash; everything after it is garbage
+                break
+            offset += len(line)
+            for op in record_ops(record):
+                yield op, offset
+
+
+def drop_partial_write(file, path, size):
+    # Close a journal whose write failed and cut it back to `size`, so a
+    # partly written record doesn't run into the one written on the retry
+    try:
+        file.close()
+    except OSError:
+        pass
+    with open(path, "r+b") as journal:
+        journal.truncate(size)
+
+
+def read_projects(path=PROJECTS_FILE):
+    # Read a snapshot plus its journal tail without opening either for writing
+    frozen_path = path + ".journal.old"
+    snapshot_path = path
+    if not os.path.exists(frozen_path) and os.path.exists(path + ".tmp"):
+        snapshot_path = path + ".tmp"
+    try:
+        with open(snapshot_path, "r") as file:
+            projects = json.load(file)
+    except FileNotFoundError:
+        projects = {}
+    for journal_path in (frozen_path, path + ".journal"):
+        if os.path.exists(journal_path):
+            for op, _ in read_journal(journal_path):
+                apply_op(projects, op)
+    return projects
+
+
+# Every store applies a mutation in two steps: stage(op) updates the
+# in-memory state and returns the changes, commit(ops) makes staged ops
+# durable. commit may run on a worker thread (see workers.PersistenceWorker);
+# apply/apply_batch do both at once.
+
+
+class JsonStore:
+    # The original storage: the whole projects.json is rewritten on every change
+
+    def __init__(self, path=PROJECTS_FILE):
+        self.path = path
+        self.projects = {}
+        self.dates = DateIndex(self.projects)
+        self.lock = threading.RLock()
+        self.write_lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path, "r") as file:
+                self.projects = json.load(file)
+        except FileNotFoundError:
+            self.projects = {}
+        self.dates = DateIndex(self.projects)
+        return self.projects
+
+    def save(self, projects=None):
+        if projects is not None:
+            with self.lock:
+                if projects is not self.projects:
+                    self.projects = projects
+                    self.dates = DateIndex(projects)
+        self.commit()
+
+    def stage(self, op):
+        with self.lock:
+            return apply_op(self.projects, op, self.dates)
+
+    def commit(self, ops=()):
+        # Copy under the lock, serialize outside it
+        with self.lock:
+            snapshot = copy_projects(self.projects)
+        tmp_path = self.path + ".tmp"
+        with self.write_lock:
+            with open(tmp_path, "w") as file:
+                json.dump(snapshot, file, indent=4)
+            os.replace(tmp_path, self.path)
+
+    def apply(self, op):
+        return self.apply_batch([op])
+
+    def apply_batch(self, ops):
+        changes = []
+        for op in ops:
+            changes.extend(self.stage(op))
+        self.commit(ops)
+        return changes
+
+    def close(self):
+        pass
+
+
+class JournalStore:
+    # Appends each mutation as one JSON line to <path>.journal instead of
+    # rewriting the whole file. The journal is fsynced in batches and folded
+    # back into the <path> snapshot by a background compaction.
+    #
+    # Compaction protocol (crash safe at every step):
+    #   1. rename the journal to <path>.journal.old and start a fresh journal
+    #   2. write the snapshot to <path>.tmp and fsync it
+    #   3. delete <path>.journal.old  (commit point)
+    #   4. replace <path> with <path>.tmp
+    # On startup a leftover .journal.old means the .tmp may be incomplete, so
+    # it is discarded and the old journal replayed. A leftover .tmp without
+    # .journal.old is a finished snapshot that only needs to be moved in place.
+
+    def __init__(self, path=PROJECTS_FILE, fsync_interval=1.0, fsync_batch=64,
+                 compact_threshold=5000):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.frozen_path = path + ".journal.old"
+        self.tmp_path = path + ".tmp"
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self.compact_threshold = compact_threshold
+
+        self.projects = {}
+        self.dates = DateIndex(self.projects)
+        self.lock = threading.RLock()
+        self.journal_file = None
+        self.journal_records = 0
+        self.pending_sync = 0
+        self.compact_thread = None
+        self.compact_pending = False
+        self.staged = 0
+        self.flush_stop = threading.Event()
+        self.flush_thread = None
+
+    def load(self):
+        with self.lock:
+            self.recover()
+            try:
+                with open(self.path, "r") as file:
+                    self.projects = json.load(file)
+            except FileNotFoundError:
+                self.projects = {}
+
+            self.journal_records = 0
+            if os.path.exists(self.frozen_path):
+                self.journal_records += self.replay(self.frozen_path)
+            if os.path.exists(self.journal_path):
+                self.journal_records += self.replay(self.journal_path)
+            self.dates = DateIndex(self.projects)
+
+            self.open_journal()
+            self.start_flusher()
+        return self.projects
+
+    def recover(self):
+        if os.path.exists(self.frozen_path):
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+        elif os.path.exists(self.tmp_path):
+            os.replace(self.tmp_path, self.path)
+
+    def replay(self, journal_path):
+        count = 0
+        good_offset = 0
+        for op, good_offset in read_journal(journal_path):
+            apply_op(self.projects, op)
+            count += 1
+
+        if good_offset < os.path.getsize(journal_path):
+            with open(journal_path, "r+b") as file:
+                file.truncate(good_offset)
+        return count
+
+    def open_journal(self):
+        if self.journal_file is None:
+            self.journal_file = open(self.journal_path, "a", encoding="utf-8")
+
+    def start_flusher(self):
+        if self.flush_thread is None:
+            self.flush_stop.clear()
+            self.flush_thread = threading.Thread(target=self.flush_loop, daemon=True)
+            self.flush_thread.start()
+
+    def flush_loop(self):
+        while not self.flush_stop.wait(self.fsync_interval):
+            self.sync()
+
+    def sync(self):
+        with self.lock:
+            if self.journal_file is not None and self.pending_sync:
+                self.journal_file.flush()
+                os.fsync(self.journal_file.fileno())
+                self.pending_sync = 0
+                metrics.count("journal.fsyncs")
+
+    def write_records(self, ops):
+        self.open_journal()
+        size = os.fstat(self.journal_file.fileno()).st_size
+        try:
+            self.journal_file.write(journal_record(ops))
+            self.journal_file.flush()
+        except OSError:
+            drop_partial_write(self.journal_file, self.journal_path, size)
+            self.journal_file = None
+            raise
+        self.pending_sync += len(ops)
+        self.journal_records += len(ops)
+        metrics.count("journal.records", len(ops))
+        if self.pending_sync >= self.fsync_batch:
+            self.sync()
+        if self.journal_records >= self.compact_threshold:
+            self.compact()
+
+    def stage(self, op):
+        with self.lock:
+            self.staged += 1
+            return apply_op(self.projects, op, self.dates)
+
+    def commit(self, ops):
+        # The ops only stop counting as staged once they are written; a
+        # failed write is retried with the same ops (see PersistenceWorker)
+        with self.lock:
+            self.write_records(ops)
+            self.staged -= len(ops)
+            if self.compact_pending and not self.staged:
+                self.compact()
+
+    def apply(self, op):
+        with self.lock:
+            changes = self.stage(op)
+            self.commit([op])
+        return changes
+
+    def apply_batch(self, ops):
+        with self.lock:
+            changes = []
+            for op in ops:
+                changes.extend(self.stage(op))
+            self.commit(ops)
+            self.sync()
+        return changes
+
+    def save(self, projects=None):
+        # An explicit save folds the journal into the snapshot right away
+        if projects is not None:
+            with self.lock:
+                if projects is not self.projects:
+                    self.projects = projects
+                    self.dates = DateIndex(projects)
+        self.compact(wait=True)
+
+    def compact(self, wait=False):
+        with self.lock:
+            # A snapshot taken now would contain staged ops that are written
+            # to the journal later, so they would be applied twice on replay
+            if self.staged:
+                self.compact_pending = True
+                return
+            self.compact_pending = False
+
+        running = self.compact_thread
+        if running is not None and running.is_alive():
+            if not wait:
+                return
+            running.join()
+
+        with self.lock:
+            self.sync()
+            if self.journal_file is not None:
+                self.journal_file.close()
+                self.journal_file = None
+            if os.path.exists(self.frozen_path):
+                # Left over from an interrupted compaction; the snapshot on
+                # disk doesn't include it yet, so keep both journals
+                with open(self.frozen_path, "ab") as frozen, \
+                        open(self.journal_path, "rb") as journal:
+                    frozen.write(journal.read())
+                os.remove(self.journal_path)
+            elif os.path.exists(self.journal_path):
+                os.replace(self.journal_path, self.frozen_path)
+            self.open_journal()
+            self.journal_records = 0
+            metrics.count("journal.compactions")
+
+            snapshot = copy_projects(self.projects)
+            thread = threading.Thread(target=self.write_snapshot,
+                                      args=(snapshot,), daemon=True)
+            self.compact_thread = thread
+            thread.start()
+        if wait:
+            thread.join()
+
+    def write_snapshot(self, snapshot):
+        with open(self.tmp_path, "w") as file:
+            json.dump(snapshot, file, indent=4)
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.exists(self.frozen_path):
+            os.remove(self.frozen_path)
+        os.replace(self.tmp_path, self.path)
+
+    def close(self):
+        self.flush_stop.set()
+        if self.flush_thread is not None:
+            self.flush_thread.join()
+            self.flush_thread = None
+        if self.compact_thread is not None:
+            self.compact_thread.join()
+        with self.lock:
+            self.sync()
+            if self.journal_file is not None:
+                self.journal_file.close()
+                self.journal_file = None
+
+
+def shared_store(*args):
+    # shared_store builds on apply_op, so it is imported on first use
+    from shared_store import SharedStore
+    return SharedStore(*args)
+
+
+def binary_store(*args):
+    # binary_snapshot builds on read_journal, so it is imported on first use
+    from binary_snapshot import BinaryStore
+    return BinaryStore(*args)
+
+
+STORE_TYPES = {
+    "json": JsonStore,
+    "journal": JournalStore,
+    "sqlite": SqliteStore,
+    "shared": shared_store,
+    "binary": binary_store,
+}
+
+
+def open_store(spec=None):
+    # spec is "<type>:<path>" (e.g. "sqlite:projects.db", "shared:/mnt/team")
+    # or a plain path, which uses the JSON store. Without a path each store
+    # uses its own default. TIMETRACKER_STORE overrides the default.
+    spec = spec or os.environ.get("TIMETRACKER_STORE", DEFAULT_STORE)
+    kind, sep, path = spec.partition(":")
+    if sep and kind in STORE_TYPES:
+        return STORE_TYPES[kind](path) if path else STORE_TYPES[kind]()
+    return JsonStore(spec)
+
+
+def build_index(store, projects):
+    # Stores that can answer the hours views themselves provide the index
+    if hasattr(store, "make_index"):
+        return store.make_index()
+    # TIMETRACKER_INDEX=columnar keeps the hours in NumPy arrays instead
+    if os.environ.get("TIMETRACKER_INDEX") == "columnar":
+        from columnar import ColumnarHours
+        return ColumnarHours.from_projects(projects)
+    return HoursIndex(projects)
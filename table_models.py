@@ -0,0 +1,162 @@
+from itertools import islice
+from operator import itemgetter
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtWidgets import QTableView, QHeaderView, QAbstractItemView, QLineEdit
+
+# Rows are pulled from the row generator this many at a time
+FETCH_BATCH = 200
+
+
+class LazyTableModel(QAbstractTableModel):
+    # Table over a generator of row tuples (see reports.py). Rows are pulled
+    # in batches as the view scrolls (canFetchMore/fetchMore), so showing a
+    # table costs the same however long the history is. `formats` maps a
+    # column to a format string for its display text.
+    #
+    # Sorting and filtering need every row, so they load the rest first and
+    # work on the plain row lists; a QSortFilterProxyModel would call data()
+    # for every row and comparison instead.
+
+    def __init__(self, header, rows=(), formats=None, batch=FETCH_BATCH, parent=None):
+        super().__init__(parent)
+        self.header = list(header)
+        self.formats = formats or {}
+        self.batch = batch
+        self.start(rows)
+        self.fetchMore()
+
+    def start(self, rows):
+        self.source = iter(rows)
+        self.all_rows = []
+        self.rows = self.all_rows  # the rows shown, after filtering
+        self.exhausted = False
+        self.filter_text = ""
+        self.search_keys = None
+
+    def reset(self, rows, header=None):
+        self.beginResetModel()
+        if header is not None:
+            self.header = list(header)
+        self.start(rows)
+        self.endResetModel()
+        self.fetchMore()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.header)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        value = self.rows[index.row()][index.column()]
+        if role == Qt.DisplayRole:
+            if index.column() in self.formats:
+                return self.formats[index.column()].format(value)
+            return str(value)
+        if role == Qt.TextAlignmentRole and isinstance(value, (int, float)):
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.header[section]
+        return None
+
+    def set_cell(self, row, column, value):
+        # Replace one value of a fetched row and repaint just that cell
+        if row >= len(self.rows):
+            return
+        old = self.rows[row]
+        new = old[:column] + (value,) + old[column + 1:]
+        self.rows[row] = new
+        if self.rows is not self.all_rows:
+            self.all_rows[self.all_rows.index(old)] = new
+        self.search_keys = None
+        index = self.index(row, column)
+        self.dataChanged.emit(index, index)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        self.fetch(self.batch)
+
+    def fetch_all(self):
+        self.fetch(None)
+
+    def fetch(self, count):
+        if self.exhausted:
+            return
+        rows = list(islice(self.source, count))
+        if count is None or len(rows) < count:
+            self.exhausted = True
+        if rows:
+            # Only unfiltered tables fetch lazily, so rows is all_rows here
+            first = len(self.all_rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self.all_rows.extend(rows)
+            self.endInsertRows()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column < 0:
+            return
+        self.fetch_all()
+        self.layoutAboutToBeChanged.emit()
+        reverse = order == Qt.DescendingOrder
+        try:
+            self.all_rows.sort(key=itemgetter(column), reverse=reverse)
+        except TypeError:  # mixed types in one column
+            self.all_rows.sort(key=lambda row: str(row[column]), reverse=reverse)
+        self.search_keys = None
+        self.rows = self.filtered(self.filter_text)
+        self.layoutChanged.emit()
+
+    def set_filter(self, text):
+        # Show the rows that contain `text` in any column, ignoring case
+        self.beginResetModel()
+        self.filter_text = text.lower()
+        if self.filter_text:
+            self.exhausted = True
+            self.all_rows.extend(self.source)
+        self.rows = self.filtered(self.filter_text)
+        self.endResetModel()
+
+    def filtered(self, text):
+        if not text:
+            return self.all_rows
+        if self.search_keys is None:
+            self.search_keys = ["\t".join(map(str, row)).lower() for row in self.all_rows]
+        return [row for row, key in zip(self.all_rows, self.search_keys) if text in key]
+
+
+def make_table_view(model, sortable=True):
+    # Read-only table on `model`; sortable by clicking a column header
+    view = QTableView()
+    view.setModel(model)
+    view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+    view.setSelectionBehavior(QAbstractItemView.SelectRows)
+    view.setAlternatingRowColors(True)
+    view.verticalHeader().setVisible(False)
+    # Fixed row heights and column modes that don't measure every row
+    view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+    view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+    view.horizontalHeader().setStretchLastSection(True)
+    if sortable:
+        # No initial sort: that would load every row when the view opens
+        view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        view.setSortingEnabled(True)
+    return view
+
+
+def make_filtered_table(model, placeholder="Filter...", on_filter=None):
+    # Filter box plus a sortable table on `model`: (filter input, view).
+    # on_filter(text) replaces the model's own filtering, for tables that
+    # have an index to search.
+    filter_input = QLineEdit()
+    filter_input.setPlaceholderText(placeholder)
+    filter_input.setClearButtonEnabled(True)
+    filter_input.textChanged.connect(on_filter or model.set_filter)
+    return filter_input, make_table_view(model)
@@ -0,0 +1,83 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from hours_index import HoursIndex
+
+# Random ops and the projects dict they are applied to with storage.apply_op,
+# the reference every store and index is compared with.
+
+PROJECTS = ["Alpha", "Beta", "Gamma"]
+DATES = [f"2024-03-{day:02d}" for day in range(1, 22)]
+
+
+def random_op(rng):
+    kind = rng.choice(["add_hours", "add_hours", "add_entry", "move_entries",
+                       "clear_range", "clear_project"])
+    project = rng.choice(PROJECTS)
+    start = rng.choice(DATES)
+    end = min(DATES[-1], rng.choice(DATES[DATES.index(start):DATES.index(start) + 4]))
+    if kind == "add_hours":
+        return {"op": "add_hours", "project": project, "date": start,
+                "hours": rng.choice([0, 0.1, 0.2, 0.7, 1, 2.35])}
+    if kind == "add_entry":
+        return {"op": "add_entry", "project": project, "date": start,
+                "minutes": rng.choice([10, 15, 45, 90]), "note": rng.choice(["", "Review"])}
+    if kind == "move_entries":
+        return {"op": "move_entries", "project": project, "start": start, "end": end,
+                "to_project": rng.choice(PROJECTS), "days": rng.randint(-4, 4)}
+    if kind == "clear_project":
+        return {"op": "clear_range", "project": project, "start": start, "end": end}
+    return {"op": "clear_range", "start": start, "end": end}
+
+
+def starting_projects(rng):
+    return {project: {"account_number": str(number), "comments": "",
+                      "hours": {date_str: rng.choice([0.1, 1, 2]) for date_str in DATES
+                                if rng.random() < 0.3}}
+            for number, project in enumerate(PROJECTS)}
+
+
+def plain(projects):
+    # The projects of a store (a dict or a lazy view) in one comparable form:
+    # unset details are None, days without entries are left out
+    result = {}
+    for project in projects:
+        details = projects[project]
+        result[project] = {
+            "account_number": details.get("account_number"),
+            "comments": details.get("comments"),
+            "hours": dict(details.get("hours") or {}),
+            "entries": {date_str: listed for date_str, listed
+                        in (details.get("entries") or {}).items() if listed},
+        }
+    return result
+
+
+def rounded(value):
+    return round(value, 9)
+
+
+def index_answers(index, dates=DATES):
+    # Everything the hours views read from an index, rounded, since stores
+    # add up float hours in different orders
+    days, totals = index.daily_series()
+    weeks = list(index.weeks)
+    reports = {}
+    for week in weeks:
+        report, total = index.week_report(week)
+        reports[week] = ({project: rounded(hours) for project, hours in report.items()},
+                         rounded(total))
+    return {
+        "days": list(days),
+        "totals": [rounded(total) for total in totals],
+        "weeks": weeks,
+        "reports": reports,
+        "day_totals": {date_str: rounded(index.day_total(date_str)) for date_str in dates},
+    }
+
+
+def reference_answers(projects, dates=DATES):
+    return index_answers(HoursIndex(projects), dates)
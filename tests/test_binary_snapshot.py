@@ -0,0 +1,147 @@
+import os
+import sys
+import copy
+import json
+import random
+import shutil
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from storage import apply_op, journal_record
+from binary_snapshot import BinaryStore, write_snapshot, read_snapshot, read_binary, convert
+from reference import random_op, starting_projects, plain, index_answers, reference_answers
+
+# Snapshot files are written and read back, and the store's overlay is
+# checked against a plain projects dict with the same ops applied: while
+# the changes are only in the overlay, after they are replayed from the
+# journal and after save() folds them into a new snapshot.
+
+
+class BinarySnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="timetracker-binary-")
+        self.path = os.path.join(self.folder, "projects.ttsnap")
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        shutil.rmtree(self.folder)
+
+    def open_store(self):
+        store = BinaryStore(self.path)
+        self.stores.append(store)
+        return store, store.load()
+
+    def reopen(self, store):
+        store.close()
+        self.stores.remove(store)
+        return self.open_store()
+
+    def assert_holds(self, store, projects, reference):
+        self.assertEqual(plain(projects), plain(reference))
+        self.assertEqual(index_answers(store.make_index()), reference_answers(reference))
+
+    def test_snapshot_round_trip(self):
+        projects = {
+            "Alpha": {"account_number": "1", "comments": "Notes",
+                      # Not in date order, with int and float hours
+                      "hours": {"2024-03-06": 2, "2024-03-04": 2.35, "2023-12-31": 0}},
+            "Beta": {"account_number": "2", "comments": "",
+                     "hours": {"2024-03-04": 1.5},
+                     "entries": {"2024-03-04": [{"minutes": 90, "note": "Review",
+                                                 "start": "09:00", "end": "10:30"}]}},
+            "Empty": {"account_number": "3", "comments": ""},
+        }
+        write_snapshot(self.path, projects)
+        result = read_snapshot(self.path)
+        self.assertEqual(result, projects)
+        self.assertEqual(list(result["Alpha"]["hours"]), list(projects["Alpha"]["hours"]))
+        self.assertIsInstance(result["Alpha"]["hours"]["2024-03-06"], int)
+
+        target = os.path.join(self.folder, "projects.json")
+        convert(self.path, target)
+        with open(target) as file:
+            self.assertEqual(json.load(file), projects)
+
+    def test_overlay_journal_and_new_snapshot(self):
+        rng = random.Random(1)
+        reference = starting_projects(rng)
+        write_snapshot(self.path, reference)
+        store, projects = self.open_store()
+        for _ in range(200):
+            ops = [random_op(rng) for _ in range(rng.randint(1, 4))]
+            for op in ops:
+                apply_op(reference, op)
+            store.apply_batch(ops)
+        self.assert_holds(store, projects, reference)
+        self.assertEqual(plain(read_binary(self.path)), plain(reference))
+
+        store, projects = self.reopen(store)
+        self.assert_holds(store, projects, reference)
+        store.save()
+        self.assertEqual(os.path.getsize(self.path + ".journal"), 0)
+        self.assert_holds(store, projects, reference)
+        self.assertEqual(plain(read_snapshot(self.path)), plain(reference))
+        store, projects = self.reopen(store)
+        self.assert_holds(store, projects, reference)
+
+    def test_cleared_day_totals_zero(self):
+        # Float hours added and cleared again leave no residue
+        write_snapshot(self.path, {"A": {"hours": {"2024-03-05": 0.1}},
+                                   "B": {"hours": {"2024-03-06": 2}}})
+        store, _ = self.open_store()
+        store.apply_batch([
+            {"op": "add_hours", "project": "A", "date": "2024-03-05", "hours": 0.2},
+            {"op": "add_hours", "project": "B", "date": "2024-03-05", "hours": 0.7},
+            {"op": "add_entry", "project": "B", "date": "2024-03-05", "minutes": 13},
+            {"op": "clear_range", "start": "2024-03-05", "end": "2024-03-05"},
+        ])
+        index = store.make_index()
+        self.assertEqual(index.day_total("2024-03-05"), 0)
+        self.assertEqual(index.daily_series(), (["2024-03-06"], [2]))
+        self.assertEqual(index.week_report("2024-W10"), ({"B": 2}, 2))
+        self.assertFalse(index.has_day("2024-03-05"))
+        self.assertEqual(index.entry_count(), 1)
+
+    def test_cut_off_batch_is_dropped(self):
+        rng = random.Random(2)
+        reference = starting_projects(rng)
+        write_snapshot(self.path, reference)
+        store, _ = self.open_store()
+        op = {"op": "add_hours", "project": "Alpha", "date": "2024-03-05", "hours": 1}
+        apply_op(reference, op)
+        store.apply(op)
+        store.close()
+        self.stores.remove(store)
+        torn = [random_op(rng) for _ in range(3)]
+        with open(self.path + ".journal", "a") as journal:
+            journal.write(journal_record(torn)[:-5])
+
+        store, projects = self.open_store()
+        self.assert_holds(store, projects, reference)
+        more = [random_op(rng) for _ in range(3)]
+        for op in more:
+            apply_op(reference, op)
+        store.apply_batch(more)
+        store, projects = self.reopen(store)
+        self.assert_holds(store, projects, reference)
+
+    def test_saving_a_dict_replaces_the_contents(self):
+        rng = random.Random(3)
+        write_snapshot(self.path, starting_projects(rng))
+        store, projects = self.open_store()
+        store.apply({"op": "add_hours", "project": "Alpha", "date": "2024-03-05", "hours": 1})
+        reference = starting_projects(rng)
+        store.save(copy.deepcopy(reference))
+        self.assert_holds(store, store.projects, reference)
+        store, projects = self.reopen(store)
+        self.assert_holds(store, projects, reference)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from hours_index import HoursIndex
+from reports import LockedIndex
+from export import export_reports, csv_paths, ExportCancelled, PROGRESS_EVERY
+
+
+def many_days(count):
+    # {"P": {"hours": ...}} with hours on `count` consecutive days
+    first = date(2000, 1, 3)
+    return {"P": {"hours": {(first + timedelta(days=day)).isoformat(): 1
+                            for day in range(count)}}}
+
+
+class ExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="timetracker-export-")
+        self.path = os.path.join(self.folder, "report.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def read(self, paths):
+        contents = []
+        for path in paths:
+            with open(path, encoding="utf-8") as file:
+                contents.append(file.read())
+        return contents
+
+    def test_locked_index_writes_the_same_reports(self):
+        index = HoursIndex(many_days(50))
+        direct = self.read(export_reports(index, self.path))
+        locked = self.read(export_reports(LockedIndex(index, threading.Lock()), self.path))
+        self.assertEqual(locked, direct)
+
+    def test_lock_is_free_while_rows_are_written(self):
+        lock = threading.Lock()
+        held = []
+
+        def progress(stage, stages, title, rows):
+            held.append(lock.locked())
+
+        export_reports(LockedIndex(HoursIndex(many_days(3 * PROGRESS_EVERY)), lock),
+                       self.path, progress)
+        self.assertTrue(held)
+        self.assertFalse(any(held))
+
+    def test_cancelled_export_leaves_no_files(self):
+        index = HoursIndex(many_days(3 * PROGRESS_EVERY))
+        with self.assertRaises(ExportCancelled):
+            export_reports(index, self.path, cancelled=lambda: True)
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_cancelled_export_keeps_the_previous_files(self):
+        paths = export_reports(HoursIndex(many_days(5)), self.path)
+        before = self.read(paths)
+        with self.assertRaises(ExportCancelled):
+            export_reports(HoursIndex(many_days(3 * PROGRESS_EVERY)), self.path,
+                           cancelled=lambda: True)
+        self.assertEqual(self.read(paths), before)
+        self.assertEqual(sorted(os.listdir(self.folder)),
+                         sorted(os.path.basename(path) for path in csv_paths(self.path).values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
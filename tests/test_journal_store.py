@@ -0,0 +1,137 @@
+import os
+import sys
+import copy
+import json
+import random
+import shutil
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from storage import JournalStore, apply_op, journal_record, read_projects
+from hours_index import HoursIndex
+from reference import random_op, starting_projects, plain, index_answers, reference_answers
+
+# The journal store is reloaded after random batches, a cut off last
+# record and interrupted compactions; every time it must hold what the
+# same ops give on a plain projects dict.
+
+
+class JournalStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="timetracker-journal-")
+        self.path = os.path.join(self.folder, "projects.json")
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        shutil.rmtree(self.folder)
+
+    def open_store(self, **options):
+        store = JournalStore(self.path, **options)
+        self.stores.append(store)
+        return store, store.load()
+
+    def reopen(self, store):
+        store.close()
+        self.stores.remove(store)
+        return self.open_store()
+
+    def assert_holds(self, projects, reference):
+        self.assertEqual(plain(projects), plain(reference))
+        self.assertEqual(index_answers(HoursIndex(projects)), reference_answers(reference))
+
+    def write_snapshot(self, path, projects):
+        with open(path, "w") as file:
+            json.dump(projects, file)
+
+    def test_reload_after_random_batches(self):
+        rng = random.Random(1)
+        reference = starting_projects(rng)
+        self.write_snapshot(self.path, reference)
+        # A low threshold compacts in the background between batches
+        store, _ = self.open_store(compact_threshold=25)
+        for _ in range(200):
+            ops = [random_op(rng) for _ in range(rng.randint(1, 4))]
+            for op in ops:
+                apply_op(reference, op)
+            if len(ops) == 1:
+                store.apply(ops[0])
+            else:
+                store.apply_batch(ops)
+        self.assert_holds(store.projects, reference)
+        store, projects = self.reopen(store)
+        self.assert_holds(projects, reference)
+        self.assert_holds(read_projects(self.path), reference)
+
+    def test_cut_off_record_is_dropped(self):
+        reference = {}
+        store, _ = self.open_store()
+        for op in ({"op": "add_project", "project": "P", "account_number": "1", "comments": ""},
+                   {"op": "add_hours", "project": "P", "date": "2024-03-05", "hours": 2}):
+            apply_op(reference, op)
+            store.apply(op)
+        store.close()
+        self.stores.remove(store)
+        complete = os.path.getsize(self.path + ".journal")
+        with open(self.path + ".journal", "a") as journal:
+            journal.write(journal_record([{"op": "add_hours", "project": "P",
+                                           "date": "2024-03-06", "hours": 1}])[:-12])
+
+        store, projects = self.open_store()
+        self.assert_holds(projects, reference)
+        self.assertEqual(os.path.getsize(self.path + ".journal"), complete)
+        # New records start on a clean line
+        op = {"op": "add_hours", "project": "P", "date": "2024-03-07", "hours": 3}
+        apply_op(reference, op)
+        store.apply(op)
+        store, projects = self.reopen(store)
+        self.assert_holds(projects, reference)
+
+    def test_interrupted_compaction_replays_the_frozen_journal(self):
+        # Crashed before the snapshot was finished: .journal.old holds the
+        # changes, .tmp is incomplete
+        rng = random.Random(2)
+        reference = starting_projects(rng)
+        self.write_snapshot(self.path, reference)
+        frozen = [random_op(rng) for _ in range(20)]
+        fresh = [random_op(rng) for _ in range(5)]
+        with open(self.path + ".journal.old", "w") as journal:
+            journal.writelines(journal_record([op]) for op in frozen)
+        with open(self.path + ".journal", "w") as journal:
+            journal.write(journal_record(fresh))
+        with open(self.path + ".tmp", "w") as tmp:
+            tmp.write('{"Alpha": {"hours": {"2024-')
+        for op in frozen + fresh:
+            apply_op(reference, op)
+
+        self.assert_holds(read_projects(self.path), reference)
+        store, projects = self.open_store()
+        self.assert_holds(projects, reference)
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+        store.save()
+        self.assertFalse(os.path.exists(self.path + ".journal.old"))
+        store, projects = self.reopen(store)
+        self.assert_holds(projects, reference)
+
+    def test_finished_snapshot_is_moved_in_place(self):
+        # Crashed after the commit point: the .tmp snapshot is complete
+        rng = random.Random(3)
+        old = starting_projects(rng)
+        reference = copy.deepcopy(old)
+        for _ in range(20):
+            apply_op(reference, random_op(rng))
+        self.write_snapshot(self.path, old)
+        self.write_snapshot(self.path + ".tmp", reference)
+
+        store, projects = self.open_store()
+        self.assert_holds(projects, reference)
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import copy
+import random
+import shutil
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from storage import apply_op
+from hours_index import HoursIndex
+from columnar import ColumnarHours
+from binary_snapshot import BinaryStore, write_snapshot
+from report_cache import ReportCache
+from reference import random_op, starting_projects, index_answers, reference_answers
+
+# The cached week list, daily series and week reports are patched from each
+# batch's changes; after every batch they must match an index built afresh
+# from the same projects.
+
+
+class ReportCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="timetracker-cache-")
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        shutil.rmtree(self.folder)
+
+    def assert_matches(self, cache, projects):
+        self.assertEqual(index_answers(cache), reference_answers(projects))
+
+    def check_batches(self, make_index, apply_batch, projects, rng):
+        cache = ReportCache(make_index())
+        self.assert_matches(cache, projects)
+        for _ in range(150):
+            ops = [random_op(rng) for _ in range(rng.randint(1, 4))]
+            changes = []
+            for op in ops:
+                changes.extend(apply_op(projects, op))
+            apply_batch(ops)
+            cache.apply_changes(changes)
+            self.assert_matches(cache, projects)
+
+    def test_hours_index(self):
+        rng = random.Random(1)
+        projects = starting_projects(rng)
+        self.check_batches(lambda: HoursIndex(projects), lambda ops: None, projects, rng)
+
+    def test_columnar(self):
+        rng = random.Random(2)
+        projects = starting_projects(rng)
+        self.check_batches(lambda: ColumnarHours.from_projects(projects),
+                           lambda ops: None, projects, rng)
+
+    def test_binary(self):
+        rng = random.Random(3)
+        projects = starting_projects(rng)
+        path = os.path.join(self.folder, "projects.ttsnap")
+        write_snapshot(path, projects)
+        store = BinaryStore(path)
+        store.load()
+        self.stores.append(store)
+        self.check_batches(store.make_index, store.apply_batch, copy.deepcopy(projects), rng)
+
+    def test_cleared_after_move_in_one_batch(self):
+        projects = {"A": {"hours": {"2024-03-01": 1}}, "B": {"hours": {"2024-03-05": 2}}}
+        cache = ReportCache(HoursIndex(projects))
+        cache.daily_series()
+        changes = []
+        for op in ({"op": "move_entries", "project": "A", "start": "2024-03-01",
+                    "end": "2024-03-01", "days": 4},
+                   {"op": "clear_range", "start": "2024-03-05", "end": "2024-03-05"}):
+            changes.extend(apply_op(projects, op))
+        cache.apply_changes(changes)
+        self.assertEqual(cache.daily_series(), ([], []))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from shared_store import SharedStore
+from hours_index import HoursIndex
+
+# Several users of one shared folder, each in their own process like the
+# app. The functions below run in the worker processes.
+
+WEEK = ("2024-03-04", "2024-03-10")
+
+
+def hours_of(projects):
+    return {project: dict(details.get("hours", {})) for project, details in projects.items()}
+
+
+def add_random_hours(folder, user, count, seed):
+    # Adds `count` hours one commit at a time; returns what it added
+    rng = random.Random(seed)
+    store = SharedStore(folder, user)
+    store.load()
+    added = {}
+    for _ in range(count):
+        project = rng.choice(["Alpha", "Beta", "Gamma"])
+        date_str = f"2024-03-0{rng.randint(1, 5)}"
+        store.apply({"op": "add_hours", "project": project, "date": date_str, "hours": 1})
+        added[(project, date_str)] = added.get((project, date_str), 0) + 1
+        if rng.random() < 0.2:
+            store.refresh()
+    store.close()
+    return added
+
+
+def apply_batches(folder, user, batches):
+    store = SharedStore(folder, user)
+    store.load()
+    for ops in batches:
+        store.apply_batch(ops)
+    store.close()
+
+
+def load_hours(folder):
+    store = SharedStore(folder, "reader")
+    projects = store.load()
+    store.close()
+    return hours_of(projects), {project: details.get("account_number")
+                                for project, details in projects.items()}
+
+
+class SharedStoreTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.context = multiprocessing.get_context("spawn")
+        cls.pool = cls.context.Pool(4)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+        cls.pool.join()
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="timetracker-shared-")
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        shutil.rmtree(self.folder)
+
+    def open_store(self, user):
+        store = SharedStore(self.folder, user)
+        store.load()
+        self.stores.append(store)
+        return store
+
+    def in_process(self, func, *args):
+        return self.pool.apply(func, (self.folder,) + args)
+
+    def fresh_load(self):
+        return self.in_process(load_hours)
+
+    def test_concurrent_writers(self):
+        store = self.open_store("watcher")
+        index = HoursIndex(store.projects)
+        running = [self.pool.apply_async(add_random_hours, (self.folder, f"user{n}", 60, n))
+                   for n in range(4)]
+        while not all(result.ready() for result in running):
+            index.apply_changes(store.refresh())
+        index.apply_changes(store.refresh())
+
+        expected = {}
+        for result in running:
+            for (project, date_str), hours in result.get().items():
+                expected.setdefault(project, {})
+                expected[project][date_str] = expected[project].get(date_str, 0) + hours
+        self.assertEqual(hours_of(store.projects), expected)
+        self.assertEqual(self.fresh_load()[0], expected)
+        for date_str in ("2024-03-01", "2024-03-03", "2024-03-05"):
+            self.assertEqual(index.day_total(date_str),
+                             sum(hours.get(date_str, 0) for hours in expected.values()))
+
+        store.save()
+        self.assertEqual(self.fresh_load()[0], expected)
+
+    def test_hours_added_after_a_cleared_week_survive_loading(self):
+        # "amy" sorts before "bob": merging by file name would clear amy's
+        # hours again on the next load
+        amy = self.open_store("amy")
+        self.in_process(apply_batches, "bob", [
+            [{"op": "add_hours", "project": "P", "date": "2024-03-05", "hours": 2}],
+            [{"op": "clear_range", "start": WEEK[0], "end": WEEK[1]}]])
+        amy.refresh()
+        amy.apply({"op": "add_hours", "project": "P", "date": "2024-03-05", "hours": 4})
+        self.assertEqual(hours_of(amy.projects), {"P": {"2024-03-05": 4}})
+        self.assertEqual(self.fresh_load()[0], {"P": {"2024-03-05": 4}})
+        amy.save()
+        self.assertEqual(self.fresh_load()[0], {"P": {"2024-03-05": 4}})
+
+    def test_clear_merged_late_is_put_in_order(self):
+        self.in_process(apply_batches, "bob", [
+            [{"op": "add_hours", "project": "P", "date": "2024-03-05", "hours": 2}]])
+        amy = self.open_store("amy")
+        # bob clears the week before amy adds hours, but amy only merges
+        # the clear afterwards
+        self.in_process(apply_batches, "bob", [
+            [{"op": "clear_range", "start": WEEK[0], "end": WEEK[1]}]])
+        amy.apply({"op": "add_hours", "project": "P", "date": "2024-03-05", "hours": 4})
+        self.assertEqual(hours_of(amy.projects), {"P": {"2024-03-05": 6}})
+
+        changes = amy.refresh()
+        self.assertEqual(changes, [("P", "2024-03-05", 6, 4)])
+        self.assertEqual(hours_of(amy.projects), {"P": {"2024-03-05": 4}})
+        self.assertEqual(self.fresh_load()[0], {"P": {"2024-03-05": 4}})
+
+    def test_same_project_added_by_two_users(self):
+        amy = self.open_store("amy")
+        self.in_process(apply_batches, "bob", [[
+            {"op": "add_project", "project": "P", "account_number": "2"},
+            {"op": "add_hours", "project": "P", "date": "2024-03-06", "hours": 5}]])
+        amy.apply_batch([
+            {"op": "add_project", "project": "P", "account_number": "1"},
+            {"op": "add_hours", "project": "P", "date": "2024-03-05", "hours": 3}])
+
+        changes = amy.refresh()
+        expected = {"P": {"2024-03-05": 3, "2024-03-06": 5}}
+        self.assertEqual(hours_of(amy.projects), expected)
+        self.assertIn(("P", "2024-03-06", None, 5), changes)
+        hours, accounts = self.fresh_load()
+        self.assertEqual(hours, expected)
+        # bob's project came first
+        self.assertEqual(accounts, {"P": "2"})
+        self.assertEqual(amy.projects["P"]["account_number"], "2")
+
+    def test_torn_batch_is_skipped_whole(self):
+        amy = self.open_store("amy")
+        amy.apply_batch([
+            {"op": "add_hours", "project": "P", "date": "2024-03-04", "hours": 1}])
+        amy.apply_batch([
+            {"op": "move_entries", "project": "P", "start": "2024-03-04", "end": "2024-03-04",
+             "days": 1},
+            {"op": "add_hours", "project": "P", "date": "2024-03-06", "hours": 1}])
+        amy.close()
+        path = os.path.join(self.folder, "segments", "amy.jsonl")
+        with open(path, "rb") as file:
+            data = file.read()
+        with open(path, "wb") as file:
+            file.write(data[:data.rfind(b"move_entries")])
+        self.assertEqual(self.fresh_load()[0], {"P": {"2024-03-04": 1}})
+
+
+if __name__ == "__main__":
+    unittest.main()
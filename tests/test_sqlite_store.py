@@ -0,0 +1,126 @@
+import os
+import sys
+import copy
+import json
+import random
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from storage import JournalStore, apply_op, read_projects
+from sqlite_store import SqliteStore, migrate
+from reference import random_op, starting_projects, plain, index_answers, reference_answers
+
+# projects.json files are migrated into a database and changed there; the
+# database's projects view and index must answer like a plain projects dict
+# with the same ops applied.
+
+
+class SqliteStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="timetracker-sqlite-")
+        self.db_path = os.path.join(self.folder, "projects.db")
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        shutil.rmtree(self.folder)
+
+    def open_store(self):
+        store = SqliteStore(self.db_path)
+        self.stores.append(store)
+        return store, store.load()
+
+    def reopen(self, store):
+        store.close()
+        self.stores.remove(store)
+        return self.open_store()
+
+    def assert_holds(self, store, projects, reference):
+        self.assertEqual(plain(projects), plain(reference))
+        self.assertEqual(index_answers(store.make_index()), reference_answers(reference))
+
+    def migrate(self, sources):
+        with redirect_stdout(StringIO()):
+            migrate(sources, self.db_path)
+
+    def test_migrated_file_and_journal_tail(self):
+        rng = random.Random(1)
+        reference = starting_projects(rng)
+        source = os.path.join(self.folder, "projects.json")
+        with open(source, "w") as file:
+            json.dump(reference, file)
+        # Changes still in the journal are migrated too
+        journal = JournalStore(source)
+        journal.load()
+        for _ in range(50):
+            op = random_op(rng)
+            apply_op(reference, op)
+            journal.apply(op)
+        journal.close()
+
+        self.migrate([source])
+        store, projects = self.open_store()
+        self.assert_holds(store, projects, reference)
+        self.assertEqual(plain(projects), plain(read_projects(source)))
+
+    def test_migrating_two_files_adds_up_their_hours(self):
+        first = {"P": {"account_number": "1", "comments": "", "hours": {"2024-03-05": 2}}}
+        second = {"P": {"account_number": "9", "comments": "Other", "hours": {"2024-03-05": 1.5,
+                                                                              "2024-03-06": 1}},
+                  "Q": {"hours": {"2024-03-06": 3}}}
+        sources = []
+        for number, projects in enumerate((first, second)):
+            sources.append(os.path.join(self.folder, f"projects-{number}.json"))
+            with open(sources[-1], "w") as file:
+                json.dump(projects, file)
+
+        self.migrate(sources)
+        store, projects = self.open_store()
+        self.assertEqual(plain(projects), {
+            "P": {"account_number": "1", "comments": "", "entries": {},
+                  "hours": {"2024-03-05": 3.5, "2024-03-06": 1}},
+            "Q": {"account_number": None, "comments": None, "entries": {},
+                  "hours": {"2024-03-06": 3}},
+        })
+
+    def test_random_batches_and_reload(self):
+        rng = random.Random(2)
+        reference = starting_projects(rng)
+        store, projects = self.open_store()
+        store.save(copy.deepcopy(reference))
+        for _ in range(150):
+            ops = [random_op(rng) for _ in range(rng.randint(1, 4))]
+            for op in ops:
+                apply_op(reference, op)
+            store.apply_batch(ops)
+        self.assert_holds(store, projects, reference)
+        store, projects = self.reopen(store)
+        self.assert_holds(store, projects, reference)
+        self.assertEqual(store.make_index().entry_count(),
+                         sum(len(details["hours"]) for details in reference.values()))
+
+    def test_failed_batch_changes_nothing(self):
+        rng = random.Random(3)
+        reference = starting_projects(rng)
+        store, projects = self.open_store()
+        store.save(copy.deepcopy(reference))
+        ops = [{"op": "add_hours", "project": "Alpha", "date": "2024-03-05", "hours": 2},
+               {"op": "clear_range", "start": "2024-03-01", "end": "2024-03-03"},
+               {"op": "remove_entry", "project": "Beta", "date": "2024-03-30", "entry": 0}]
+        with self.assertRaises(ValueError):
+            store.apply_batch(ops)
+        self.assert_holds(store, projects, reference)
+        store, projects = self.reopen(store)
+        self.assert_holds(store, projects, reference)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,204 @@
+import os
+import sys
+import copy
+import json
+import random
+import shutil
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from storage import JournalStore, apply_op, check_batch, journal_record
+from sqlite_store import SqliteStore
+from binary_snapshot import BinaryStore, write_snapshot
+from shared_store import SharedStore
+from time_entries import read_day
+from reference import (PROJECTS, DATES, random_op, starting_projects, plain,
+                       index_answers, reference_answers)
+
+# Entry batches are applied to every store the way the window applies them:
+# check_batch first, then stage each op and commit the batch. Reloaded, each
+# store must hold what the same ops give on a plain projects dict, and a
+# batch that fails or is cut off must leave no trace.
+
+
+def entry_op(rng, reference):
+    # A random entry op that applies to `reference`; remove_entry and
+    # split_entry address an existing entry
+    days = [(project, date_str) for project, details in reference.items()
+            for date_str, hours in details.get("hours", {}).items() if hours]
+    kind = rng.choice(["add_entry", "add_entry", "remove_entry", "split_entry",
+                       "move_entries", "clear_project", "random"])
+    if kind in ("remove_entry", "split_entry") and days:
+        project, date_str = rng.choice(sorted(days))
+        listed = read_day(reference, project, date_str)
+        position = rng.randrange(len(listed))
+        if kind == "remove_entry":
+            return {"op": "remove_entry", "project": project, "date": date_str,
+                    "entry": position}
+        if listed[position]["minutes"] > 1:
+            return {"op": "split_entry", "project": project, "date": date_str,
+                    "entry": position, "minutes": rng.randint(1, listed[position]["minutes"] - 1),
+                    "to_project": rng.choice(PROJECTS)}
+    if kind == "add_entry":
+        return {"op": "add_entry", "project": rng.choice(PROJECTS), "date": rng.choice(DATES),
+                "start": rng.choice(["08:00", "09:15", "23:30"]),
+                "end": rng.choice(["10:00", "12:45"]), "minutes": None,
+                "note": rng.choice(["", "Review", "Call"])}
+    return random_op(rng)
+
+
+def entry_batch(rng, reference):
+    # Ops of one batch, each valid after the ones before it
+    trial = copy.deepcopy(reference)
+    ops = []
+    for _ in range(rng.randint(1, 4)):
+        op = entry_op(rng, trial)
+        apply_op(trial, op)
+        ops.append(op)
+    return ops
+
+
+def journal_store(folder, projects):
+    path = os.path.join(folder, "projects.json")
+    with open(path, "w") as file:
+        json.dump(projects, file)
+    return lambda: JournalStore(path)
+
+
+def sqlite_store(folder, projects):
+    path = os.path.join(folder, "projects.db")
+    store = SqliteStore(path)
+    store.load()
+    store.save(copy.deepcopy(projects))
+    store.close()
+    return lambda: SqliteStore(path)
+
+
+def binary_store(folder, projects):
+    path = os.path.join(folder, "projects.ttsnap")
+    write_snapshot(path, projects)
+    return lambda: BinaryStore(path)
+
+
+def shared_store(folder, projects):
+    with open(os.path.join(folder, "projects.json"), "w") as file:
+        json.dump(projects, file)
+    return lambda: SharedStore(folder, "tester")
+
+
+STORES = {"journal": journal_store, "sqlite": sqlite_store,
+          "binary": binary_store, "shared": shared_store}
+
+
+class TimeEntriesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix="timetracker-entries-")
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        shutil.rmtree(self.folder)
+
+    def open_store(self, make_store):
+        store = make_store()
+        self.stores.append(store)
+        return store, store.load()
+
+    def reopen(self, store, make_store):
+        store.close()
+        self.stores.remove(store)
+        return self.open_store(make_store)
+
+    def assert_holds(self, store, projects, reference):
+        self.assertEqual(plain(projects), plain(reference))
+        index = store.make_index() if hasattr(store, "make_index") else None
+        if index is not None:
+            self.assertEqual(index_answers(index), reference_answers(reference))
+
+    def apply_batch(self, store, projects, ops):
+        # As TimeTrackerApp.apply_ops does it
+        check_batch(projects, ops)
+        for op in ops:
+            store.stage(op)
+        store.commit(ops)
+
+    def test_entry_batches_on_every_store(self):
+        for seed, (kind, setup) in enumerate(sorted(STORES.items())):
+            with self.subTest(store=kind):
+                rng = random.Random(seed)
+                reference = starting_projects(rng)
+                folder = os.path.join(self.folder, kind)
+                os.mkdir(folder)
+                make_store = setup(folder, reference)
+                store, projects = self.open_store(make_store)
+                for _ in range(100):
+                    ops = entry_batch(rng, reference)
+                    for op in ops:
+                        apply_op(reference, op)
+                    self.apply_batch(store, projects, ops)
+                self.assert_holds(store, projects, reference)
+                store, projects = self.reopen(store, make_store)
+                self.assert_holds(store, projects, reference)
+                for date_str in DATES:
+                    for project in PROJECTS:
+                        listed = read_day(projects, project, date_str)
+                        hours = projects[project]["hours"].get(date_str)
+                        self.assertEqual(sum(entry["minutes"] for entry in listed),
+                                         round((hours or 0) * 60))
+
+    def test_failed_batch_changes_nothing(self):
+        for seed, (kind, setup) in enumerate(sorted(STORES.items())):
+            with self.subTest(store=kind):
+                rng = random.Random(seed)
+                reference = starting_projects(rng)
+                reference["Alpha"]["hours"]["2024-03-05"] = 1
+                folder = os.path.join(self.folder, kind)
+                os.mkdir(folder)
+                make_store = setup(folder, reference)
+                store, projects = self.open_store(make_store)
+                ops = [{"op": "move_entries", "project": "Alpha", "start": "2024-03-01",
+                        "end": "2024-03-10", "to_project": "Beta", "days": 2},
+                       {"op": "clear_range", "project": "Gamma", "start": "2024-03-01",
+                        "end": "2024-03-21"},
+                       {"op": "add_entry", "project": "Beta", "date": "2024-03-07",
+                        "minutes": 30},
+                       # Alpha's day moved away, so it has no entry left
+                       {"op": "remove_entry", "project": "Alpha", "date": "2024-03-05",
+                        "entry": 0}]
+                with self.assertRaises(ValueError):
+                    self.apply_batch(store, projects, ops)
+                self.assert_holds(store, projects, reference)
+                store, projects = self.reopen(store, make_store)
+                self.assert_holds(store, projects, reference)
+
+    def test_cut_off_entry_batch_is_dropped_whole(self):
+        rng = random.Random(4)
+        reference = starting_projects(rng)
+        reference["Alpha"]["hours"]["2024-03-05"] = 1
+        make_store = journal_store(self.folder, reference)
+        store, projects = self.open_store(make_store)
+        ops = [{"op": "add_entry", "project": "Alpha", "date": "2024-03-05", "minutes": 45,
+                "note": "Review"},
+               {"op": "move_entries", "project": "Alpha", "start": "2024-03-05",
+                "end": "2024-03-05", "to_project": "Beta", "days": 1}]
+        self.apply_batch(store, projects, ops)
+        store.close()
+        self.stores.remove(store)
+        path = os.path.join(self.folder, "projects.json.journal")
+        with open(path) as journal:
+            record = journal.read()
+        self.assertEqual(record, journal_record(ops))
+        with open(path, "w") as journal:
+            journal.write(record[:-20])
+
+        store, projects = self.open_store(make_store)
+        self.assert_holds(store, projects, reference)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,298 @@
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+
+# Entry level hours. projects[name]["hours"][date] stays the day total that
+# every index, report and store reads; projects[name]["entries"][date]
+# optionally itemizes it:
+#
+#   [{"minutes": 90, "note": "Review", "start": "09:00", "end": "10:30"}, ...]
+#
+# "minutes" is required, the rest optional. Hours the entries don't cover
+# (whole hours added before entries existed, add_hours ops, imports) show
+# as one more entry without a note at the end of the day, so a day's
+# entries always add up to its hours. Entries are addressed by their
+# position in that list.
+#
+# Operations, applied by storage.apply_op like add_hours:
+#   add_entry     project, date, minutes, [note, start, end]
+#   remove_entry  project, date, entry
+#   split_entry   project, date, entry, minutes, [to_project]: the entry
+#                 keeps `minutes`, the rest becomes a new entry (of
+#                 to_project if given)
+#   move_entries  project, start, end, [to_project, days]: every day of the
+#                 project from start to end moves to to_project and/or
+#                 `days` later (earlier if negative)
+#   clear_range   with a project only clears that project's days
+
+ENTRY_OPS = ("add_entry", "remove_entry", "split_entry", "move_entries")
+ENTRY_FIELDS = ("note", "start", "end")
+
+
+def is_entry_op(op):
+    return op["op"] in ENTRY_OPS or (op["op"] == "clear_range" and "project" in op)
+
+
+def minutes_hours(minutes):
+    # Whole hours stay ints, like the hours added with add_hours
+    return minutes // 60 if minutes % 60 == 0 else minutes / 60
+
+
+def hours_minutes(hours):
+    return round((hours or 0) * 60)
+
+
+def clock_minutes(clock):
+    # "HH:MM" -> minutes after midnight
+    hours, sep, minutes = str(clock).partition(":")
+    if not sep or not hours.isdigit() or not minutes.isdigit():
+        raise ValueError(f"Not a time: {clock!r}, expected HH:MM")
+    if int(hours) > 24 or int(minutes) > 59:
+        raise ValueError(f"Not a time: {clock!r}, expected HH:MM")
+    return int(hours) * 60 + int(minutes)
+
+
+def clock_text(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def duration_text(minutes):
+    # 90 -> "1:30"
+    return f"{minutes // 60}:{minutes % 60:02d}"
+
+
+def span_minutes(start, end):
+    # Minutes from start to end ("HH:MM"); an end before the start is on
+    # the next day, "24:00" is the end of the day
+    if start == end:
+        raise ValueError(f"{start}-{end} is an empty time span")
+    minutes = clock_minutes(end) - clock_minutes(start)
+    return minutes if minutes > 0 else minutes + 24 * 60
+
+
+def make_entry(minutes, note="", start=None, end=None):
+    # Entry dict of an add_entry op; with start and end the minutes may be
+    # None and are taken from the span
+    if start and end:
+        span = span_minutes(start, end)
+        if minutes is not None and minutes != span:
+            raise ValueError(f"{minutes} minutes don't match {start}-{end}")
+        minutes = span
+    if isinstance(minutes, bool) or not isinstance(minutes, int) or minutes <= 0:
+        raise ValueError(f"Minutes must be a whole number above 0, not {minutes!r}")
+    entry = {"minutes": minutes}
+    for field, value in zip(ENTRY_FIELDS, (note, start, end)):
+        if value:
+            entry[field] = value
+    return entry
+
+
+def entry_op_fields(op):
+    return make_entry(op.get("minutes"), op.get("note", ""), op.get("start"), op.get("end"))
+
+
+def day_entries(hours, entries):
+    # The entries of one day, with the hours they don't cover as a last
+    # entry without a note
+    listed = list(entries or ())
+    rest = hours_minutes(hours) - sum(entry["minutes"] for entry in listed)
+    if rest > 0:
+        listed.append({"minutes": rest})
+    return listed
+
+
+def shift_date(date_str, days):
+    if not days:
+        return date_str
+    return (date.fromisoformat(date_str) + timedelta(days=days)).isoformat()
+
+
+def op_scope(op):
+    # {project: [(first, last date)]} of the days an op reads or writes, so
+    # stores that don't keep a projects dict only need to load those.
+    # clear_range over all projects and add_project have no scope.
+    kind = op["op"]
+    if kind in ("add_hours", "add_entry", "remove_entry"):
+        return {op["project"]: [(op["date"], op["date"])]}
+    if kind == "split_entry":
+        scope = {op["project"]: [(op["date"], op["date"])]}
+        scope.setdefault(op.get("to_project") or op["project"], []).append(
+            (op["date"], op["date"]))
+        return scope
+    if kind == "move_entries":
+        days = op.get("days", 0)
+        scope = {op["project"]: [(op["start"], op["end"])]}
+        scope.setdefault(op.get("to_project") or op["project"], []).append(
+            (shift_date(op["start"], days), shift_date(op["end"], days)))
+        return scope
+    if kind == "clear_range" and "project" in op:
+        return {op["project"]: [(op["start"], op["end"])]}
+    return {}
+
+
+def batch_scope(ops):
+    scope = {}
+    for op in ops:
+        for project, windows in op_scope(op).items():
+            scope.setdefault(project, []).extend(windows)
+    return scope
+
+
+def project_days(projects, project, first, last):
+    # ({date: hours}, {date: entries}) of one project from first to last.
+    # Views over a database or snapshot answer this without loading the
+    # project's whole history.
+    if hasattr(projects, "days"):
+        return projects.days(project, first, last)
+    details = projects.get(project) or {}
+    hours = {date_str: value for date_str, value in details.get("hours", {}).items()
+             if first <= date_str <= last}
+    entries = {date_str: listed for date_str, listed in details.get("entries", {}).items()
+               if date_str in hours}
+    return hours, entries
+
+
+def scope_projects(projects, scope):
+    # A small projects dict holding only the days in `scope`
+    partial = {}
+    for project, windows in scope.items():
+        if project not in projects:
+            continue
+        details = {"hours": {}, "entries": {}}
+        for first, last in windows:
+            hours, entries = project_days(projects, project, first, last)
+            details["hours"].update(hours)
+            details["entries"].update(entries)
+        partial[project] = details
+    return partial
+
+
+# Applying the ops to a projects dict. `dates` is the store's optional
+# storage.DateIndex, kept up to date like apply_op does.
+
+
+def project_dates(projects, project, first, last, dates=None):
+    details = projects.get(project)
+    if not details or "hours" not in details:
+        return []
+    if dates is not None:
+        listed = dates.sorted_dates(project)
+        return listed[bisect_left(listed, first):bisect_right(listed, last)]
+    return sorted(date_str for date_str in details["hours"] if first <= date_str <= last)
+
+
+def read_day(projects, project, date_str):
+    details = projects.get(project) or {}
+    return day_entries(details.get("hours", {}).get(date_str),
+                       details.get("entries", {}).get(date_str))
+
+
+def write_day(projects, project, date_str, listed, changes, dates=None):
+    # Replace one day of a project with the entries `listed`; the hours
+    # become their sum. A last entry without a note is left to the hours
+    # (see day_entries), so days without notes keep only their hours.
+    details = projects.setdefault(project, {"hours": {}})
+    hours = details.setdefault("hours", {})
+    old_hours = hours.get(date_str)
+    minutes = sum(entry["minutes"] for entry in listed)
+    new_hours = minutes_hours(minutes) if minutes else None
+
+    if new_hours is None:
+        if old_hours is not None:
+            del hours[date_str]
+            if dates is not None:
+                dates.pop_range(project, date_str, date_str)
+    else:
+        hours[date_str] = new_hours
+        if old_hours is None and dates is not None:
+            dates.added(project, date_str)
+
+    kept = list(listed)
+    if kept and set(kept[-1]) == {"minutes"}:
+        kept.pop()
+    if kept and new_hours is not None:
+        details.setdefault("entries", {})[date_str] = kept
+    elif date_str in details.get("entries", {}):
+        del details["entries"][date_str]
+        if not details["entries"]:
+            del details["entries"]
+
+    if new_hours != old_hours:
+        changes.append((project, date_str, old_hours, new_hours))
+
+
+def entry_at(listed, op):
+    position = op["entry"]
+    if isinstance(position, bool) or not isinstance(position, int) \
+            or not 0 <= position < len(listed):
+        raise ValueError(f"{op['project']} has no entry {position!r} on {op['date']}")
+    return position
+
+
+def apply_entry_op(projects, op, dates=None):
+    # Like storage.apply_op for the entry ops; returns the hours changes.
+    # Every check happens before anything changes.
+    kind = op["op"]
+    changes = []
+
+    if kind == "add_entry":
+        entry = entry_op_fields(op)
+        listed = read_day(projects, op["project"], op["date"])
+        write_day(projects, op["project"], op["date"], listed + [entry], changes, dates)
+
+    elif kind == "remove_entry":
+        listed = read_day(projects, op["project"], op["date"])
+        del listed[entry_at(listed, op)]
+        write_day(projects, op["project"], op["date"], listed, changes, dates)
+
+    elif kind == "split_entry":
+        project, date_str = op["project"], op["date"]
+        listed = read_day(projects, project, date_str)
+        position = entry_at(listed, op)
+        first, rest = split_entry(listed[position], op.get("minutes"))
+        listed[position] = first
+        to_project = op.get("to_project") or project
+        if to_project == project:
+            listed.insert(position + 1, rest)
+        else:
+            target = read_day(projects, to_project, date_str)
+            write_day(projects, to_project, date_str, target + [rest], changes, dates)
+        write_day(projects, project, date_str, listed, changes, dates)
+
+    elif kind == "move_entries":
+        project = op["project"]
+        to_project = op.get("to_project") or project
+        days = op.get("days", 0)
+        if isinstance(days, bool) or not isinstance(days, int):
+            raise ValueError(f"days must be a whole number, not {days!r}")
+        if to_project == project and not days:
+            return changes
+        # Take every day first, so moves within a project don't collide
+        moved = []
+        for date_str in project_dates(projects, project, op["start"], op["end"], dates):
+            moved.append((shift_date(date_str, days), read_day(projects, project, date_str)))
+            write_day(projects, project, date_str, [], changes, dates)
+        for date_str, listed in moved:
+            target = read_day(projects, to_project, date_str)
+            write_day(projects, to_project, date_str, target + listed, changes, dates)
+
+    elif kind == "clear_range":
+        project = op["project"]
+        for date_str in project_dates(projects, project, op["start"], op["end"], dates):
+            write_day(projects, project, date_str, [], changes, dates)
+
+    return changes
+
+
+def split_entry(entry, minutes):
+    # (first, rest) of an entry split after `minutes`; a time span is
+    # split at the same point
+    if isinstance(minutes, bool) or not isinstance(minutes, int) \
+            or not 0 < minutes < entry["minutes"]:
+        raise ValueError(f"Can only split a {entry['minutes']} minute entry "
+                         f"between 1 and {entry['minutes'] - 1} minutes")
+    first = dict(entry, minutes=minutes)
+    rest = dict(entry, minutes=entry["minutes"] - minutes)
+    if "start" in entry and "end" in entry:
+        middle = clock_text((clock_minutes(entry["start"]) + minutes) % (24 * 60))
+        first["end"] = rest["start"] = middle
+    return first, rest
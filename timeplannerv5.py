@@ -1,14 +1,81 @@
+import time
+STARTUP_BEGIN = time.perf_counter()
+
+import os
 import sys
-import json
+import threading
 from datetime import datetime, timedelta
-from collections import defaultdict
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                            QHBoxLayout, QLabel, QComboBox, QSlider, QPushButton, 
+                            QHBoxLayout, QLabel, QComboBox, QPushButton, 
                             QFrame, QDialog, QLineEdit, QTextEdit, QMessageBox,
-                            QCalendarWidget, QGroupBox, QGridLayout)
-from PyQt5.QtCore import Qt, QDate
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+                            QCalendarWidget, QGroupBox, QGridLayout,
+                            QFileDialog, QProgressDialog, QCheckBox, QShortcut,
+                            QTimeEdit, QDateEdit, QInputDialog, QAbstractItemView,
+                            QCompleter)
+from PyQt5.QtGui import QKeySequence
+from PyQt5.QtCore import Qt, QDate, QTime, QEvent, QTimer, QThreadPool, QStringListModel
+from storage import open_store, build_index, check_batch
+from hours_index import WEEK_ADDED, WEEK_REMOVED, DAY_CHANGED
+from report_cache import ReportCache
+from iso_calendar import week_label, week_range, week_bounds, day_ordinal, PERIODS
+from instrumentation import StartupTimer, metrics, timed
+from workers import PersistenceWorker, run_in_background
+from reports import (rollup_rows, week_day_rows, entry_rows,
+                     shown_hours, REPORTS, LockedIndex)
+from time_entries import make_entry, duration_text
+from live_timer import TimerLog, timers_path, session_ops
+from rollups import (GROUPINGS, store_fingerprint, load_rollups, build_rollups,
+                     save_rollups)
+from project_search import ProjectSearch
+from table_models import LazyTableModel, make_table_view, make_filtered_table
+from export import export_reports
+import cli
+
+# How often a shared store is checked for other people's changes
+REFRESH_INTERVAL_MS = 2000
+# How often running timers update their display (in minutes) and are
+# checkpointed when due (live_timer.CHECKPOINT_SECONDS)
+TIMER_TICK_MS = 30000
+# Projects offered by the completer of the project selection
+COMPLETIONS = 20
+
+# matplotlib is only imported once the first chart is drawn (see load_matplotlib)
+HoursChart = None
+
+
+def load_matplotlib():
+    global HoursChart
+    if HoursChart is None:
+        from hours_chart import HoursChart as chart_class
+        HoursChart = chart_class
+    return HoursChart
+
+
+def find_week(combo, week):
+    # Position of `week` in a combo of sorted weeks, or where it would go
+    lo, hi = 0, combo.count()
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if combo.itemText(mid) < week:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def set_weeks(combo, weeks):
+    # Replace the items, keeping the selected week if it is still there.
+    # currentTextChanged is only emitted if the selection really changed.
+    selected = combo.currentText()
+    combo.blockSignals(True)
+    combo.clear()
+    combo.addItems(weeks)
+    position = find_week(combo, selected) if selected else 0
+    if position < combo.count() and combo.itemText(position) == selected:
+        combo.setCurrentIndex(position)
+    combo.blockSignals(False)
+    if combo.currentText() != selected:
+        combo.currentTextChanged.emit(combo.currentText())
 
 class CalendarDialog(QDialog):
     def __init__(self, parent=None):
@@ -16,6 +83,7 @@ class CalendarDialog(QDialog):
         self.setWindowTitle("Select Date")
         self.setup_ui()
         
+    @timed()
     def setup_ui(self):
         layout = QVBoxLayout()
         
@@ -71,6 +139,7 @@ class NewProjectDialog(QDialog):
         self.setWindowTitle("Add New Project")
         self.setup_ui()
 
+    @timed()
     def setup_ui(self):
         layout = QVBoxLayout()
         
@@ -119,81 +188,406 @@ class NewProjectDialog(QDialog):
         }
 
 class ProjectDetailsDialog(QDialog):
-    def __init__(self, projects, parent=None):
+    def __init__(self, search, parent=None):
         super().__init__(parent)
         self.setWindowTitle("All Projects")
-        self.projects = projects
+        self.search = search
         self.setup_ui()
+        self.resize(700, 500)
 
+    @timed()
     def setup_ui(self):
         layout = QVBoxLayout()
-        
-        self.text_display = QTextEdit()
-        self.text_display.setReadOnly(True)
-        
-        # Add project details to text display
-        details_text = ""
-        for project, details in self.projects.items():
-            details_text += f"Project Name: {project}\n"
-            details_text += f"  Account Number: {details.get('account_number', 'N/A')}\n"
-            details_text += f"  Comments: {details.get('comments', 'N/A')}\n\n"
-        
-        self.text_display.setText(details_text)
-        
-        layout.addWidget(self.text_display)
+
+        # Rows are read from the project search index as the table scrolls;
+        # the filter box searches it, best matches first
+        self.model = LazyTableModel(("Project Name", "Account Number", "Comments"),
+                                    self.search.rows(), parent=self)
+        self.filter_input, self.table = make_filtered_table(
+            self.model, "Search name, account number or comments...", self.update_rows)
+
+        layout.addWidget(self.filter_input)
+        layout.addWidget(self.table)
         self.setLayout(layout)
 
+    def update_rows(self, text):
+        self.model.reset(self.search.rows(text))
+        # A sorted table stays sorted
+        header = self.table.horizontalHeader()
+        if header.sortIndicatorSection() >= 0:
+            self.model.sort(header.sortIndicatorSection(), header.sortIndicatorOrder())
+
 class HoursDialog(QDialog):
-    def __init__(self, projects, parent=None):
+    def __init__(self, projects, parent=None, rollups=None):
         super().__init__(parent)
         self.setWindowTitle("Hours Overview")
         self.projects = projects
+        self.rollups = rollups or build_rollups(projects)
         self.setup_ui()
+        self.resize(700, 500)
 
+    @timed()
     def setup_ui(self):
         layout = QVBoxLayout()
-        
+
+        picker_layout = QHBoxLayout()
+        self.period_combo = QComboBox()
+        self.period_combo.addItems([period.title() for period in PERIODS])
+        self.grouping_combo = QComboBox()
+        self.grouping_combo.addItems(["Project", "Account Number"])
+        picker_layout.addWidget(QLabel("Hours per"))
+        picker_layout.addWidget(self.period_combo)
+        picker_layout.addWidget(QLabel("and"))
+        picker_layout.addWidget(self.grouping_combo)
+        picker_layout.addStretch()
+
+        # Hours per period come precomputed from the rollups, one batch of
+        # rows at a time
+        self.model = LazyTableModel(self.header(), self.rows(), formats={3: "{:.2f}%"},
+                                    parent=self)
+        self.filter_input, self.table = make_filtered_table(
+            self.model, "Filter by period, project or account number...")
+        self.period_combo.currentIndexChanged.connect(self.update_rows)
+        self.grouping_combo.currentIndexChanged.connect(self.update_rows)
+
+        layout.addLayout(picker_layout)
+        layout.addWidget(self.filter_input)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+    def selection(self):
+        return PERIODS[self.period_combo.currentIndex()], GROUPINGS[self.grouping_combo.currentIndex()]
+
+    def header(self):
+        return (self.period_combo.currentText(), self.grouping_combo.currentText(),
+                "Hours", "Percentage")
+
+    def rows(self):
+        return rollup_rows(self.rollups, *self.selection())
+
+    def update_rows(self):
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.model.reset(self.rows(), self.header())
+        if self.filter_input.text():
+            self.model.set_filter(self.filter_input.text())
+
+class EntriesDialog(QDialog):
+    # The entries of a date range, with bulk edits. Each action becomes one
+    # batch of ops that the window applies at once (TimeTrackerApp.apply_batch):
+    # checked as a whole, one index update, one write and one refresh.
+    #
+    # Selected entries are moved, reassigned or deleted one by one. With
+    # nothing selected and no filter, the action covers the whole range as
+    # one move_entries or clear_range op per project.
+
+    def __init__(self, window, first, last, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Edit Entries")
+        self.tracker = window
+        self.setup_ui(first, last)
+        self.resize(800, 500)
+
+    @timed()
+    def setup_ui(self, first, last):
+        layout = QVBoxLayout()
+
+        range_layout = QHBoxLayout()
+        self.first_input = self.date_input(first)
+        self.last_input = self.date_input(last)
+        self.project_filter = QComboBox()
+        self.project_filter.addItem("All Projects")
+        self.project_filter.addItems(self.tracker.projects.keys())
+        range_layout.addWidget(QLabel("From"))
+        range_layout.addWidget(self.first_input)
+        range_layout.addWidget(QLabel("to"))
+        range_layout.addWidget(self.last_input)
+        range_layout.addWidget(self.project_filter)
+        range_layout.addStretch()
+
+        self.model = LazyTableModel(("Date", "Project", "Minutes", "Start", "End", "Note"),
+                                    self.rows(), parent=self)
+        self.filter_input, self.table = make_filtered_table(
+            self.model, "Filter by date, project or note...")
+        self.table.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        for widget in (self.first_input, self.last_input):
+            widget.dateChanged.connect(self.reload)
+        self.project_filter.currentIndexChanged.connect(self.reload)
+
+        move_layout = QHBoxLayout()
+        self.move_input = self.date_input(first)
+        move_btn = QPushButton("Move")
+        move_btn.clicked.connect(self.move_entries)
+        self.reassign_combo = QComboBox()
+        self.reassign_combo.addItems(self.tracker.projects.keys())
+        reassign_btn = QPushButton("Reassign")
+        reassign_btn.clicked.connect(self.reassign_entries)
+        move_layout.addWidget(QLabel("Move to"))
+        move_layout.addWidget(self.move_input)
+        move_layout.addWidget(move_btn)
+        move_layout.addWidget(QLabel("Reassign to"))
+        move_layout.addWidget(self.reassign_combo)
+        move_layout.addWidget(reassign_btn)
+
+        button_layout = QHBoxLayout()
+        split_btn = QPushButton("Split...")
+        split_btn.clicked.connect(self.split_entry)
+        delete_btn = QPushButton("Delete")
+        delete_btn.clicked.connect(self.delete_entries)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        for button in (split_btn, delete_btn, close_btn):
+            button_layout.addWidget(button)
+
+        layout.addLayout(range_layout)
+        layout.addWidget(self.filter_input)
+        layout.addWidget(self.table)
+        layout.addLayout(move_layout)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+
+    def date_input(self, date_str):
+        widget = QDateEdit(QDate.fromString(date_str, "yyyy-MM-dd"))
+        widget.setDisplayFormat("yyyy-MM-dd")
+        widget.setCalendarPopup(True)
+        return widget
+
+    def date_range(self):
+        return (self.first_input.date().toString("yyyy-MM-dd"),
+                self.last_input.date().toString("yyyy-MM-dd"))
+
+    def names(self):
+        # The project chosen above, or None for all
+        if self.project_filter.currentIndex() == 0:
+            return None
+        return [self.project_filter.currentText()]
+
+    def rows(self):
+        return entry_rows(self.tracker.projects, *self.date_range(), self.names())
+
+    def reload(self):
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.model.reset(self.rows())
+        if self.filter_input.text():
+            self.model.set_filter(self.filter_input.text())
+
+    def chosen_rows(self):
+        # The selected rows, all rows shown if there is a filter but no
+        # selection, or None for the whole range
+        selected = sorted({index.row() for index in self.table.selectionModel().selectedRows()})
+        if selected:
+            return [self.model.rows[row] for row in selected]
+        if self.filter_input.text():
+            return list(self.model.rows)
+        return None
+
+    def range_projects(self):
+        # Projects with entries in the range
+        self.model.fetch_all()
+        return list(dict.fromkeys(row[1] for row in self.model.all_rows))
+
+    def removals(self, rows):
+        # remove_entry ops for the rows, from the back of each day so the
+        # positions stay valid
+        ordered = sorted(rows, key=lambda row: (row[1], row[0], -row[6]))
+        return [{"op": "remove_entry", "project": project, "date": date_str, "entry": position}
+                for date_str, project, _, _, _, _, position in ordered]
+
+    def readd(self, rows, project=None, date_str=None):
+        # add_entry ops putting the rows back, on another project or day
+        return [dict(make_entry(minutes, note, start, end), op="add_entry",
+                     project=project or row_project, date=date_str or row_date)
+                for row_date, row_project, minutes, start, end, note, _ in rows]
+
+    def move_entries(self):
+        target = self.move_input.date().toString("yyyy-MM-dd")
+        rows = self.chosen_rows()
+        if rows is None:
+            first, last = self.date_range()
+            days = self.first_input.date().daysTo(self.move_input.date())
+            ops = [{"op": "move_entries", "project": project, "start": first, "end": last,
+                    "days": days} for project in self.range_projects()]
+        else:
+            rows = [row for row in rows if row[0] != target]
+            ops = self.removals(rows) + self.readd(rows, date_str=target)
+        self.apply(ops)
+
+    def reassign_entries(self):
+        target = self.reassign_combo.currentText()
+        rows = self.chosen_rows()
+        if rows is None:
+            first, last = self.date_range()
+            ops = [{"op": "move_entries", "project": project, "start": first, "end": last,
+                    "to_project": target} for project in self.range_projects() if project != target]
+        else:
+            rows = [row for row in rows if row[1] != target]
+            ops = self.removals(rows) + self.readd(rows, project=target)
+        self.apply(ops)
+
+    def delete_entries(self):
+        rows = self.chosen_rows()
+        if rows is None:
+            first, last = self.date_range()
+            if self.names() is None:
+                ops = [{"op": "clear_range", "start": first, "end": last}]
+            else:
+                ops = [{"op": "clear_range", "project": self.names()[0],
+                        "start": first, "end": last}]
+        else:
+            ops = self.removals(rows)
+        if QMessageBox.question(self, "Delete Entries", "Delete the entries?") == QMessageBox.Yes:
+            self.apply(ops)
+
+    def split_entry(self):
+        selected = self.table.selectionModel().selectedRows()
+        if len(selected) != 1:
+            QMessageBox.critical(self, "Error", "Please select one entry to split.")
+            return
+        date_str, project, minutes, _, _, _, position = self.model.rows[selected[0].row()]
+        if minutes < 2:
+            QMessageBox.critical(self, "Error", "A one minute entry can't be split.")
+            return
+        first, ok = QInputDialog.getInt(self, "Split Entry", "Minutes of the first part:",
+                                        minutes // 2, 1, minutes - 1)
+        if ok:
+            self.apply([{"op": "split_entry", "project": project, "date": date_str,
+                         "entry": position, "minutes": first}])
+
+    def apply(self, ops):
+        if not ops:
+            return
+        try:
+            self.tracker.apply_batch(ops)
+        except ValueError as error:
+            QMessageBox.critical(self, "Error", f"Nothing was changed: {error}")
+        self.reload()
+
+class DebugDialog(QDialog):
+    # Latencies per operation, store file sizes and entry counts. Opened
+    # with Ctrl+Shift+D.
+
+    def __init__(self, window, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Performance")
+        self.tracker = window
+        self.setup_ui()
+        self.resize(640, 480)
+
+    def setup_ui(self):
+        layout = QVBoxLayout()
+
+        self.record_check = QCheckBox("Record timings")
+        self.record_check.setChecked(metrics.enabled)
+        self.record_check.toggled.connect(self.toggle_recording)
+        layout.addWidget(self.record_check)
+
         self.text_display = QTextEdit()
         self.text_display.setReadOnly(True)
-        
-        # Calculate hours data
-        week_data = defaultdict(lambda: defaultdict(float))
-        total_hours_per_week = defaultdict(float)
-
-        for project, details in self.projects.items():
-            if "hours" in details:
-                for date_str, hours in details["hours"].items():
-                    date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-                    iso_year, iso_week, _ = date_obj.isocalendar()
-                    week_num = f"{iso_year}-W{iso_week:02d}"
-                    week_data[week_num][project] += hours
-                    total_hours_per_week[week_num] += hours
-
-        # Create display text
-        hours_display = "Hours Worked per Project:\n\n"
-        for week, projects_in_week in week_data.items():
-            hours_display += f"Week: {week}\n"
-            week_total = total_hours_per_week[week]
-            for project, hours in projects_in_week.items():
-                percentage = (hours / week_total) * 100 if week_total > 0 else 0
-                hours_display += f"  - {project}: {hours} hours ({percentage:.2f}%)\n"
-            hours_display += f"  Total hours in week: {week_total}\n\n"
-
-        if not week_data:
-            hours_display = "No hours have been recorded yet."
-
-        self.text_display.setText(hours_display)
         layout.addWidget(self.text_display)
+
+        button_layout = QHBoxLayout()
+        refresh_btn = QPushButton("Refresh")
+        refresh_btn.clicked.connect(self.refresh)
+        reset_btn = QPushButton("Reset")
+        reset_btn.clicked.connect(self.reset)
+        self.profile_btn = QPushButton()
+        self.profile_btn.clicked.connect(self.toggle_profile)
+        close_btn = QPushButton("Close")
+        close_btn.clicked.connect(self.accept)
+        for button in (refresh_btn, reset_btn, self.profile_btn, close_btn):
+            button_layout.addWidget(button)
+        layout.addLayout(button_layout)
+
         self.setLayout(layout)
+        self.refresh()
+
+    def toggle_recording(self, checked):
+        if checked:
+            metrics.enable()
+        else:
+            metrics.disable()
+
+    def reset(self):
+        metrics.reset()
+        self.refresh()
+
+    def toggle_profile(self):
+        if not metrics.profiling:
+            metrics.start_profile()
+            self.refresh()
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Save Profile", "timetracker.prof",
+                                              "Profile Data (*.prof)")
+        self.refresh()
+        self.text_display.append("\n" + metrics.stop_profile(path or None))
+        self.profile_btn.setText("Start Profiling")
+
+    def data_text(self):
+        store = self.tracker.store
+        lines = [f"Store: {type(store).__name__}"]
+        for attribute in ("path", "journal_path"):
+            path = getattr(store, attribute, None)
+            if path and os.path.exists(path):
+                lines.append(f"  {path}: {os.path.getsize(path):,} bytes")
+        if metrics.log_path and os.path.exists(metrics.log_path):
+            lines.append(f"  {metrics.log_path}: {os.path.getsize(metrics.log_path):,} bytes")
+        # Counted by the index, so no project's hours are read from the store
+        lines.append(f"Projects: {len(self.tracker.projects):,}")
+        lines.append(f"Hour entries: {self.tracker.index.entry_count():,}")
+        lines.append(f"Weeks: {len(self.tracker.index.weeks):,}")
+        lines.append("")
+        lines.append(f"Caches (data generation {self.tracker.index.generation:,}):")
+        caches = self.tracker.index.caches()
+        if self.tracker.chart is not None:
+            caches.append(self.tracker.chart.backgrounds)
+        lines.extend(f"  {cache.stats_text()}" for cache in caches)
+        return "\n".join(lines)
+
+    def refresh(self):
+        self.profile_btn.setText("Stop Profiling" if metrics.profiling else "Start Profiling")
+        state = "" if metrics.enabled else "Timings are not being recorded.\n\n"
+        self.text_display.setPlainText(f"{state}{metrics.report_text()}\n\n{self.data_text()}")
 
 class TimeTrackerApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, store=None, startup=None):
         super().__init__()
+        self.startup = startup or StartupTimer()
         self.setWindowTitle("Project Time Tracker")
+        self.store = store or open_store()
+        # Taken before loading, which may touch the store's files
+        self.rollups_fingerprint = store_fingerprint(self.store)
         self.projects = self.load_projects()
+        self.startup.mark("load_projects")
+        self.writer = PersistenceWorker(self.store, parent=self)
+        self.writer.failed.connect(self.show_save_error)
+        # Held while the index changes or is read from a background task
+        self.index_lock = threading.Lock()
+        self.index = self.build_index()
+        self.startup.mark("build_index")
+        # Search index for the completer and the project list, built when
+        # first needed (see get_project_search)
+        self.project_search = None
+        # Loaded or built when first needed (see get_rollups); changes made
+        # before that are kept to be applied to saved rollups
+        self.rollups = None
+        self.rollup_changes = []
+        # Live timers; the tick only runs while a timer does
+        self.timers = TimerLog(timers_path(self.store))
+        self.timer_tick = QTimer(self)
+        self.timer_tick.setTimerType(Qt.VeryCoarseTimer)
+        self.timer_tick.setInterval(TIMER_TICK_MS)
+        self.timer_tick.timeout.connect(self.tick_timers)
         self.setup_ui()
         self.setStyleSheet(self.load_stylesheet())  # Apply custom styles
+        self.startup.mark("setup_ui")
+        self.recover_timers()
 
+        # Shared stores pick up other people's hours while the app is open
+        if hasattr(self.store, "refresh"):
+            self.refresh_timer = QTimer(self)
+            self.refresh_timer.timeout.connect(self.merge_remote_changes)
+            self.refresh_timer.start(REFRESH_INTERVAL_MS)
+
+    @timed()
     def setup_ui(self):
         # Create central widget and main layout
         central_widget = QWidget()
@@ -208,16 +602,39 @@ class TimeTrackerApp(QMainWindow):
         project_label = QLabel("Select Project:")
         self.project_combo = QComboBox()
         self.project_combo.addItems(self.projects.keys())
-        
-        # Hours slider
-        hours_label = QLabel("Enter Hours Worked:")
-        self.hours_slider = QSlider(Qt.Horizontal)
-        self.hours_slider.setMinimum(1)
-        self.hours_slider.setMaximum(10)
-        self.hours_value_label = QLabel("Hours: 1")
-        self.hours_slider.valueChanged.connect(
-            lambda v: self.hours_value_label.setText(f"Hours: {v}")
-        )
+        # Typing searches names, account numbers and comments (see
+        # project_search.py) instead of scrolling through every project
+        self.project_combo.setEditable(True)
+        self.project_combo.setInsertPolicy(QComboBox.NoInsert)
+        self.project_combo.lineEdit().setPlaceholderText("Type to search projects...")
+        self.completions = QStringListModel(self)
+        completer = QCompleter(self.completions, self)
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        completer.activated[str].connect(self.select_project)
+        self.project_combo.setCompleter(completer)
+        self.project_combo.lineEdit().textEdited.connect(self.update_completions)
+        
+        # Time worked, as hours and minutes or from a start and end time
+        hours_label = QLabel("Enter Time Worked (hours:minutes):")
+        duration_layout = QHBoxLayout()
+        self.duration_input = QTimeEdit(QTime(1, 0))
+        self.duration_input.setDisplayFormat("H:mm")
+        self.span_check = QCheckBox("From")
+        self.start_input = QTimeEdit(QTime(9, 0))
+        self.start_input.setDisplayFormat("HH:mm")
+        self.end_input = QTimeEdit(QTime(10, 0))
+        self.end_input.setDisplayFormat("HH:mm")
+        for widget in (self.start_input, self.end_input):
+            widget.setEnabled(False)
+        self.span_check.toggled.connect(self.toggle_span)
+        duration_layout.addWidget(self.duration_input)
+        duration_layout.addWidget(self.span_check)
+        duration_layout.addWidget(self.start_input)
+        duration_layout.addWidget(QLabel("to"))
+        duration_layout.addWidget(self.end_input)
+        duration_layout.addStretch()
+        self.note_input = QLineEdit()
+        self.note_input.setPlaceholderText("Note (optional)")
         
         # Date selection with calendar
         date_layout = QHBoxLayout()
@@ -243,16 +660,26 @@ class TimeTrackerApp(QMainWindow):
         # Add Hours button
         add_hours_btn = QPushButton("Add Hours")
         add_hours_btn.clicked.connect(self.add_hours)
+
+        # Timer for the selected project, logged as an entry when stopped
+        timer_layout = QHBoxLayout()
+        self.timer_btn = QPushButton("Start Timer")
+        self.timer_btn.clicked.connect(self.toggle_timer)
+        self.timer_label = QLabel("")
+        timer_layout.addWidget(self.timer_btn)
+        timer_layout.addWidget(self.timer_label, 1)
+        self.project_combo.currentTextChanged.connect(self.update_timer_display)
         
         # Add widgets to project frame
         project_layout.addWidget(project_label)
         project_layout.addWidget(self.project_combo)
         project_layout.addWidget(hours_label)
-        project_layout.addWidget(self.hours_slider)
-        project_layout.addWidget(self.hours_value_label)
+        project_layout.addLayout(duration_layout)
+        project_layout.addWidget(self.note_input)
         project_layout.addLayout(date_layout)  # Add the new date layout
         project_layout.addLayout(weekday_layout)  # Add the weekday buttons
         project_layout.addWidget(add_hours_btn)
+        project_layout.addLayout(timer_layout)
         
         # Button section for showing hours
         show_hours_group = QGroupBox("Show Hours")
@@ -261,7 +688,11 @@ class TimeTrackerApp(QMainWindow):
         show_hours_btn = QPushButton("Show Hours")
         show_hours_btn.clicked.connect(self.show_hours)
         
+        export_btn = QPushButton("Export Report")
+        export_btn.clicked.connect(self.export_report)
+        
         show_hours_layout.addWidget(show_hours_btn)
+        show_hours_layout.addWidget(export_btn)
         
         # Button section for project control
         project_control_group = QGroupBox("Project Control")
@@ -275,24 +706,31 @@ class TimeTrackerApp(QMainWindow):
         project_control_layout.addWidget(add_project_btn)
         project_control_layout.addWidget(show_projects_btn)
         
-        # Week clear section
-        week_group = QGroupBox("Clear Week")
+        # Week edit section
+        week_group = QGroupBox("Edit Week")
         week_layout = QVBoxLayout(week_group)
         
-        week_label = QLabel("Select Week to Clear:")
+        week_label = QLabel("Select Week:")
         self.week_combo = QComboBox()
         self.update_week_combo()
+        week_buttons = QHBoxLayout()
+        edit_entries_btn = QPushButton("Edit Entries")
+        edit_entries_btn.clicked.connect(self.edit_entries)
         clear_week_btn = QPushButton("Clear Week")
         clear_week_btn.clicked.connect(self.clear_week)
+        week_buttons.addWidget(edit_entries_btn)
+        week_buttons.addWidget(clear_week_btn)
         
         week_layout.addWidget(week_label)
         week_layout.addWidget(self.week_combo)
-        week_layout.addWidget(clear_week_btn)
+        week_layout.addLayout(week_buttons)
         
-        # Chart frame
+        # Chart frame; the chart itself is drawn once the frame is first painted
         self.chart_frame = QFrame()
         self.chart_layout = QVBoxLayout(self.chart_frame)
-        self.update_chart()
+        self.chart = None
+        self.chart_drawn = False
+        self.chart_frame.installEventFilter(self)
         
         # Add all sections to main layout
         main_layout.addWidget(project_group)
@@ -306,10 +744,10 @@ class TimeTrackerApp(QMainWindow):
         week_hours_layout = QVBoxLayout(week_hours_group)
         
         self.week_hours_combo = QComboBox()
-        self.week_hours_combo.currentIndexChanged.connect(self.update_week_hours_display)
+        self.week_hours_combo.currentTextChanged.connect(self.update_week_hours_display)
         
-        self.week_hours_display = QTextEdit()
-        self.week_hours_display.setReadOnly(True)
+        self.week_hours_model = LazyTableModel(("Day", "Date", "Hours"), parent=self)
+        self.week_hours_display = make_table_view(self.week_hours_model, sortable=False)
         
         week_hours_layout.addWidget(self.week_hours_combo)
         week_hours_layout.addWidget(self.week_hours_display)
@@ -317,41 +755,253 @@ class TimeTrackerApp(QMainWindow):
         main_layout.addWidget(week_hours_group)
         self.update_week_hours_combo()
 
+        # Hidden performance overview for diagnosing slow operations
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, self.show_debug)
+
+    @timed("load_projects")
     def load_projects(self):
-        try:
-            with open("projects.json", "r") as file:
-                return json.load(file)
-        except FileNotFoundError:
-            return {}
+        return self.store.load()
 
+    @timed("save_projects")
     def save_projects(self):
-        with open("projects.json", "w") as file:
-            json.dump(self.projects, file, indent=4)
+        self.writer.flush()
+        self.store.save(self.projects)
 
-    def add_hours(self):
+    def build_index(self):
+        # Week reports, day totals and the daily series are cached between
+        # mutations; apply_mutation invalidates only the weeks it touches
+        return ReportCache(build_index(self.store, self.projects))
+
+    def apply_mutation(self, op):
+        # Apply one mutation in memory and to the hours index right away;
+        # writing it to disk happens on the persistence worker's thread
+        with self.index_lock:
+            changes = self.store.stage(op)
+            events = self.index.apply_changes(changes)
+            self.apply_rollup_changes(changes)
+        self.writer.submit(op)
+        self.apply_index_events(events)
+        return changes
+
+    def apply_batch(self, ops):
+        # Apply many mutations as one: the whole batch is checked first, so
+        # it either applies completely or not at all (ValueError), then the
+        # index is updated, the batch written and the views refreshed once
+        with self.index_lock:
+            check_batch(self.projects, ops)
+            changes = []
+            for op in ops:
+                changes.extend(self.store.stage(op))
+            events = self.index.apply_changes(changes)
+            self.apply_rollup_changes(changes)
+        self.writer.submit_batch(ops)
+        self.apply_index_events(events)
+        return changes
+
+    def apply_index_events(self, events):
+        # Update only what changed: weeks are inserted into or removed from
+        # the combos in place and only changed days of the week on display
+        # are rewritten, so no combo is cleared and no selection is lost
+        if not events:
+            return
+        for event in events:
+            if event[0] == WEEK_ADDED:
+                for combo in (self.week_combo, self.week_hours_combo):
+                    combo.insertItem(find_week(combo, event[1]), event[1])
+            elif event[0] == WEEK_REMOVED:
+                for combo in (self.week_combo, self.week_hours_combo):
+                    position = find_week(combo, event[1])
+                    if combo.itemText(position) == event[1]:
+                        combo.removeItem(position)
+
+        # A changed selection has already redrawn the display by now
+        days = [event for event in events if event[0] == DAY_CHANGED]
+        shown_week = self.week_hours_combo.currentText()
+        if shown_week:
+            monday = day_ordinal(week_bounds(shown_week)[0])
+            for _, date_str, total in days:
+                if week_label(date_str) == shown_week:
+                    self.week_hours_model.set_cell(day_ordinal(date_str) - monday, 2,
+                                                   shown_hours(total))
+
+        if days and self.chart is not None:
+            self.update_chart()
+
+    def apply_rollup_changes(self, changes):
+        if self.rollups is None:
+            self.rollup_changes.extend(changes)
+        else:
+            self.rollups.apply_changes(changes)
+
+    @timed("load_rollups")
+    def get_rollups(self):
+        # The rollups saved with the store when they are still current,
+        # otherwise built from the projects once
+        if self.rollups is None:
+            with self.index_lock:
+                rollups = load_rollups(self.store, self.projects, self.rollups_fingerprint)
+                if rollups is None:
+                    rollups = build_rollups(self.projects)
+                else:
+                    rollups.apply_changes(self.rollup_changes)
+                self.rollups = rollups
+                self.rollup_changes = []
+        return self.rollups
+
+    def get_project_search(self):
+        # Built once, then kept up to date as projects are added
+        if self.project_search is None:
+            with self.index_lock:
+                self.project_search = ProjectSearch.from_projects(self.projects)
+        return self.project_search
+
+    def save_rollups(self):
+        # Called after the store is closed
+        if self.rollups is not None:
+            try:
+                save_rollups(self.store, self.rollups)
+            except OSError as error:
+                print(f"Could not save the rollups: {error}", file=sys.stderr)
+
+    def run_index_task(self, func, callback, progress=None, errback=None):
+        # Run func() off the GUI thread while mutations are held back
+        def locked(*report):
+            with self.index_lock:
+                return func(*report)
+        run_in_background(locked, callback, progress=progress, errback=errback)
+
+    @timed("merge_remote_changes")
+    def merge_remote_changes(self):
+        with self.index_lock:
+            changes = self.store.refresh()
+            events = self.index.apply_changes(changes)
+            self.apply_rollup_changes(changes)
+
+        if len(self.projects) != self.project_combo.count():
+            listed = {self.project_combo.itemText(i) for i in range(self.project_combo.count())}
+            self.project_combo.addItems([name for name in self.projects if name not in listed])
+            if self.project_search is not None:
+                self.project_search.update(self.projects)
+        self.apply_index_events(events)
+
+    def show_save_error(self, message):
+        QMessageBox.critical(self, "Error", f"Could not save projects: {message}")
+
+    def update_completions(self, text):
+        self.completions.setStringList(self.get_project_search().search(text, COMPLETIONS))
+
+    def select_project(self, project_name):
+        index = self.project_combo.findText(project_name, Qt.MatchExactly)
+        if index >= 0:
+            self.project_combo.setCurrentIndex(index)
+
+    def selected_project(self):
+        # The project in the selection box, None while it holds a search
         project_name = self.project_combo.currentText()
+        if project_name in self.projects:
+            return project_name
+        QMessageBox.critical(self, "Error", "Please select a project.")
+        return None
+
+    def toggle_span(self, checked):
+        self.duration_input.setEnabled(not checked)
+        self.start_input.setEnabled(checked)
+        self.end_input.setEnabled(checked)
+
+    def add_hours(self):
+        project_name = self.selected_project()
+        if project_name is None:
+            return
         date = self.date_display.text()  # Using the new date display
-        hours = self.hours_slider.value()
+        note = self.note_input.text().strip()
 
-        if hours == 0:
-            QMessageBox.critical(self, "Error", "Please enter hours worked greater than 0.")
+        try:
+            if self.span_check.isChecked():
+                entry = make_entry(None, note, self.start_input.time().toString("HH:mm"),
+                                   self.end_input.time().toString("HH:mm"))
+            else:
+                duration = self.duration_input.time()
+                entry = make_entry(duration.hour() * 60 + duration.minute(), note)
+        except ValueError:
+            QMessageBox.critical(self, "Error", "Please enter time worked greater than 0.")
             return
 
-        if project_name not in self.projects:
-            self.projects[project_name] = {"hours": {}}
+        # Only the mutation is persisted, not the whole file. The timing
+        # stops before the message box so it doesn't include reading it.
+        with metrics.timer("add_hours"):
+            self.apply_mutation(dict(entry, op="add_entry", project=project_name, date=date))
+        self.note_input.clear()
+        QMessageBox.information(self, "Success", 
+                              f"Added {duration_text(entry['minutes'])} hours for "
+                              f"{project_name} on {date}.")
 
-        if "hours" not in self.projects[project_name]:
-            self.projects[project_name]["hours"] = {}
+    def toggle_timer(self):
+        project_name = self.selected_project()
+        if project_name is None:
+            return
+        if project_name not in self.timers.running:
+            self.timers.start(project_name)
+            self.timer_tick.start()
+            self.update_timer_display()
+            return
 
-        if date not in self.projects[project_name]["hours"]:
-            self.projects[project_name]["hours"][date] = 0
+        minutes = self.stop_timer(project_name)
+        self.note_input.clear()
+        self.update_timer_display()
+        if minutes:
+            QMessageBox.information(self, "Success",
+                                    f"Added {duration_text(minutes)} hours for {project_name}.")
+        else:
+            QMessageBox.information(self, "Timer Stopped",
+                                    "Less than a minute was timed, nothing was added.")
 
-        self.projects[project_name]["hours"][date] += hours
-        self.save_projects()
-        self.update_chart()
-        self.update_week_hours_combo()
-        QMessageBox.information(self, "Success", 
-                              f"Added {hours} hours for {project_name} on {date}.")
+    def stop_timer(self, project_name):
+        # Log the session as entries, one batch for all days it spans, and
+        # only then mark it stopped in the timer log. Returns the minutes.
+        started, stopped = self.timers.stop(project_name)
+        if not self.timers.running:
+            self.timer_tick.stop()
+        ops = session_ops(project_name, started, stopped, self.note_input.text().strip())
+        if ops:
+            with metrics.timer("stop_timer"):
+                self.apply_batch(ops)
+                self.writer.flush()
+        self.timers.logged(project_name, stopped)
+        return sum(op["minutes"] for op in ops)
+
+    def stop_timers(self):
+        # When the window closes, running timers are logged as if stopped
+        for project_name in list(self.timers.running):
+            self.stop_timer(project_name)
+        self.timers.close()
+
+    def tick_timers(self):
+        # Only the timer label changes while timers run; the hours, the
+        # index and the chart are updated once, when a timer stops
+        self.timers.checkpoint()
+        self.update_timer_display()
+
+    def update_timer_display(self):
+        running = self.timers.running
+        self.timer_btn.setText(
+            "Stop Timer" if self.project_combo.currentText() in running else "Start Timer")
+        self.timer_label.setText(", ".join(
+            f"{project} {duration_text(int(self.timers.elapsed(project) // 60))}"
+            for project in running))
+
+    def recover_timers(self):
+        # Timers still running when the app last stopped (a crash) are
+        # logged up to their last checkpoint
+        logged = []
+        for project_name, (started, last_seen) in self.timers.load().items():
+            ops = session_ops(project_name, started, last_seen)
+            if ops:
+                self.apply_batch(ops)
+                logged.append(f"{project_name} {duration_text(sum(op['minutes'] for op in ops))}")
+        self.writer.flush()
+        self.timers.reset()
+        if logged:
+            self.timer_label.setText("Recovered timers: " + ", ".join(logged))
 
     def add_new_project(self):
         dialog = NewProjectDialog(self)
@@ -360,13 +1010,13 @@ class TimeTrackerApp(QMainWindow):
             project_name = project_data["name"]
             
             if project_name and project_name not in self.projects:
-                self.projects[project_name] = {
-                    "account_number": project_data["account_number"],
-                    "comments": project_data["comments"],
-                    "hours": {}
-                }
-                self.save_projects()
+                self.apply_mutation({"op": "add_project", "project": project_name,
+                                     "account_number": project_data["account_number"],
+                                     "comments": project_data["comments"]})
                 self.project_combo.addItem(project_name)
+                if self.project_search is not None:
+                    self.project_search.add(project_name, project_data["account_number"],
+                                            project_data["comments"])
                 QMessageBox.information(self, "Success", 
                                       f"New project '{project_name}' added.")
             else:
@@ -374,13 +1024,54 @@ class TimeTrackerApp(QMainWindow):
                                    "Please enter a valid project name or project already exists.")
 
     def show_projects(self):
-        dialog = ProjectDetailsDialog(self.projects, self)
+        dialog = ProjectDetailsDialog(self.get_project_search(), self)
         dialog.exec_()
 
     def show_hours(self):
-        dialog = HoursDialog(self.projects, self)
+        dialog = HoursDialog(self.projects, self, rollups=self.get_rollups())
         dialog.exec_()
 
+    def show_debug(self):
+        dialog = DebugDialog(self, self)
+        dialog.exec_()
+
+    def export_report(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Report", "hours-report.xlsx",
+            "Excel Workbook (*.xlsx);;CSV Files (*.csv)")
+        if not path:
+            return
+
+        # The export runs on a worker thread and takes the index lock for
+        # one read at a time, so merging other users' changes never waits
+        # for the files to be written
+        cancelled = threading.Event()
+        progress = QProgressDialog("Exporting report...", "Cancel", 0, len(REPORTS), self)
+        progress.setWindowTitle("Export Report")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+        progress.canceled.connect(cancelled.set)
+
+        def on_progress(values):
+            stage, _, title, rows = values
+            progress.setLabelText(f"Exporting {title.lower()} report: {rows:,} rows")
+            progress.setValue(stage)
+
+        def on_done(paths):
+            progress.close()
+            QMessageBox.information(self, "Success",
+                                    "Report exported to:\n" + "\n".join(paths))
+
+        def on_error(message):
+            progress.close()
+            if not cancelled.is_set():
+                QMessageBox.critical(self, "Error", f"Could not export the report: {message}")
+
+        run_in_background(
+            lambda report: export_reports(LockedIndex(self.index, self.index_lock),
+                                          path, report, cancelled.is_set),
+            on_done, progress=on_progress, errback=on_error)
+
     def show_calendar(self):
         dialog = CalendarDialog(self)
         if dialog.exec_() == QDialog.Accepted:
@@ -399,51 +1090,44 @@ class TimeTrackerApp(QMainWindow):
         selected_date = start_of_week + timedelta(days=day_index)
         self.date_display.setText(selected_date.strftime('%Y-%m-%d'))
 
+    def eventFilter(self, watched, event):
+        if (watched is self.chart_frame and event.type() == QEvent.Paint
+                and not self.chart_drawn):
+            self.chart_drawn = True
+            self.startup.mark("first_paint")
+            # Let the window finish painting before matplotlib is loaded
+            QTimer.singleShot(0, self.draw_first_chart)
+        return super().eventFilter(watched, event)
+
+    def draw_first_chart(self):
+        load_matplotlib()
+        self.startup.mark("import_matplotlib")
+        self.update_chart()
+        self.startup.mark("first_chart")
+        self.startup.report()
+
+    @timed("update_chart")
     def update_chart(self):
-        # Clear existing chart
-        for i in reversed(range(self.chart_layout.count())): 
-            self.chart_layout.itemAt(i).widget().setParent(None)
-
-        # Calculate hours per day
-        hours_per_day = defaultdict(float)
-        for project, details in self.projects.items():
-            if "hours" in details:
-                for date_str, hours in details["hours"].items():
-                    hours_per_day[date_str] += hours
-
-        if not hours_per_day:
-            return
+        self.chart_drawn = True
 
-        # Create the plot
-        fig, ax = plt.subplots(figsize=(8, 4))
-        dates = sorted(hours_per_day.keys())
-        hours = [hours_per_day[date] for date in dates]
-        
-        ax.plot(dates, hours, marker='o', color='b', label='Hours Worked')
-        
-        # Highlight days over 8 hours
-        for i, h in enumerate(hours):
-            if h > 8:
-                ax.plot(dates[i], h, marker='o', color='r')
-        
-        ax.set_xlabel("Date")
-        ax.set_ylabel("Total Hours")
-        ax.set_title("Hours Worked Per Day")  # Corrected method name
-        
-        canvas = FigureCanvas(fig)
-        self.chart_layout.addWidget(canvas)
+        # The chart is created once and then only gets new data; redraws
+        # requested in quick succession are merged into one
+        if self.chart is None:
+            self.chart = load_matplotlib()(self.index.daily_series,
+                                           run_async=self.run_index_task)
+            self.chart_layout.addWidget(self.chart.widget)
+            self.chart.refresh()
+        else:
+            self.chart.schedule_refresh()
 
     def update_week_combo(self):
-        weeks = set()
-        for project, details in self.projects.items():
-            if "hours" in details:
-                for date_str in details["hours"].keys():
-                    date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-                    iso_year, iso_week, _ = date_obj.isocalendar()
-                    weeks.add(f"{iso_year}-W{iso_week:02d}")
-        
-        self.week_combo.clear()
-        self.week_combo.addItems(sorted(weeks))
+        set_weeks(self.week_combo, self.index.weeks)
+
+    def edit_entries(self):
+        # Opens on the selected week, or the current one
+        selected_week = self.week_combo.currentText() or week_label(self.date_display.text())
+        dialog = EntriesDialog(self, *week_bounds(selected_week), parent=self)
+        dialog.exec_()
 
     def clear_week(self):
         selected_week = self.week_combo.currentText()
@@ -452,67 +1136,28 @@ class TimeTrackerApp(QMainWindow):
             QMessageBox.critical(self, "Error", "Please select a week to clear.")
             return
 
-        year, week = map(int, selected_week.split("-W"))
-        week_start = datetime.strptime(f"{year}-W{week - 1}-1", "%Y-W%U-%w")
-        week_end = week_start + timedelta(days=6)
-
-        week_start_str = week_start.strftime("%Y-%m-%d")
-        week_end_str = week_end.strftime("%Y-%m-%d")
-
-        for project, details in self.projects.items():
-            if "hours" in details:
-                for date_str in list(details["hours"].keys()):
-                    if week_start_str <= date_str <= week_end_str:
-                        del self.projects[project]["hours"][date_str]
+        # Monday to Sunday of the ISO week, the same weeks the index uses
+        week_start_str, week_end_str = week_bounds(selected_week)
 
-        self.save_projects()
-        self.update_chart()
-        self.update_week_combo()
-        self.update_week_hours_combo()
+        with metrics.timer("clear_week"):
+            self.apply_mutation({"op": "clear_range", "start": week_start_str,
+                                 "end": week_end_str})
         QMessageBox.information(self, "Success", 
                               f"All entries for week {selected_week} have been cleared.")
     
     def update_week_hours_combo(self):
-        weeks = set()
-        for project, details in self.projects.items():
-            if "hours" in details:
-                for date_str in details["hours"].keys():
-                    date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-                    iso_year, iso_week, _ = date_obj.isocalendar()
-                    weeks.add(f"{iso_year}-W{iso_week:02d}")
-        
-        self.week_hours_combo.clear()
-        self.week_hours_combo.addItems(sorted(weeks))
+        set_weeks(self.week_hours_combo, self.index.weeks)
     
     def update_week_hours_display(self):
         selected_week = self.week_hours_combo.currentText()
         
         if not selected_week:
-            self.week_hours_display.setText("")
+            self.week_hours_model.reset(())
             return
         
-        year, week = map(int, selected_week.split("-W"))
-        week_start = datetime.strptime(f"{year}-W{week - 1}-1", "%Y-W%U-%w")
-        week_end = week_start + timedelta(days=6)
-
-        week_hours_display = f"Hours for Week {selected_week}:\n\n"
-        days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-        
-        for day_index in range(7):
-            current_date = week_start + timedelta(days=day_index)
-            current_date_str = current_date.strftime("%Y-%m-%d")
-            day_name = days[day_index]
-            
-            day_total_hours = 0
-            for project, details in self.projects.items():
-                if "hours" in details and current_date_str in details["hours"]:
-                    day_total_hours += details["hours"][current_date_str]
-                    
-            week_hours_display += f"{day_name} ({current_date_str}): {day_total_hours} hours\n"
-        
-        week_hours_display += "\n"
-        
-        self.week_hours_display.setText(week_hours_display)
+        week_start, _ = week_range(selected_week)
+        self.week_hours_model.reset(week_day_rows(self.index, week_start))
+        self.week_hours_model.fetch_all()
         
     def load_stylesheet(self):
         return """
@@ -537,7 +1182,7 @@ class TimeTrackerApp(QMainWindow):
             font-size: 14px;
             color: #ffffff;
         }
-        QComboBox, QSlider, QLineEdit, QPushButton {
+        QComboBox, QTimeEdit, QDateEdit, QLineEdit, QPushButton {
             font-size: 14px;
             padding: 5px;
             margin: 5px 0;
@@ -545,19 +1190,9 @@ class TimeTrackerApp(QMainWindow):
             border: 1px solid #555555;
             color: #ffffff;
         }
-        QSlider::groove:horizontal {
-            border: 1px solid #999999;
-            height: 8px;
-            background: #3a3a3a;
-            margin: 2px 0;
-        }
-        QSlider::handle:horizontal {
-            background: #4CAF50;
-            border: 1px solid #4CAF50;
-            width: 18px;
-            height: 18px;
-            margin: -4px 0;
-            border-radius: 9px;
+        QGroupBox QCheckBox {
+            font-size: 14px;
+            color: #ffffff;
         }
         QPushButton {
             background-color: #4CAF50;
@@ -580,6 +1215,21 @@ class TimeTrackerApp(QMainWindow):
             background-color: #3a3a3a;
             color: #ffffff;
         }
+        QTableView {
+            font-size: 14px;
+            background-color: #3a3a3a;
+            alternate-background-color: #333333;
+            color: #ffffff;
+            gridline-color: #555555;
+            border: 1px solid #555555;
+        }
+        QHeaderView::section {
+            font-size: 14px;
+            padding: 4px;
+            background-color: #2b2b2b;
+            color: #ffffff;
+            border: 1px solid #555555;
+        }
         QCalendarWidget {
             font-size: 14px;
             background-color: #3a3a3a;
@@ -589,8 +1239,24 @@ class TimeTrackerApp(QMainWindow):
         """
         
 if __name__ == "__main__":
+    # Any arguments select a headless command ("import", "report"); Qt is
+    # not started for those
+    if len(sys.argv) > 1:
+        sys.exit(cli.main(sys.argv[1:]))
+
+    startup = StartupTimer(STARTUP_BEGIN)
+    startup.mark("imports")
     app = QApplication(sys.argv)
-    window = TimeTrackerApp()
+    window = TimeTrackerApp(startup=startup)
     window.setGeometry(100, 100, 800, 600)
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    startup.mark("show")
+    exit_code = app.exec_()
+    window.stop_timers()
+    # Let background tasks finish, then write out anything the persistence
+    # worker still has queued
+    QThreadPool.globalInstance().waitForDone()
+    window.writer.flush()
+    window.store.close()
+    window.save_rollups()
+    sys.exit(exit_code)
\ No newline at end of file
@@ -0,0 +1,136 @@
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+from instrumentation import timed
+
+
+class TaskSignals(QObject):
+    done = pyqtSignal(object)
+    progress = pyqtSignal(object)
+
+
+class Task(QRunnable):
+    # Runs func() on a pool thread and emits (task) when it has finished;
+    # the result or the error message is left on the task. With
+    # with_progress=True func is called with a report(*values) function that
+    # forwards values to the progress signal.
+
+    def __init__(self, func, with_progress=False):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.func = func
+        self.with_progress = with_progress
+        self.result = None
+        self.error = None
+        self.signals = TaskSignals()
+
+    def report_progress(self, *values):
+        self.signals.progress.emit(values)
+
+    def run(self):
+        try:
+            if self.with_progress:
+                self.result = self.func(self.report_progress)
+            else:
+                self.result = self.func()
+        except Exception as error:
+            self.error = str(error) or error.__class__.__name__
+        self.signals.done.emit(self)
+
+
+class PersistenceWorker(QObject):
+    # Writes staged mutations to the store on a background thread. Ops
+    # submitted within `delay_ms` of each other, or while a write is running,
+    # are committed together in one store.commit call. Only one write runs at
+    # a time, so ops reach the store in order.
+
+    saved = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, store, delay_ms=100, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.pending = []
+        self.task = None
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay_ms)
+        self.timer.timeout.connect(self.start_write)
+
+    def submit(self, op):
+        self.pending.append(op)
+        self.timer.start()
+
+    def submit_batch(self, ops):
+        # Ops that belong together; they are always committed in one call
+        self.pending.extend(ops)
+        self.timer.start()
+
+    def start_write(self):
+        if self.task is not None or not self.pending:
+            return
+        ops, self.pending = self.pending, []
+        self.task = Task(lambda: self.write(ops))
+        self.task.ops = ops
+        self.task.signals.done.connect(self.write_finished)
+        self.pool.start(self.task)
+
+    def write_finished(self, task):
+        if task is not self.task:
+            return  # already handled by flush()
+        self.task = None
+        if self.finish(task):
+            self.saved.emit(len(task.ops))
+            if self.pending:
+                self.timer.start()
+
+    def finish(self, task):
+        if task.error is None:
+            return True
+        # Keep the ops so the next write (or flush) retries them
+        self.pending[:0] = task.ops
+        self.failed.emit(task.error)
+        return False
+
+    def flush(self):
+        # Block until everything submitted so far has been committed
+        self.timer.stop()
+        self.pool.waitForDone()
+        if self.task is not None:
+            task, self.task = self.task, None
+            self.finish(task)
+        if self.pending:
+            ops, self.pending = self.pending, []
+            self.write(ops)
+
+    @timed("store.commit")
+    def write(self, ops):
+        self.store.commit(ops)
+
+
+# Keeps background tasks (and their signal objects) alive until they report back
+running_tasks = set()
+
+
+def run_in_background(func, callback, pool=None, progress=None, errback=None):
+    # Run func() on a pool thread and call callback(result) on the GUI thread.
+    # If progress is given, func(report) gets a function whose arguments are
+    # passed to progress(values) on the GUI thread; errback(message) is
+    # called if func raises.
+    task = Task(func, with_progress=progress is not None)
+
+    def deliver(finished):
+        running_tasks.discard(finished)
+        if finished.error is None:
+            callback(finished.result)
+        elif errback is not None:
+            errback(finished.error)
+
+    task.signals.done.connect(deliver)
+    if progress is not None:
+        task.signals.progress.connect(progress)
+    running_tasks.add(task)
+    (pool or QThreadPool.globalInstance()).start(task)
+    return task